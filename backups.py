@@ -0,0 +1,636 @@
+# backups.py
+"""
+Copias de seguridad de la base de datos.
+
+La copia se hace en línea con la API de backup de SQLite (no copiando el
+archivo, que puede estar a medio escribir): se copian PAGES_PER_STEP
+páginas por paso y entre pasos se libera la base, así la caja puede seguir
+guardando ventas. La copia se verifica con PRAGMA integrity_check y se
+guarda comprimida en un .zip junto con un manifest.json que lleva el
+SHA-256 de la base, para poder validarla antes de restaurar.
+
+Además hay respaldos automáticos incrementales con retención por
+generaciones (ver incremental_backup / run_scheduled más abajo).
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+
+import bulk_import
+import kpis
+import models
+from db import DB_PATH, KEY_PATH, SCHEMA_VERSION
+from paths import get_pdf_backup_dir, rel_to_data
+
+# 256 páginas de 4 KB = 1 MB por paso
+PAGES_PER_STEP = 256
+# Pausa (s) entre pasos para dejar escribir a la aplicación
+STEP_SLEEP = 0.005
+# Cada escritura de la aplicación durante la copia la hace empezar de nuevo;
+# tras este número de reinicios se termina en un solo paso (bloqueo breve)
+MAX_RESTARTS = 3
+ARCHIVE_DB = "riostore.db"
+ARCHIVE_MANIFEST = "manifest.json"
+CHUNK = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+# Una copia en curso y una restauración no pueden coincidir
+_db_lock = threading.Lock()
+
+
+def default_name(now=None):
+    return f"riostore_{(now or datetime.now()):%Y-%m-%d_%H%M}.zip"
+
+
+def sha256_file(path, progress=None):
+    h = hashlib.sha256()
+    total, done = os.path.getsize(path) or 1, 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+            done += len(block)
+            if progress:
+                progress(done / total)
+    return h.hexdigest()
+
+
+def snapshot_database(dest_path, db_path=DB_PATH, progress=None):
+    """
+    Copia consistente de la base en dest_path (un .db normal) usando la API
+    de backup, y la verifica. progress(fracción) durante la copia.
+    """
+    state = {"remaining": None, "restarts": 0}
+
+    def step(status, remaining, total):
+        last = state["remaining"]
+        state["remaining"] = remaining
+        if last is not None and remaining > last:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        if progress and total:
+            progress((total - remaining) / total)
+
+    dst = sqlite3.connect(dest_path)
+    try:
+        with _db_lock:
+            src = sqlite3.connect(db_path)
+            try:
+                src.backup(dst, pages=PAGES_PER_STEP, progress=step, sleep=STEP_SLEEP)
+            except _TooManyRestarts:
+                # Mucha actividad: copia completa en un solo paso
+                src.backup(dst, pages=-1)
+                if progress:
+                    progress(1.0)
+            finally:
+                src.close()
+        result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"La copia no pasó la verificación: {result}")
+        user_version = dst.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        dst.close()
+    return user_version
+
+
+def backup_database(dest, db_path=DB_PATH, progress=None):
+    """
+    Escribe en dest un .zip con la base verificada y su manifest.
+    progress(fracción, etapa) con etapa "copia", "verificación" o "compresión".
+    Devuelve el manifest.
+    """
+    def stage(name, weight, offset):
+        return (lambda f: progress(offset + f * weight, name)) if progress else None
+
+    workdir = tempfile.mkdtemp(prefix="riostore_bak_")
+    tmp_zip = f"{dest}.part"
+    try:
+        tmp_db = os.path.join(workdir, ARCHIVE_DB)
+        user_version = snapshot_database(tmp_db, db_path, stage("copia", 0.6, 0.0))
+        manifest = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "schema_version": user_version,
+            "app_schema_version": SCHEMA_VERSION,
+            "size": os.path.getsize(tmp_db),
+            "sha256": sha256_file(tmp_db, stage("verificación", 0.1, 0.6)),
+        }
+        with zipfile.ZipFile(tmp_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(ARCHIVE_MANIFEST, json.dumps(manifest, indent=2))
+            _write_member(zf, tmp_db, ARCHIVE_DB, manifest["size"], stage("compresión", 0.3, 0.7))
+        os.replace(tmp_zip, dest)
+        return manifest
+    except BaseException:
+        if os.path.exists(tmp_zip):
+            os.remove(tmp_zip)
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _write_member(zf, path, arcname, size, progress=None):
+    # Como zf.write, pero por bloques para poder informar el avance
+    done = 0
+    with open(path, "rb") as src, zf.open(arcname, "w", force_zip64=True) as out:
+        for block in iter(lambda: src.read(CHUNK), b""):
+            out.write(block)
+            done += len(block)
+            if progress:
+                progress(done / (size or 1))
+
+
+# — Respaldos automáticos incrementales —
+#
+# Cada ejecución crea una "generación" en <destino>/riostore-backups:
+#   chunks/ab/abcd...     bloques comprimidos, con nombre = SHA-256 del contenido
+#   generations/*.json    lista de bloques de la base, key.key y PDFs
+# La base se parte en bloques de BLOCK_SIZE; un bloque que no cambió desde la
+# generación anterior ya existe y no se vuelve a escribir, así un respaldo
+# por hora de una base grande solo guarda las páginas modificadas.
+
+SCHEDULE_FILE = rel_to_data("backup_schedule.json")
+DEFAULT_SCHEDULE = {
+    "enabled": False,
+    "dest": "",
+    "interval_minutes": 60,
+    "keep_hourly": 24,
+    "keep_daily": 7,
+    "keep_weekly": 8,
+}
+STORE_DIR = "riostore-backups"
+BLOCK_SIZE = 256 * 1024          # 64 páginas de 4 KB
+GEN_FMT = "%Y%m%dT%H%M%S"
+# Un candado más viejo que esto es de una ejecución que se interrumpió
+STALE_LOCK_SECONDS = 6 * 3600
+# Cada cuánto (s) revisa el programador si toca respaldar
+CHECK_SECONDS = 60
+
+
+def load_schedule():
+    cfg = dict(DEFAULT_SCHEDULE)
+    try:
+        with open(SCHEDULE_FILE, encoding="utf-8") as f:
+            cfg.update(json.load(f))
+    except (FileNotFoundError, ValueError):
+        pass
+    return cfg
+
+
+def save_schedule(cfg):
+    tmp = f"{SCHEDULE_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=2)
+    os.replace(tmp, SCHEDULE_FILE)
+
+
+def _store(dest):
+    root = os.path.join(dest, STORE_DIR)
+    os.makedirs(os.path.join(root, "chunks"), exist_ok=True)
+    os.makedirs(os.path.join(root, "generations"), exist_ok=True)
+    return root
+
+
+def _chunk_path(root, digest):
+    return os.path.join(root, "chunks", digest[:2], digest)
+
+
+def _put_chunk(root, data):
+    """Guarda el bloque si no existe. Devuelve (hash, bytes escritos)."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(root, digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    packed = zlib.compress(data, 6)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(packed)
+    os.replace(f"{path}.tmp", path)
+    return digest, len(packed)
+
+
+def _get_chunk(root, digest):
+    with open(_chunk_path(root, digest), "rb") as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise BackupError(f"Bloque dañado: {digest}")
+    return data
+
+
+def _put_file(root, path):
+    with open(path, "rb") as f:
+        return _put_chunk(root, f.read())
+
+
+@contextmanager
+def _locked(root):
+    # Evita que la app y la línea de comandos respalden a la vez
+    lock = os.path.join(root, "lock")
+    try:
+        if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+            os.remove(lock)
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise BackupError("Ya hay un respaldo en curso en ese destino.")
+    os.close(fd)
+    try:
+        yield
+    finally:
+        os.remove(lock)
+
+
+def list_generations(dest):
+    """[(fecha, ruta del manifest)] de la más antigua a la más reciente."""
+    gen_dir = os.path.join(dest, STORE_DIR, "generations")
+    gens = []
+    if os.path.isdir(gen_dir):
+        for name in os.listdir(gen_dir):
+            if name.endswith(".json"):
+                try:
+                    gens.append((datetime.strptime(name[:-5], GEN_FMT), os.path.join(gen_dir, name)))
+                except ValueError:
+                    continue
+    return sorted(gens)
+
+
+def incremental_backup(dest, db_path=DB_PATH, key_path=KEY_PATH, pdf_dir=None,
+                       progress=None, now=None):
+    """
+    Crea una generación en dest con la base (copia en línea verificada),
+    key.key y los PDFs de respaldo. Devuelve el manifest; "written" indica
+    cuántos bytes nuevos se escribieron.
+    """
+    root = _store(dest)
+    now = now or datetime.now()
+    pdf_dir = pdf_dir or get_pdf_backup_dir()
+    with _locked(root):
+        workdir = tempfile.mkdtemp(prefix="riostore_inc_")
+        try:
+            tmp_db = os.path.join(workdir, ARCHIVE_DB)
+            user_version = snapshot_database(
+                tmp_db, db_path, (lambda f: progress(f * 0.5)) if progress else None
+            )
+            size, written, blocks = os.path.getsize(tmp_db), 0, []
+            whole = hashlib.sha256()
+            with open(tmp_db, "rb") as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                    whole.update(block)
+                    digest, n = _put_chunk(root, block)
+                    blocks.append(digest)
+                    written += n
+                    if progress:
+                        progress(0.5 + 0.4 * f.tell() / (size or 1))
+
+            key = None
+            if os.path.exists(key_path):
+                key, n = _put_file(root, key_path)
+                written += n
+            pdfs = {}
+            if os.path.isdir(pdf_dir):
+                for entry in os.scandir(pdf_dir):
+                    if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                        pdfs[entry.name], n = _put_file(root, entry.path)
+                        written += n
+            if progress:
+                progress(1.0)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        manifest = {
+            "created_at": now.isoformat(timespec="seconds"),
+            "schema_version": user_version,
+            "db": {"size": size, "sha256": whole.hexdigest(),
+                   "block_size": BLOCK_SIZE, "blocks": blocks},
+            "key": key,
+            "pdfs": pdfs,
+            "written": written,
+        }
+        # El manifest se escribe al final: si algo falla antes, la
+        # generación simplemente no existe
+        gen_path = os.path.join(root, "generations", f"{now.strftime(GEN_FMT)}.json")
+        with open(f"{gen_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(f"{gen_path}.tmp", gen_path)
+    return manifest
+
+
+def _generations_to_keep(gens, keep_hourly, keep_daily, keep_weekly):
+    # La más reciente de cada hora / día / semana, para los últimos N de cada uno
+    keep = set()
+    tiers = (
+        (keep_hourly, lambda d: (d.date(), d.hour)),
+        (keep_daily,  lambda d: d.date()),
+        (keep_weekly, lambda d: d.isocalendar()[:2]),
+    )
+    for limit, bucket_of in tiers:
+        seen = set()
+        for when, path in reversed(gens):
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(when)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(path)
+    if gens:
+        keep.add(gens[-1][1])   # nunca se borra la última
+    return keep
+
+
+def prune_generations(dest, keep_hourly=24, keep_daily=7, keep_weekly=8):
+    """Aplica la retención y borra los bloques que ya no usa ninguna generación."""
+    root = _store(dest)
+    with _locked(root):
+        gens = list_generations(dest)
+        keep = _generations_to_keep(gens, keep_hourly, keep_daily, keep_weekly)
+        removed = 0
+        for _, path in gens:
+            if path not in keep:
+                os.remove(path)
+                removed += 1
+
+        used = set()
+        for path in keep:
+            with open(path, encoding="utf-8") as f:
+                m = json.load(f)
+            used.update(m["db"]["blocks"])
+            used.update(m["pdfs"].values())
+            if m["key"]:
+                used.add(m["key"])
+        for sub in os.scandir(os.path.join(root, "chunks")):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name not in used:
+                        os.remove(entry.path)
+    return removed
+
+
+def assemble_generation(gen_path, out_dir, progress=None):
+    """
+    Reconstruye una generación en out_dir (riostore.db, key.key y
+    pdf_backups/) verificando el SHA-256 de la base. Devuelve la ruta de la base.
+    """
+    root = os.path.dirname(os.path.dirname(gen_path))
+    with open(gen_path, encoding="utf-8") as f:
+        m = json.load(f)
+    os.makedirs(out_dir, exist_ok=True)
+    db_out = os.path.join(out_dir, ARCHIVE_DB)
+    whole = hashlib.sha256()
+    blocks = m["db"]["blocks"]
+    with open(db_out, "wb") as out:
+        for i, digest in enumerate(blocks, start=1):
+            block = _get_chunk(root, digest)
+            whole.update(block)
+            out.write(block)
+            if progress:
+                progress(i / len(blocks))
+    if whole.hexdigest() != m["db"]["sha256"]:
+        raise BackupError("La base reconstruida no coincide con su respaldo.")
+    if m["key"]:
+        with open(os.path.join(out_dir, "key.key"), "wb") as f:
+            f.write(_get_chunk(root, m["key"]))
+    if m["pdfs"]:
+        pdf_out = os.path.join(out_dir, "pdf_backups")
+        os.makedirs(pdf_out, exist_ok=True)
+        for name, digest in m["pdfs"].items():
+            with open(os.path.join(pdf_out, os.path.basename(name)), "wb") as f:
+                f.write(_get_chunk(root, digest))
+    return db_out
+
+
+def run_scheduled(cfg=None, force=False, now=None):
+    """
+    Respalda si toca según la configuración (o siempre con force) y aplica
+    la retención. Devuelve el manifest nuevo o None si no tocaba.
+    """
+    cfg = cfg or load_schedule()
+    if not cfg["dest"]:
+        return None
+    now = now or datetime.now()
+    gens = list_generations(cfg["dest"])
+    if not force and gens and now - gens[-1][0] < timedelta(minutes=cfg["interval_minutes"]):
+        return None
+    manifest = incremental_backup(cfg["dest"], now=now)
+    prune_generations(cfg["dest"], cfg["keep_hourly"], cfg["keep_daily"], cfg["keep_weekly"])
+    return manifest
+
+
+class BackupScheduler:
+    """
+    Hilo en segundo plano que ejecuta run_scheduled cada CHECK_SECONDS
+    mientras la app está abierta. Relee la configuración en cada vuelta,
+    así los cambios hechos en la ventana de respaldos se aplican solos.
+    """
+    def __init__(self, check_seconds=CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            cfg = load_schedule()
+            if cfg["enabled"]:
+                try:
+                    run_scheduled(cfg)
+                    self.last_error = None
+                except Exception as e:
+                    # El destino puede ser una unidad desconectada: se reintenta.
+                    # La ventana de respaldos muestra last_error
+                    self.last_error = e
+            self._stop.wait(self.check_seconds)
+
+
+scheduler = BackupScheduler()
+
+
+# — Restauración —
+#
+# Se prepara en una carpeta temporal junto a la base (mismo disco, para que
+# el reemplazo sea un simple rename), se valida y recién entonces se cambia
+# el archivo y se reabren las conexiones, sin reiniciar la aplicación.
+
+REQUIRED_TABLES = ("users", "products", "clients", "documents", "document_items")
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def validate_database(path):
+    """
+    Verifica una base candidata: que sea SQLite, que su esquema no sea más
+    nuevo que el de la app, que tenga las tablas y que pase integrity_check.
+    Las referencias rotas (p. ej. ítems de productos borrados) no impiden
+    restaurar: se informan en "fk_violations".
+    """
+    with open(path, "rb") as f:
+        if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+            raise BackupError("El archivo no es una base de datos de Tech RioStore.")
+    conn = sqlite3.connect(path)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise BackupError(
+                f"El respaldo es de una versión más nueva de la aplicación (esquema {version})."
+            )
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        missing = [t for t in REQUIRED_TABLES if t not in tables]
+        if missing:
+            raise BackupError(f"Al respaldo le faltan tablas: {', '.join(missing)}")
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"El respaldo está dañado: {result}")
+        info = {
+            "schema_version": version,
+            "fk_violations": len(conn.execute("PRAGMA foreign_key_check").fetchall()),
+        }
+        for table in ("documents", "products", "clients"):
+            info[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return info
+    finally:
+        conn.close()
+
+
+def prepare_restore(src, db_path=DB_PATH, progress=None):
+    """
+    Extrae y valida el respaldo src: .zip de backup_database, .json de una
+    generación automática o un .db suelto. Devuelve el candidato para
+    apply_restore (o discard_restore si el usuario se arrepiente).
+    """
+    workdir = tempfile.mkdtemp(prefix="restore_", dir=os.path.dirname(db_path))
+    candidate = {"workdir": workdir, "db": os.path.join(workdir, ARCHIVE_DB),
+                 "key": None, "pdf_dir": None}
+    try:
+        lower = src.lower()
+        if lower.endswith(".zip"):
+            _extract_archive(src, candidate["db"], progress)
+        elif lower.endswith(".json"):
+            assemble_generation(src, workdir, progress)
+            key = os.path.join(workdir, "key.key")
+            pdf_dir = os.path.join(workdir, "pdf_backups")
+            candidate["key"] = key if os.path.exists(key) else None
+            candidate["pdf_dir"] = pdf_dir if os.path.isdir(pdf_dir) else None
+        else:
+            _copy_file(src, candidate["db"], progress)
+        candidate.update(validate_database(candidate["db"]))
+        return candidate
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+
+def discard_restore(candidate):
+    shutil.rmtree(candidate["workdir"], ignore_errors=True)
+
+
+def apply_restore(candidate, database):
+    """
+    Reemplaza la base en uso por la candidata y reabre las conexiones de
+    database (llamar desde el hilo de la ventana). La base anterior queda
+    como riostore.db.before-restore; si algo falla se vuelve a ella.
+    Todo ocurre con el turno de escritura de database: ningún otro hilo
+    escribe mientras se cambia el archivo.
+    """
+    if bulk_import.active():
+        raise BackupError("Hay una importación en curso; espere a que termine.")
+    if not _db_lock.acquire(timeout=5):
+        raise BackupError("Hay un respaldo en curso; intente de nuevo en un momento.")
+    try:
+        with ExitStack() as stack:
+            try:
+                stack.enter_context(database.writing())
+            except sqlite3.OperationalError:
+                raise BackupError("Se están guardando datos; intente de nuevo en un momento.")
+            _swap_database(candidate, database)
+        # Lo calculado con la base anterior ya no vale
+        models.cache.invalidate()
+        kpis.invalidate()
+    finally:
+        _db_lock.release()
+        discard_restore(candidate)
+
+
+def _swap_database(candidate, database):
+    db_path = database.db_path
+    previous = f"{db_path}.before-restore"
+    database.close_all()
+    # Con WAL, al cerrar la última conexión SQLite borra el -wal; si
+    # sigue ahí, otro programa tiene la base abierta y reemplazarla
+    # dejaría su WAL aplicado sobre la base restaurada
+    if os.path.exists(f"{db_path}-wal"):
+        database.reopen()
+        raise BackupError("La base está abierta en otro programa; ciérrelo e intente de nuevo.")
+    try:
+        os.replace(db_path, previous)
+    except OSError as e:
+        database.reopen()
+        raise BackupError(f"No se pudo reemplazar la base (¿está abierta en otro programa?): {e}")
+    try:
+        os.replace(candidate["db"], db_path)
+        database.reopen()   # aplica las migraciones si el respaldo es más viejo
+    except Exception:
+        database.close_all()
+        os.replace(previous, db_path)
+        database.reopen()
+        raise
+
+    if candidate["key"]:
+        shutil.copyfile(candidate["key"], database.key_path)
+        database.key = database._load_or_create_key(database.key_path)
+    if candidate["pdf_dir"]:
+        pdf_dir = get_pdf_backup_dir()
+        for entry in os.scandir(candidate["pdf_dir"]):
+            shutil.copyfile(entry.path, os.path.join(pdf_dir, entry.name))
+
+
+def _extract_archive(src, out_path, progress=None):
+    with zipfile.ZipFile(src) as zf:
+        names = zf.namelist()
+        if ARCHIVE_DB not in names:
+            raise BackupError("El .zip no es un respaldo de Tech RioStore.")
+        manifest = json.loads(zf.read(ARCHIVE_MANIFEST)) if ARCHIVE_MANIFEST in names else {}
+        size = zf.getinfo(ARCHIVE_DB).file_size or 1
+        h, done = hashlib.sha256(), 0
+        with zf.open(ARCHIVE_DB) as member, open(out_path, "wb") as out:
+            for block in iter(lambda: member.read(CHUNK), b""):
+                h.update(block)
+                out.write(block)
+                done += len(block)
+                if progress:
+                    progress(done / size)
+    if manifest.get("sha256") and h.hexdigest() != manifest["sha256"]:
+        raise BackupError("El respaldo no coincide con su suma de verificación.")
+
+
+def _copy_file(src, out_path, progress=None):
+    size, done = os.path.getsize(src) or 1, 0
+    with open(src, "rb") as f, open(out_path, "wb") as out:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            out.write(block)
+            done += len(block)
+            if progress:
+                progress(done / size)
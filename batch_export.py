@@ -0,0 +1,155 @@
+# batch_export.py
+"""
+Exportación en lote de documentos: un .zip con un PDF por documento o un
+único PDF combinado, con los mismos filtros que la ventana de Documentos.
+
+- Los datos de cada documento se leen de la BD en este proceso; los
+  procesos auxiliares solo dibujan (pdf_layout no toca la BD).
+- Como mucho 2 × procesos documentos en vuelo y se escriben en orden a
+  medida que terminan: la memoria no crece con el tamaño del lote.
+- Los PDFs que ya están en la caché de pdf_store no se vuelven a generar.
+- El PDF combinado se dibuja en un solo canvas (todas las páginas deben
+  quedar en el mismo archivo), así el encabezado y el logo se incrustan
+  una sola vez. reportlab guarda las páginas en memoria hasta save(), por
+  eso admite como mucho MAX_MERGED documentos; para más, el .zip.
+"""
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import pdf_layout
+import pdf_store
+from models import Document
+
+FORMATS = ("zip", "pdf")
+# Con menos documentos no compensa arrancar procesos
+MIN_PARALLEL = 16
+# Documentos como máximo en un PDF combinado (se arma entero en memoria)
+MAX_MERGED = 500
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def select_documents(type_=None, client_id=None, start=None, end=None, month=None):
+    """Ids de los documentos que cumplen los filtros, del más antiguo al más reciente."""
+    return list(Document.iter_ids(type_, client_id, start, end, month))
+
+
+def file_name(doc):
+    return f"{doc['type']}_{doc['number']:06d}.pdf"
+
+
+def export(doc_ids, dest, fmt="zip", workers=None, progress=None, cancel=None):
+    """
+    Escribe los documentos en dest. fmt: "zip" o "pdf" (combinado).
+    progress(hechos, total) se llama desde este hilo; cancel: threading.Event.
+    Al cancelar se borra el archivo a medias y se lanza ExportCancelled.
+    Devuelve la cantidad de documentos exportados.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    doc_ids = list(doc_ids)
+    if not doc_ids:
+        raise ValueError("No hay documentos para exportar.")
+    if fmt == "pdf" and len(doc_ids) > MAX_MERGED:
+        raise ValueError(
+            f"El PDF combinado admite hasta {MAX_MERGED} documentos ({len(doc_ids)} pedidos). "
+            "Exporte a .zip o acote los filtros."
+        )
+    workers = workers or os.cpu_count() or 1
+    tmp = f"{dest}.part"
+    try:
+        if fmt == "zip":
+            done = _export_zip(doc_ids, tmp, workers, progress, cancel)
+        else:
+            done = _export_pdf(doc_ids, tmp, progress, cancel)
+        os.replace(tmp, dest)
+        return done
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _check(cancel):
+    if cancel is not None and cancel.is_set():
+        raise ExportCancelled()
+
+
+def _snapshots(doc_ids):
+    for doc_id in doc_ids:
+        doc = pdf_store.snapshot(doc_id)
+        if doc is not None:
+            yield doc_id, doc
+
+
+def _cached(doc_id, doc):
+    path = pdf_store.cache_path(doc_id, doc)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _rendered(doc_ids, workers, cancel):
+    """(doc, bytes del PDF) en el orden de doc_ids."""
+    if workers == 1 or len(doc_ids) < MIN_PARALLEL:
+        for doc_id, doc in _snapshots(doc_ids):
+            _check(cancel)
+            data = _cached(doc_id, doc)
+            yield doc, data if data is not None else pdf_layout.render_bytes(doc)
+        return
+
+    # spawn también en Linux: hacer fork desde un hilo de la ventana no es seguro
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = deque()
+        for doc_id, doc in _snapshots(doc_ids):
+            _check(cancel)
+            data = _cached(doc_id, doc)
+            pending.append((doc, data if data is not None
+                            else pool.submit(pdf_layout.render_bytes, doc)))
+            while len(pending) >= 2 * workers:
+                doc, job = pending.popleft()
+                yield doc, job if isinstance(job, bytes) else job.result()
+        while pending:
+            _check(cancel)
+            doc, job = pending.popleft()
+            yield doc, job if isinstance(job, bytes) else job.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _export_zip(doc_ids, path, workers, progress, cancel):
+    total, done = len(doc_ids), 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for doc, data in _rendered(doc_ids, workers, cancel):
+            zf.writestr(file_name(doc), data)
+            done += 1
+            if progress:
+                progress(done, total)
+    return done
+
+
+def _export_pdf(doc_ids, path, progress, cancel):
+    total, done = len(doc_ids), 0
+    c = canvas.Canvas(path, pagesize=A4, invariant=1)
+    for _, doc in _snapshots(doc_ids):
+        _check(cancel)
+        pdf_layout.draw_document(c, doc)
+        done += 1
+        if progress:
+            progress(done, total)
+    c.save()
+    return done
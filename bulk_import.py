@@ -0,0 +1,275 @@
+# bulk_import.py
+"""
+Carga masiva de productos y clientes desde CSV (o XLSX si está instalado
+openpyxl).
+
+- El archivo se lee fila a fila y se procesa en lotes de BATCH_SIZE: la
+  memoria no depende del tamaño del archivo.
+- La primera fila son los encabezados; se aceptan nombres en español o en
+  inglés, con o sin tildes (ver PRODUCT_COLUMNS / CLIENT_COLUMNS). Las
+  columnas que no vienen en el archivo no se tocan al actualizar.
+- Los productos se actualizan si ya existe su código y los clientes si ya
+  existe su cédula/RUC; si no, se crean. Si el código se repite en el
+  archivo, gana la última fila.
+- Cada lote va en su propia transacción. Las filas con datos inválidos no
+  se cargan y se informan con su número de línea.
+"""
+import csv
+import io
+import os
+import threading
+import unicodedata
+
+from models import Client, Product, db
+
+BATCH_SIZE = 500
+# Errores que se guardan para mostrar (se cuentan todos)
+MAX_ERRORS = 1000
+
+# encabezado normalizado -> columna
+PRODUCT_COLUMNS = {
+    "code": "code", "codigo": "code", "cod": "code",
+    "name": "name", "nombre": "name", "producto": "name", "descripcion": "name",
+    "category": "category", "categoria": "category",
+    "cost_price": "cost_price", "cost": "cost_price", "costo": "cost_price",
+    "sell_price": "sell_price", "price": "sell_price", "precio": "sell_price",
+    "venta": "sell_price", "precio_venta": "sell_price", "pvp": "sell_price",
+    "type": "type", "tipo": "type",
+    "stock": "stock", "cantidad": "stock", "existencia": "stock",
+}
+CLIENT_COLUMNS = {
+    "full_name": "full_name", "name": "full_name", "nombre": "full_name",
+    "nombres": "full_name", "cliente": "full_name", "razon_social": "full_name",
+    "cedula": "cedula", "ruc": "cedula", "cedula/ruc": "cedula", "cedula_ruc": "cedula",
+    "contact": "contact", "contacto": "contact", "telefono": "contact", "celular": "contact",
+    "address": "address", "direccion": "address",
+    "email": "email", "correo": "email", "e-mail": "email",
+}
+KINDS = {
+    "products": (PRODUCT_COLUMNS, "name", Product.upsert_many),
+    "clients":  (CLIENT_COLUMNS, "full_name", Client.upsert_many),
+}
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+# Importaciones en curso (una restauración de respaldo no puede coincidir)
+_active = 0
+_active_lock = threading.Lock()
+
+
+def active():
+    with _active_lock:
+        return _active > 0
+
+
+def import_file(path, kind, progress=None, cancel=None):
+    """
+    Carga el archivo path (.csv o .xlsx). kind: "products" o "clients".
+    progress(fracción) se llama tras cada lote; cancel: threading.Event
+    (los lotes ya guardados se conservan).
+    Devuelve {"inserted", "updated", "rejected", "errors": [(línea, mensaje)]}.
+    """
+    global _active
+    columns, required, upsert = KINDS[kind]
+    result = {"inserted": 0, "updated": 0, "rejected": 0, "errors": []}
+
+    with _active_lock:
+        _active += 1
+    try:
+        _import_rows(path, kind, columns, required, upsert, result, progress, cancel)
+    finally:
+        with _active_lock:
+            _active -= 1
+    return result
+
+
+def _import_rows(path, kind, columns, required, upsert, result, progress, cancel):
+    rows, size, position, close = _open_rows(path)
+    try:
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("El archivo está vacío.")
+        fields, index = _map_header(header, columns)
+        if required not in fields:
+            raise ValueError("Falta la columna del nombre (Nombre).")
+        key = "code" if kind == "products" else "cedula"
+        normalize = _product if kind == "products" else _client
+
+        batch = {}   # clave -> fila (la última gana); sin clave: (línea,)
+        for line, raw in enumerate(rows, start=2):
+            if not any(v not in (None, "") for v in raw):
+                continue
+            values = {f: _cell(raw, i) for f, i in zip(fields, index)}
+            try:
+                normalize(values)
+            except ValueError as e:
+                result["rejected"] += 1
+                if len(result["errors"]) < MAX_ERRORS:
+                    result["errors"].append((line, str(e)))
+                continue
+            batch[values.get(key) or (line,)] = tuple(values[f] for f in fields)
+            if len(batch) >= BATCH_SIZE:
+                _flush(upsert, fields, batch, result, cancel)
+                if progress:
+                    progress(position() / size)
+        _flush(upsert, fields, batch, result, cancel)
+        if progress:
+            progress(1.0)
+    finally:
+        close()
+
+
+def _flush(upsert, fields, batch, result, cancel):
+    if cancel is not None and cancel.is_set():
+        raise ImportCancelled()
+    if not batch:
+        return
+    with db.transaction():
+        inserted, updated = upsert(fields, list(batch.values()))
+    result["inserted"] += inserted
+    result["updated"] += updated
+    batch.clear()
+
+
+# — Lectura —
+
+def _open_rows(path):
+    """(filas, tamaño, función que da la posición leída, función para cerrar)."""
+    if path.lower().endswith(".xlsx"):
+        return _xlsx_rows(path)
+    raw = open(path, "rb")
+    size = os.path.getsize(path) or 1
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+    sample = text.read(64 * 1024)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(text, dialect), size, raw.tell, text.close
+
+
+def _xlsx_rows(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Para importar archivos .xlsx instale openpyxl, o guarde el archivo como CSV.")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    ws = wb.active
+    state = {"row": 0}
+
+    def rows():
+        for row in ws.iter_rows(values_only=True):
+            state["row"] += 1
+            yield row
+    return rows(), ws.max_row or 1, lambda: state["row"], wb.close
+
+
+def _normal(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return "_".join(text.strip().lower().split())
+
+
+def _map_header(header, columns):
+    fields, index = [], []
+    for i, title in enumerate(header):
+        field = columns.get(_normal(title))
+        if field and field not in fields:
+            fields.append(field)
+            index.append(i)
+    return tuple(fields), index
+
+
+def _cell(raw, i):
+    value = raw[i] if i < len(raw) else None
+    if isinstance(value, str):
+        value = value.strip()
+    return value
+
+
+# — Validación —
+
+def _text(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)   # códigos numéricos de Excel: 123.0 -> "123"
+    return str(value)
+
+
+def _number(value, name):
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = value.replace("$", "").replace(" ", "")
+        # "1.234,56" o "1,234.56": el último separador es el decimal
+        if "," in text and "." in text:
+            if text.rfind(",") > text.rfind("."):
+                text = text.replace(".", "").replace(",", ".")
+            else:
+                text = text.replace(",", "")
+        else:
+            text = text.replace(",", ".")
+        try:
+            number = float(text)
+        except ValueError:
+            raise ValueError(f"{name} no es un número: {value}")
+    if number < 0:
+        raise ValueError(f"{name} no puede ser negativo: {value}")
+    return round(number, 2)
+
+
+def _product(v):
+    v["name"] = _text(v["name"])
+    if not v["name"]:
+        raise ValueError("Falta el nombre.")
+    if "code" in v:
+        v["code"] = _text(v["code"])
+    if "category" in v:
+        v["category"] = _text(v["category"]) or ""
+    if "type" in v:
+        type_ = (_text(v["type"]) or "Producto").capitalize()
+        if type_ not in ("Producto", "Servicio"):
+            raise ValueError(f"Tipo inválido: {v['type']}")
+        v["type"] = type_
+    for field, name in (("cost_price", "Costo"), ("sell_price", "Precio")):
+        if field in v:
+            v[field] = _number(v[field], name)
+    if "stock" in v:
+        stock = _number(v["stock"], "Stock")
+        if not stock.is_integer():
+            raise ValueError(f"Stock debe ser entero: {v['stock']}")
+        v["stock"] = int(stock)
+    if v.get("type") == "Servicio":
+        # Igual que en el formulario: los servicios no tienen costo ni stock
+        for field in ("cost_price", "stock"):
+            if field in v:
+                v[field] = 0
+
+
+def _client(v):
+    v["full_name"] = _text(v["full_name"])
+    if not v["full_name"]:
+        raise ValueError("Falta el nombre.")
+    if "cedula" in v:
+        numeric = isinstance(v["cedula"], (int, float))
+        v["cedula"] = _text(v["cedula"])
+        if v["cedula"] and numeric and len(v["cedula"]) in (9, 12):
+            # Excel guarda la cédula como número y se pierde el 0 inicial
+            v["cedula"] = "0" + v["cedula"]
+        if v["cedula"]:
+            v["cedula"] = v["cedula"].replace(" ", "").replace("-", "")
+            if not v["cedula"].isdigit():
+                raise ValueError(f"Cédula/RUC inválida: {v['cedula']}")
+    for field in ("contact", "address"):
+        if field in v:
+            v[field] = _text(v[field])
+    if "email" in v:
+        v["email"] = _text(v["email"])
+        if v["email"] and "@" not in v["email"]:
+            raise ValueError(f"Correo inválido: {v['email']}")
@@ -0,0 +1,194 @@
+# cli.py
+"""
+Tareas de Tech RioStore desde la línea de comandos (sin abrir la ventana).
+
+    python cli.py export-docs --type NOTA --from 2026-01-01 --to 2026-02-01 --out notas.zip
+    python cli.py backup --dest E:/respaldos
+    python cli.py export-sales --from 2026-01-01 --to 2027-01-01 --out ventas.csv
+    python cli.py import products catalogo.csv
+    python cli.py report --year 2026
+    python cli.py rebuild-summaries
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from datetime import date
+
+
+def _progress(done, total):
+    print(f"\r{done}/{total}", end="", file=sys.stderr, flush=True)
+
+
+def cmd_export_docs(args):
+    import batch_export
+
+    ids = batch_export.select_documents(args.type, args.client_id, args.start, args.end)
+    if not ids:
+        print("No hay documentos con esos filtros.", file=sys.stderr)
+        return 1
+    fmt = args.format or ("pdf" if args.out.lower().endswith(".pdf") else "zip")
+    try:
+        done = batch_export.export(ids, args.out, fmt, args.workers, _progress)
+    except KeyboardInterrupt:
+        print("\nExportación cancelada.", file=sys.stderr)
+        return 130
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"\n{done} documento(s) exportado(s) a {args.out}", file=sys.stderr)
+    return 0
+
+
+def cmd_export_sales(args):
+    import sales_export
+
+    fmt = args.format or ("jsonl" if args.out.lower().endswith((".jsonl", ".json")) else "csv")
+    try:
+        done = sales_export.export(args.out, fmt, _progress, type_=args.type,
+                                   client_id=args.client_id, start=args.start, end=args.end)
+    except KeyboardInterrupt:
+        print("\nExportación cancelada.", file=sys.stderr)
+        return 130
+    print(f"\n{done} documento(s) exportado(s) a {args.out}", file=sys.stderr)
+    return 0
+
+
+def cmd_backup(args):
+    import backups
+
+    if args.zip:
+        backups.backup_database(args.zip, progress=lambda f, stage: _progress(round(f * 100), 100))
+        print(f"\nRespaldo guardado en {args.zip}", file=sys.stderr)
+        return 0
+
+    cfg = backups.load_schedule()
+    if args.dest:
+        cfg["dest"] = args.dest
+    for key in ("keep_hourly", "keep_daily", "keep_weekly", "interval_minutes"):
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+    if not cfg["dest"]:
+        print("Indique --dest o configure el respaldo automático en la app.", file=sys.stderr)
+        return 1
+
+    if args.watch:
+        # Igual que dentro de la app, pero en primer plano
+        print(f"Respaldando en {cfg['dest']} cada {cfg['interval_minutes']} min (Ctrl+C para salir)",
+              file=sys.stderr)
+        try:
+            while True:
+                manifest = backups.run_scheduled(cfg)
+                if manifest:
+                    print(f"{manifest['created_at']}: {manifest['written']} bytes nuevos", file=sys.stderr)
+                time.sleep(backups.CHECK_SECONDS)
+        except KeyboardInterrupt:
+            return 0
+
+    manifest = backups.run_scheduled(cfg, force=True)
+    print(f"Generación {manifest['created_at']} en {cfg['dest']}: "
+          f"{manifest['written']} bytes nuevos", file=sys.stderr)
+    return 0
+
+
+def cmd_import(args):
+    import bulk_import
+
+    try:
+        result = bulk_import.import_file(
+            args.file, args.kind, progress=lambda f: _progress(round(f * 100), 100))
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"\nNuevos: {result['inserted']}  Actualizados: {result['updated']}  "
+          f"Con errores: {result['rejected']}", file=sys.stderr)
+    for line, error in result["errors"]:
+        print(f"línea {line}: {error}")
+    return 2 if result["rejected"] else 0
+
+
+def cmd_report(args):
+    import reports
+
+    start = date(args.year, 1, 1) if args.year else None
+    end = date(args.year + 1, 1, 1) if args.year else None
+    print("Ventas por mes")
+    for month, docs, amount in reports.monthly(args.year):
+        print(f"  {month}  {docs:6d} notas  {amount:12.2f}")
+    print("\nProductos más vendidos")
+    for p in reports.top_products(start, end, args.top):
+        print(f"  {p['code'] or '-':12} {(p['name'] or '(borrado)')[:40]:40} {p['qty']:8d} {p['amount']:12.2f}")
+    print("\nMejores clientes")
+    for c in reports.top_clients(start, end, args.top):
+        print(f"  {(c['full_name'] or '(borrado)')[:40]:40} {c['docs']:6d} {c['amount']:12.2f}")
+    print("\nPor método de pago")
+    for method, docs, amount in reports.by_payment(start, end):
+        print(f"  {method or '(sin dato)':20} {docs:6d} {amount:12.2f}")
+    return 0
+
+
+def cmd_rebuild_summaries(args):
+    import reports
+
+    reports.rebuild()
+    print("Resúmenes de ventas recalculados.", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Tech RioStore por línea de comandos")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export-docs", help="exporta documentos a un .zip o a un PDF combinado")
+    p.add_argument("--type", choices=("PROFORMA", "NOTA"), help="tipo de documento (por defecto todos)")
+    p.add_argument("--client-id", type=int, help="solo los documentos de este cliente")
+    p.add_argument("--from", dest="start", type=date.fromisoformat, help="desde (AAAA-MM-DD, incluida)")
+    p.add_argument("--to", dest="end", type=date.fromisoformat, help="hasta (AAAA-MM-DD, excluida)")
+    p.add_argument("--format", choices=("zip", "pdf"), help="por defecto según la extensión de --out")
+    p.add_argument("--workers", type=int, help="procesos a usar (por defecto todos los núcleos)")
+    p.add_argument("--out", required=True, help="archivo de salida")
+    p.set_defaults(func=cmd_export_docs)
+
+    p = sub.add_parser("export-sales", help="exporta ventas con sus ítems a CSV o JSON Lines")
+    p.add_argument("--type", choices=("PROFORMA", "NOTA"), help="tipo de documento (por defecto todos)")
+    p.add_argument("--client-id", type=int, help="solo los documentos de este cliente")
+    p.add_argument("--from", dest="start", type=date.fromisoformat, help="desde (AAAA-MM-DD, incluida)")
+    p.add_argument("--to", dest="end", type=date.fromisoformat, help="hasta (AAAA-MM-DD, excluida)")
+    p.add_argument("--format", choices=("csv", "jsonl"), help="por defecto según la extensión de --out")
+    p.add_argument("--out", required=True, help="archivo de salida")
+    p.set_defaults(func=cmd_export_sales)
+
+    p = sub.add_parser("backup", help="respaldo incremental con retención (o un .zip completo)")
+    p.add_argument("--dest", help="carpeta destino (por defecto la configurada en la app)")
+    p.add_argument("--zip", help="en vez de incremental, guardar un respaldo completo en este .zip")
+    p.add_argument("--watch", action="store_true", help="seguir respaldando según el intervalo")
+    p.add_argument("--interval-minutes", dest="interval_minutes", type=int)
+    p.add_argument("--keep-hourly", dest="keep_hourly", type=int)
+    p.add_argument("--keep-daily", dest="keep_daily", type=int)
+    p.add_argument("--keep-weekly", dest="keep_weekly", type=int)
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("import", help="carga productos o clientes desde un CSV/XLSX")
+    p.add_argument("kind", choices=("products", "clients"))
+    p.add_argument("file", help="archivo .csv o .xlsx (primera fila: encabezados)")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("report", help="ventas por mes, productos y clientes principales")
+    p.add_argument("--year", type=int, help="solo este año")
+    p.add_argument("--top", type=int, default=10, help="cuántos productos/clientes mostrar")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("rebuild-summaries", help="recalcula los resúmenes de ventas desde los documentos")
+    p.set_defaults(func=cmd_rebuild_summaries)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,5 +1,9 @@
 # db.py
+import random
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from cryptography.fernet import Fernet
 import os
 from paths import rel_to_data  # Importa la función centralizada
@@ -7,13 +11,108 @@ from paths import rel_to_data  # Importa la función centralizada
 DB_PATH = rel_to_data("riostore.db")
 KEY_PATH = rel_to_data("key.key")
 
+# Escrituras con run_transaction: si otra terminal tiene la base tomada se
+# espera poco en cada intento (ms) y se reintenta con pausas crecientes
+BUSY_ATTEMPTS = 5
+BUSY_WAIT_MS = 250
+BUSY_BACKOFF = 0.05
+# Espera normal por un bloqueo de escritura (ms)
+DEFAULT_BUSY_MS = 5000
+
+# Ajustes de cada conexión. WAL: los lectores (exportaciones, reportes,
+# PDF) no esperan al que escribe; con synchronous=NORMAL un corte de luz
+# puede perder la última transacción, pero no daña la base.
+MMAP_SIZE = 64 * 1024 * 1024     # bytes leídos por mmap
+CACHE_SIZE_KB = 16 * 1024        # caché de páginas por conexión
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {DEFAULT_BUSY_MS}",
+    "PRAGMA foreign_keys = ON",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+)
+
+
+def is_busy(error):
+    """True si el error de SQLite es "database is locked/busy"."""
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
+    )
+
 class Database:
     def __init__(self, db_path=DB_PATH, key_path=KEY_PATH):
         # Ya no necesitas crear la carpeta aquí, rel_to_data lo garantiza
         self.key = self._load_or_create_key(key_path)
-        self.conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-        self.conn.row_factory = sqlite3.Row
-        self._create_tables()
+        self.key_path = key_path
+        self.db_path = db_path
+        # sqlite3 no permite usar una conexión desde otro hilo: cada hilo
+        # (ventana, exportaciones en segundo plano) abre la suya. Leen todos
+        # a la vez (WAL); para escribir se turnan con _writer, así un hilo
+        # espera su turno en vez de reintentar contra SQLITE_BUSY
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer = threading.RLock()
+        self._conns = {}          # id del hilo -> conexión (para close_all)
+        self._generation = 0      # sube al cerrar todo: los hilos reabren
+        self._migrate()
+        self.has_fts = self._has_fts_tables()
+
+    @property
+    def conn(self):
+        """Conexión del hilo actual (se abre la primera vez que se usa)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            # check_same_thread=False solo para que close_all pueda cerrarla;
+            # cada conexión se usa únicamente desde su hilo
+            conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   timeout=DEFAULT_BUSY_MS / 1000, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.generation = self._generation
+            self._local.tx_depth = 0
+            self._register(conn)
+        return conn
+
+    def _register(self, conn):
+        with self._lock:
+            # De paso se cierran las de hilos que ya terminaron
+            alive = {t.ident for t in threading.enumerate()}
+            for ident in [i for i in self._conns if i not in alive]:
+                self._conns.pop(ident).close()
+            self._conns[threading.get_ident()] = conn
+
+    def close_all(self):
+        """
+        Cierra las conexiones de todos los hilos (p. ej. para reemplazar el
+        archivo). Al cerrar la última, SQLite vuelca el WAL en la base y
+        borra los archivos -wal y -shm.
+        """
+        with self._lock:
+            self._generation += 1
+            conns, self._conns = list(self._conns.values()), {}
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def reopen(self):
+        """Vuelve a abrir la base tras reemplazar el archivo (aplica migraciones pendientes)."""
+        self.close_all()
+        self.key = self._load_or_create_key(self.key_path)
+        self._migrate()
+        self.has_fts = self._has_fts_tables()
+
+    @property
+    def _tx_depth(self):
+        return getattr(self._local, "tx_depth", 0)
+
+    @_tx_depth.setter
+    def _tx_depth(self, value):
+        self._local.tx_depth = value
 
     def _load_or_create_key(self, path):
         if os.path.exists(path):
@@ -25,88 +124,560 @@ class Database:
                 f.write(key)
             return key
 
-    def _create_tables(self):
-        c = self.conn.cursor()
-
-        # Usuarios
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                full_name TEXT NOT NULL,
-                username TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL
-            );
-        """)
-
-        # Productos
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT,
-                name TEXT NOT NULL,
-                category TEXT,
-                cost_price REAL,
-                sell_price REAL,
-                type TEXT CHECK(type IN ('Producto','Servicio')),
-                stock INTEGER DEFAULT 0
-            );
-        """)
-
-        # Clientes (con migración de versiones anteriores)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS clients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                full_name TEXT NOT NULL,
-                cedula TEXT UNIQUE,
-                contact TEXT,
-                address TEXT,
-                email TEXT
-            );
-        """)
-        # migrar si faltan columnas en una versión anterior
-        existing_cols = [row["name"] for row in c.execute("PRAGMA table_info(clients)").fetchall()]
-        if "address" not in existing_cols:
-            c.execute("ALTER TABLE clients ADD COLUMN address TEXT;")
-        if "email" not in existing_cols:
-            c.execute("ALTER TABLE clients ADD COLUMN email TEXT;")
-
-        # Documentos (proformas y notas)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT CHECK(type IN ('PROFORMA','NOTA')) NOT NULL,
-                date TEXT NOT NULL,
-                client_id INTEGER NOT NULL,
-                discount REAL DEFAULT 0,
-                total REAL NOT NULL,
-                FOREIGN KEY(client_id) REFERENCES clients(id)
-            );
-        """)
-
-        # Ítems de documento
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS document_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id INTEGER NOT NULL,
-                product_id INTEGER NOT NULL,
-                qty INTEGER NOT NULL,
-                unit_price REAL NOT NULL,
-                subtotal REAL NOT NULL,
-                FOREIGN KEY(document_id) REFERENCES documents(id),
-                FOREIGN KEY(product_id) REFERENCES products(id)
-            );
-        """)
-
-        self.conn.commit()
+    def _migrate(self):
+        """Aplica en orden las migraciones pendientes según PRAGMA user_version."""
+        current = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if current >= SCHEMA_VERSION:
+            return  # esquema al día: no se ejecuta ningún DDL
+
+        # Las migraciones pueden rehacer tablas con datos viejos que no
+        # cumplen las claves foráneas
+        self.conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            for version, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+                with self._writer:
+                    c = self.conn.cursor()
+                    c.execute("BEGIN")
+                    try:
+                        migration(c)
+                        c.execute(f"PRAGMA user_version = {version}")
+                        self.conn.commit()
+                    except Exception:
+                        self.conn.rollback()
+                        raise
+        finally:
+            self.conn.execute("PRAGMA foreign_keys = ON")
+
+    def _has_fts_tables(self):
+        rows = self.conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name IN ('products_fts', 'clients_fts')"
+        ).fetchone()
+        return rows[0] == 2
+
+    @contextmanager
+    def writing(self, timeout=DEFAULT_BUSY_MS / 1000):
+        """
+        Turno de escritura de este proceso (un escritor a la vez; los
+        lectores no esperan). Si no llega en timeout segundos lanza el
+        mismo OperationalError que SQLite cuando la base está ocupada.
+        """
+        if not self._writer.acquire(timeout=timeout):
+            raise sqlite3.OperationalError("database is locked")
+        try:
+            yield
+        finally:
+            self._writer.release()
+
+    @contextmanager
+    def transaction(self, immediate=False, timeout=DEFAULT_BUSY_MS / 1000):
+        """
+        Agrupa varias escrituras en una sola transacción y un solo commit.
+        Si algo falla dentro del bloque se hace rollback de todo.
+        Las llamadas anidadas se integran en la transacción exterior.
+        """
+        if self._tx_depth:
+            self._tx_depth += 1
+            try:
+                yield self.conn.cursor()
+            finally:
+                self._tx_depth -= 1
+            return
+
+        with self.writing(timeout):
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self._tx_depth = 1
+            try:
+                yield cur
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                self._tx_depth = 0
+
+    def run_transaction(self, fn, attempts=BUSY_ATTEMPTS):
+        """
+        Ejecuta fn() dentro de una transacción IMMEDIATE y devuelve su
+        resultado. Si la base está ocupada por otra conexión, cada intento
+        espera a lo sumo BUSY_WAIT_MS y se reintenta hasta attempts veces
+        (fn puede correr más de una vez: no debe tener efectos fuera de la BD).
+        """
+        if self._tx_depth:
+            with self.transaction(immediate=True):
+                return fn()
+        for attempt in range(attempts):
+            self.conn.execute(f"PRAGMA busy_timeout = {BUSY_WAIT_MS}")
+            try:
+                with self.transaction(immediate=True, timeout=BUSY_WAIT_MS / 1000):
+                    return fn()
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt == attempts - 1:
+                    raise
+            finally:
+                self.conn.execute(f"PRAGMA busy_timeout = {DEFAULT_BUSY_MS}")
+            time.sleep(BUSY_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
 
     def execute(self, sql, params=()):
+        if not self._tx_depth:
+            with self.writing():
+                cur = self.conn.cursor()
+                try:
+                    cur.execute(sql, params)
+                except BaseException:
+                    # No dejar abierta la transacción implícita (retiene el bloqueo)
+                    self.conn.rollback()
+                    raise
+                self.conn.commit()
+                return cur
         cur = self.conn.cursor()
         cur.execute(sql, params)
-        self.conn.commit()
+        return cur
+
+    def executemany(self, sql, seq_of_params):
+        if not self._tx_depth:
+            with self.writing():
+                cur = self.conn.cursor()
+                try:
+                    cur.executemany(sql, seq_of_params)
+                except BaseException:
+                    # No dejar abierta la transacción implícita (retiene el bloqueo)
+                    self.conn.rollback()
+                    raise
+                self.conn.commit()
+                return cur
+        cur = self.conn.cursor()
+        cur.executemany(sql, seq_of_params)
         return cur
 
     def query(self, sql, params=()):
         cur = self.conn.cursor()
         cur.execute(sql, params)
         return cur.fetchall()
+
+    def iterate(self, sql, params=(), size=500):
+        """
+        Como query, pero entrega las filas de a size con fetchmany: para
+        recorrer resultados grandes sin tenerlos todos en memoria.
+        """
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+
+
+# ---------------------------------------------------------------------------
+# Migraciones del esquema
+# ---------------------------------------------------------------------------
+# Cada migración recibe un cursor dentro de una transacción abierta y se
+# registra en MIGRATIONS con su número. Al terminar, PRAGMA user_version
+# queda con ese número, así que nunca se vuelve a ejecutar.
+
+def _m001_base_schema(c):
+    # Usuarios
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL
+        );
+    """)
+
+    # Productos
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT,
+            name TEXT NOT NULL,
+            category TEXT,
+            cost_price REAL,
+            sell_price REAL,
+            type TEXT CHECK(type IN ('Producto','Servicio')),
+            stock INTEGER DEFAULT 0
+        );
+    """)
+
+    # Clientes (con migración de versiones anteriores)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL,
+            cedula TEXT UNIQUE,
+            contact TEXT,
+            address TEXT,
+            email TEXT
+        );
+    """)
+    # migrar si faltan columnas en una versión anterior
+    existing_cols = [row["name"] for row in c.execute("PRAGMA table_info(clients)").fetchall()]
+    if "address" not in existing_cols:
+        c.execute("ALTER TABLE clients ADD COLUMN address TEXT;")
+    if "email" not in existing_cols:
+        c.execute("ALTER TABLE clients ADD COLUMN email TEXT;")
+
+    # Documentos (proformas y notas)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT CHECK(type IN ('PROFORMA','NOTA')) NOT NULL,
+            date TEXT NOT NULL,
+            client_id INTEGER NOT NULL,
+            discount REAL DEFAULT 0,
+            total REAL NOT NULL,
+            FOREIGN KEY(client_id) REFERENCES clients(id)
+        );
+    """)
+
+    # Ítems de documento
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS document_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            qty INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            subtotal REAL NOT NULL,
+            FOREIGN KEY(document_id) REFERENCES documents(id),
+            FOREIGN KEY(product_id) REFERENCES products(id)
+        );
+    """)
+
+
+def _m002_lookup_indexes(c):
+    # Ítems por documento: índice cubriente para DocumentItem.get_by_document
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_document_items_document
+        ON document_items(document_id, product_id, qty, unit_price, subtotal);
+    """)
+    # Documentos por cliente y por tipo
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_client ON documents(client_id);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(type);")
+    # Productos: búsqueda por código, filtro por categoría (ya ordenado por nombre)
+    # y listado general ordenado por nombre
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_code ON products(code);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category, name);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);")
+    # Clientes: la cédula ya tiene índice por su restricción UNIQUE;
+    # falta el del listado ordenado por nombre
+    c.execute("CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(full_name);")
+
+
+def _m003_document_timestamps(c):
+    # documents.date se guarda como "DD/MM/YYYY/HH:MM", que no ordena ni
+    # filtra por rango. Se añade issued_at en ISO-8601 ("YYYY-MM-DDTHH:MM").
+    existing_cols = [row["name"] for row in c.execute("PRAGMA table_info(documents)").fetchall()]
+    if "issued_at" not in existing_cols:
+        c.execute("ALTER TABLE documents ADD COLUMN issued_at TEXT;")
+    c.execute("""
+        UPDATE documents SET issued_at =
+            substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2) ||
+            CASE WHEN length(date) >= 16 THEN 'T' || substr(date, 12, 5) ELSE 'T00:00' END
+        WHERE issued_at IS NULL AND substr(date, 3, 1) = '/' AND substr(date, 6, 1) = '/';
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_issued ON documents(issued_at);")
+    # (type, issued_at) reemplaza al índice solo por tipo
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_type_issued ON documents(type, issued_at);")
+    c.execute("DROP INDEX IF EXISTS idx_documents_type;")
+
+
+def _m004_document_sequences(c):
+    # Contadores por tipo (y opcionalmente por año; 0 = serie continua)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS document_sequences (
+            type TEXT NOT NULL,
+            year INTEGER NOT NULL DEFAULT 0,
+            last_value INTEGER NOT NULL,
+            PRIMARY KEY(type, year)
+        );
+    """)
+    existing_cols = [row["name"] for row in c.execute("PRAGMA table_info(documents)").fetchall()]
+    if "number" not in existing_cols:
+        c.execute("ALTER TABLE documents ADD COLUMN number INTEGER;")
+    # Numeración de los documentos existentes: orden de creación dentro de su tipo
+    c.execute("""
+        WITH ranked AS (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY type ORDER BY id) AS n
+            FROM documents
+        )
+        UPDATE documents SET number = (SELECT n FROM ranked WHERE ranked.id = documents.id)
+        WHERE number IS NULL;
+    """)
+    c.execute("""
+        INSERT OR IGNORE INTO document_sequences (type, year, last_value)
+        SELECT type, 0, MAX(number) FROM documents GROUP BY type;
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_documents_number ON documents(type, number);")
+
+
+def _fts5_available(c):
+    # No todas las compilaciones de SQLite traen FTS5 (ni el tokenizador trigram)
+    try:
+        c.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram');")
+        c.execute("DROP TABLE temp._fts5_probe;")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _create_fts(c, table, columns):
+    # Tabla FTS5 de contenido externo + triggers que la mantienen sincronizada
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{col}" for col in columns)
+    old_vals = ", ".join(f"old.{col}" for col in columns)
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            {cols}, content='{table}', content_rowid='id', tokenize='trigram'
+        );
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {table}_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END;
+    """)
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {table}_fts(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+    """)
+    c.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild');")
+
+
+def _m005_full_text_search(c):
+    # Sin FTS5 la migración no crea nada y las búsquedas siguen con LIKE
+    if not _fts5_available(c):
+        return
+    _create_fts(c, "products", ("code", "name"))
+    _create_fts(c, "clients", ("full_name", "cedula"))
+
+
+def _m006_document_snapshots(c):
+    # Todo lo que el PDF necesita queda en la base de datos, para poder
+    # regenerarlo aunque el producto cambie de nombre o se borre.
+    doc_cols = [row["name"] for row in c.execute("PRAGMA table_info(documents)").fetchall()]
+    if "payment_method" not in doc_cols:
+        c.execute("ALTER TABLE documents ADD COLUMN payment_method TEXT;")
+    if "additional_info" not in doc_cols:
+        c.execute("ALTER TABLE documents ADD COLUMN additional_info TEXT;")
+    item_cols = [row["name"] for row in c.execute("PRAGMA table_info(document_items)").fetchall()]
+    if "code" not in item_cols:
+        c.execute("ALTER TABLE document_items ADD COLUMN code TEXT;")
+    if "name" not in item_cols:
+        c.execute("ALTER TABLE document_items ADD COLUMN name TEXT;")
+    # Ítems existentes: se copian los datos actuales del producto
+    c.execute("""
+        UPDATE document_items SET
+            code = (SELECT p.code FROM products p WHERE p.id = document_items.product_id),
+            name = (SELECT p.name FROM products p WHERE p.id = document_items.product_id)
+        WHERE name IS NULL;
+    """)
+
+
+# Resúmenes de ventas (notas de venta; las proformas no son ventas) por día.
+# Los mantienen los triggers de _m007; rebuild_sales_summaries los recalcula.
+_UPSERT_PRODUCT = (
+    "ON CONFLICT(day, product_id) DO UPDATE SET qty = qty + excluded.qty, "
+    "amount = amount + excluded.amount, lines = lines + excluded.lines;"
+)
+_UPSERT_CLIENT = (
+    "ON CONFLICT(day, client_id) DO UPDATE SET docs = docs + excluded.docs, "
+    "amount = amount + excluded.amount;"
+)
+_UPSERT_PAYMENT = (
+    "ON CONFLICT(day, payment_method) DO UPDATE SET docs = docs + excluded.docs, "
+    "amount = amount + excluded.amount;"
+)
+
+
+def _summary_doc(ref, sign):
+    # Suma (sign="") o resta (sign="-") el documento ref (new/old)
+    cond = f"WHERE {ref}.type = 'NOTA' AND {ref}.issued_at IS NOT NULL"
+    return f"""
+        INSERT INTO sales_daily_client (day, client_id, docs, amount)
+            SELECT substr({ref}.issued_at, 1, 10), {ref}.client_id, {sign}1, {sign}{ref}.total
+            {cond} {_UPSERT_CLIENT}
+        INSERT INTO sales_daily_payment (day, payment_method, docs, amount)
+            SELECT substr({ref}.issued_at, 1, 10), COALESCE({ref}.payment_method, ''), {sign}1, {sign}{ref}.total
+            {cond} {_UPSERT_PAYMENT}
+    """
+
+
+def _summary_doc_items(ref, sign):
+    # Todos los ítems del documento ref, agrupados por producto
+    return f"""
+        INSERT INTO sales_daily_product (day, product_id, qty, amount, lines)
+            SELECT substr({ref}.issued_at, 1, 10), product_id,
+                   {sign}SUM(qty), {sign}SUM(subtotal), {sign}COUNT(*)
+            FROM document_items
+            WHERE document_id = {ref}.id AND {ref}.type = 'NOTA' AND {ref}.issued_at IS NOT NULL
+            GROUP BY product_id {_UPSERT_PRODUCT}
+    """
+
+
+def _summary_item(ref, sign):
+    # Un ítem ref; el día y el tipo salen de su documento
+    return f"""
+        INSERT INTO sales_daily_product (day, product_id, qty, amount, lines)
+            SELECT substr(d.issued_at, 1, 10), {ref}.product_id, {sign}{ref}.qty, {sign}{ref}.subtotal, {sign}1
+            FROM documents d
+            WHERE d.id = {ref}.document_id AND d.type = 'NOTA' AND d.issued_at IS NOT NULL
+            {_UPSERT_PRODUCT}
+    """
+
+
+def rebuild_sales_summaries(c):
+    """Recalcula los resúmenes desde documents y document_items."""
+    for table in ("sales_daily_product", "sales_daily_client", "sales_daily_payment"):
+        c.execute(f"DELETE FROM {table};")
+    c.execute("""
+        INSERT INTO sales_daily_product (day, product_id, qty, amount, lines)
+        SELECT substr(d.issued_at, 1, 10), di.product_id, SUM(di.qty), SUM(di.subtotal), COUNT(*)
+        FROM documents d JOIN document_items di ON di.document_id = d.id
+        WHERE d.type = 'NOTA' AND d.issued_at IS NOT NULL
+        GROUP BY 1, 2;
+    """)
+    c.execute("""
+        INSERT INTO sales_daily_client (day, client_id, docs, amount)
+        SELECT substr(issued_at, 1, 10), client_id, COUNT(*), SUM(total)
+        FROM documents WHERE type = 'NOTA' AND issued_at IS NOT NULL
+        GROUP BY 1, 2;
+    """)
+    c.execute("""
+        INSERT INTO sales_daily_payment (day, payment_method, docs, amount)
+        SELECT substr(issued_at, 1, 10), COALESCE(payment_method, ''), COUNT(*), SUM(total)
+        FROM documents WHERE type = 'NOTA' AND issued_at IS NOT NULL
+        GROUP BY 1, 2;
+    """)
+
+
+def _m007_sales_summaries(c):
+    # day = "YYYY-MM-DD" (prefijo de issued_at). amount de productos es la
+    # suma de subtotales (antes del descuento del documento); la de
+    # clientes y métodos de pago, la del total del documento.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_product (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            lines INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(day, product_id)
+        ) WITHOUT ROWID;
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_client (
+            day TEXT NOT NULL,
+            client_id INTEGER NOT NULL,
+            docs INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(day, client_id)
+        ) WITHOUT ROWID;
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily_payment (
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            docs INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(day, payment_method)
+        ) WITHOUT ROWID;
+    """)
+    triggers = {
+        "sales_doc_ai": ("AFTER INSERT ON documents", _summary_doc("new", "")),
+        # Borrar el documento descuenta también sus ítems (si se borran
+        # después, ya no tienen documento y su trigger no hace nada)
+        "sales_doc_ad": ("AFTER DELETE ON documents",
+                         _summary_doc("old", "-") + _summary_doc_items("old", "-")),
+        "sales_doc_au": ("AFTER UPDATE OF type, issued_at, client_id, total, payment_method ON documents",
+                         _summary_doc("old", "-") + _summary_doc("new", "")),
+        "sales_doc_move": ("AFTER UPDATE OF type, issued_at ON documents",
+                           _summary_doc_items("old", "-") + _summary_doc_items("new", "")),
+        "sales_item_ai": ("AFTER INSERT ON document_items", _summary_item("new", "")),
+        "sales_item_ad": ("AFTER DELETE ON document_items", _summary_item("old", "-")),
+        "sales_item_au": ("AFTER UPDATE OF document_id, product_id, qty, subtotal ON document_items",
+                          _summary_item("old", "-") + _summary_item("new", "")),
+    }
+    for name, (event, body) in triggers.items():
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END;")
+    rebuild_sales_summaries(c)
+
+
+def _m008_dashboard_indexes(c):
+    # Panel principal: productos con stock bajo y "¿el cliente compró
+    # después de la proforma?" (reemplaza al índice solo por cliente)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_type_stock ON products(type, stock);")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_documents_client_type_issued
+        ON documents(client_id, type, issued_at);
+    """)
+    c.execute("DROP INDEX IF EXISTS idx_documents_client;")
+
+
+def _m009_stock_ledger(c):
+    # Movimientos de stock (solo se agregan filas). Sin FOREIGN KEY: el
+    # historial se conserva aunque se borre el producto o el documento.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            at TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            document_id INTEGER,
+            note TEXT
+        );
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_movements_product
+        ON stock_movements(product_id, at, id);
+    """)
+    # Stock del producto tras el movimiento movement_id (0 = apertura)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            product_id INTEGER NOT NULL,
+            movement_id INTEGER NOT NULL,
+            at TEXT NOT NULL,
+            stock INTEGER NOT NULL,
+            PRIMARY KEY(product_id, movement_id)
+        ) WITHOUT ROWID;
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_snapshots_at
+        ON stock_snapshots(product_id, at);
+    """)
+    # Saldo de apertura: el stock actual de cada producto
+    c.execute("""
+        INSERT OR IGNORE INTO stock_snapshots (product_id, movement_id, at, stock)
+        SELECT id, 0, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'), COALESCE(stock, 0)
+        FROM products;
+    """)
+
+
+MIGRATIONS = [
+    (1, _m001_base_schema),
+    (2, _m002_lookup_indexes),
+    (3, _m003_document_timestamps),
+    (4, _m004_document_sequences),
+    (5, _m005_full_text_search),
+    (6, _m006_document_snapshots),
+    (7, _m007_sales_summaries),
+    (8, _m008_dashboard_indexes),
+    (9, _m009_stock_ledger),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
@@ -1,9 +1,11 @@
 # gui/backup.py
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import shutil
 import os
+import threading
 from gui.utils import maximize_window
+import backups
+import models
 
 class BackupWindow:
     def __init__(self, master, user):
@@ -23,30 +25,268 @@ class BackupWindow:
         # botones exportar/importar
         btf = ctk.CTkFrame(self.frame)
         btf.pack(pady=40)
-        ctk.CTkButton(btf, text="Exportar Copia de Seguridad", width=200,
-                      command=self._export).pack(pady=10)
-        ctk.CTkButton(btf, text="Importar copia existente", width=200,
-                      command=self._import).pack(pady=10)
+        self.export_btn = ctk.CTkButton(btf, text="Exportar Copia de Seguridad", width=200,
+                                        command=self._export)
+        self.export_btn.pack(pady=10)
+        self.import_btn = ctk.CTkButton(btf, text="Importar copia existente", width=200,
+                                        command=self._import)
+        self.import_btn.pack(pady=10)
+
+        # Progreso del respaldo (se hace en segundo plano)
+        self.progress = ctk.CTkProgressBar(btf, width=300)
+        self.progress.set(0)
+        self.status_lbl = ctk.CTkLabel(btf, text="")
+        self._job = None
+        # Al cerrar la ventana (el after de _poll_import ya no corre) no debe
+        # quedar una restauración extraída junto a la base
+        self.frame.bind("<Destroy>", lambda e: self._abandon_import(), add="+")
+
+        self._build_schedule()
+
+    def _build_schedule(self):
+        # — Respaldo automático (incremental, con retención) —
+        cfg = backups.load_schedule()
+        schf = ctk.CTkFrame(self.frame)
+        schf.pack(pady=10, padx=40)
+        ctk.CTkLabel(schf, text="Respaldo automático", font=("Arial", 18))\
+            .grid(row=0, column=0, columnspan=3, pady=(10, 10))
+
+        self.sch_enabled = ctk.CTkSwitch(schf, text="Activado")
+        if cfg["enabled"]:
+            self.sch_enabled.select()
+        self.sch_enabled.grid(row=1, column=0, columnspan=3, pady=5)
+
+        ctk.CTkLabel(schf, text="Carpeta destino:").grid(row=2, column=0, sticky="e", padx=5, pady=5)
+        self.sch_dest = ctk.CTkEntry(schf, width=300)
+        self.sch_dest.insert(0, cfg["dest"])
+        self.sch_dest.grid(row=2, column=1, padx=5, pady=5)
+        ctk.CTkButton(schf, text="Elegir...", width=80, command=self._choose_dest)\
+            .grid(row=2, column=2, padx=5, pady=5)
+
+        self.sch_fields = {}
+        labels = [
+            ("interval_minutes", "Cada (minutos):"),
+            ("keep_hourly",      "Conservar por hora:"),
+            ("keep_daily",       "Conservar por día:"),
+            ("keep_weekly",      "Conservar por semana:"),
+        ]
+        for i, (key, text) in enumerate(labels, start=3):
+            ctk.CTkLabel(schf, text=text).grid(row=i, column=0, sticky="e", padx=5, pady=5)
+            e = ctk.CTkEntry(schf, width=80)
+            e.insert(0, str(cfg[key]))
+            e.grid(row=i, column=1, sticky="w", padx=5, pady=5)
+            self.sch_fields[key] = e
+
+        btns = ctk.CTkFrame(schf, fg_color="transparent")
+        btns.grid(row=7, column=0, columnspan=3, pady=10)
+        ctk.CTkButton(btns, text="Guardar", width=120, command=self._save_schedule)\
+            .pack(side="left", padx=5)
+        self.sch_now_btn = ctk.CTkButton(btns, text="Respaldar ahora", width=140,
+                                         command=self._backup_now)
+        self.sch_now_btn.pack(side="left", padx=5)
+        self.sch_status = ctk.CTkLabel(schf, text="")
+        self.sch_status.grid(row=8, column=0, columnspan=3, pady=(0, 10))
+        self._show_last_generation(cfg["dest"])
+
+    def _choose_dest(self):
+        folder = filedialog.askdirectory(title="Carpeta para los respaldos automáticos")
+        if folder:
+            self.sch_dest.delete(0, "end")
+            self.sch_dest.insert(0, folder)
+
+    def _read_schedule(self):
+        cfg = backups.load_schedule()
+        cfg["enabled"] = bool(self.sch_enabled.get())
+        cfg["dest"] = self.sch_dest.get().strip()
+        for key, entry in self.sch_fields.items():
+            value = int(entry.get())
+            if value < 1:
+                raise ValueError
+            cfg[key] = value
+        return cfg
+
+    def _save_schedule(self):
+        try:
+            cfg = self._read_schedule()
+        except ValueError:
+            return messagebox.showerror("Error", "Los valores deben ser números enteros positivos.")
+        if cfg["enabled"] and not os.path.isdir(cfg["dest"]):
+            return messagebox.showerror("Error", "La carpeta destino no existe.")
+        backups.save_schedule(cfg)
+        backups.scheduler.start()
+        messagebox.showinfo("OK", "Configuración de respaldo automático guardada.")
+
+    def _show_last_generation(self, dest):
+        gens = backups.list_generations(dest) if dest else []
+        if gens:
+            text = f"Último respaldo: {gens[-1][0]:%d/%m/%Y %H:%M} ({len(gens)} guardados)"
+        else:
+            text = "Todavía no hay respaldos automáticos."
+        if backups.scheduler.last_error:
+            text += f"\nÚltimo error: {backups.scheduler.last_error}"
+        self.sch_status.configure(text=text)
+
+    def _backup_now(self):
+        try:
+            cfg = self._read_schedule()
+        except ValueError:
+            return messagebox.showerror("Error", "Los valores deben ser números enteros positivos.")
+        if not os.path.isdir(cfg["dest"]):
+            return messagebox.showerror("Error", "La carpeta destino no existe.")
+
+        job = {"done": False, "error": None}
+
+        def run():
+            try:
+                backups.run_scheduled(cfg, force=True)
+            except Exception as e:
+                job["error"] = e
+            job["done"] = True
+
+        def poll():
+            if not self.frame.winfo_exists():
+                return
+            if not job["done"]:
+                self.frame.after(200, poll)
+                return
+            self.sch_now_btn.configure(state="normal")
+            self._show_last_generation(cfg["dest"])
+            if job["error"] is not None:
+                messagebox.showerror("Error", str(job["error"]))
+
+        self.sch_now_btn.configure(state="disabled")
+        self.sch_status.configure(text="Respaldando...")
+        threading.Thread(target=run, daemon=True).start()
+        self.frame.after(200, poll)
 
     def _export(self):
-        src = "data/riostore.db"
-        dst = filedialog.asksaveasfilename(defaultextension=".db",
-                                           filetypes=[("SQLite DB","*.db")])
+        if self._job is not None:
+            return
+        dst = filedialog.asksaveasfilename(defaultextension=".zip",
+                                           filetypes=[("Respaldo Tech RioStore","*.zip")],
+                                           initialfile=backups.default_name())
         if not dst: return
-        try:
-            shutil.copy(src, dst)
-            messagebox.showinfo("OK", f"Respaldo guardado en:\n{dst}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        job = self._job = {"fraction": 0.0, "stage": "copia", "result": None, "error": None}
+
+        def progress(fraction, stage):
+            job["fraction"], job["stage"] = fraction, stage
+
+        def run():
+            try:
+                job["result"] = backups.backup_database(dst, progress=progress)
+            except Exception as e:
+                job["error"] = e
+
+        self.export_btn.configure(state="disabled")
+        self.progress.set(0)
+        self.progress.pack(pady=(20, 5))
+        self.status_lbl.pack()
+        threading.Thread(target=run, daemon=True).start()
+        self.frame.after(100, lambda: self._poll_export(dst))
+
+    def _poll_export(self, dst):
+        job = self._job
+        if not self.frame.winfo_exists():
+            return
+        self.progress.set(job["fraction"])
+        self.status_lbl.configure(text=f"Respaldo en curso ({job['stage']})... {job['fraction']:.0%}")
+        if job["result"] is None and job["error"] is None:
+            self.frame.after(100, lambda: self._poll_export(dst))
+            return
+
+        self._job = None
+        self.progress.pack_forget()
+        self.status_lbl.pack_forget()
+        self.export_btn.configure(state="normal")
+        if job["error"] is not None:
+            messagebox.showerror("Error", str(job["error"]))
+        else:
+            messagebox.showinfo("OK", f"Respaldo verificado y guardado en:\n{dst}")
 
     def _import(self):
-        src = filedialog.askopenfilename(filetypes=[("SQLite DB","*.db")])
+        if self._job is not None:
+            return
+        src = filedialog.askopenfilename(filetypes=[
+            ("Respaldo Tech RioStore", "*.zip *.db *.json"),
+            ("Respaldo completo", "*.zip"), ("SQLite DB", "*.db"),
+            ("Respaldo automático", "*.json")])
         if not src: return
+
+        # Se extrae y valida en segundo plano; el cambio de base, en este hilo
+        job = self._job = {"fraction": 0.0, "result": None, "error": None,
+                           "abandoned": False, "lock": threading.Lock()}
+
+        def progress(fraction):
+            job["fraction"] = fraction
+
+        def run():
+            try:
+                result = backups.prepare_restore(src, progress=progress)
+            except Exception as e:
+                job["error"] = e
+                return
+            # Si la ventana se cerró mientras tanto, nadie va a usar la copia
+            with job["lock"]:
+                if not job["abandoned"]:
+                    job["result"] = result
+                    return
+            backups.discard_restore(result)
+
+        self.export_btn.configure(state="disabled")
+        self.import_btn.configure(state="disabled")
+        self.progress.set(0)
+        self.progress.pack(pady=(20, 5))
+        self.status_lbl.pack()
+        threading.Thread(target=run, daemon=True).start()
+        self.frame.after(100, self._poll_import)
+
+    def _poll_import(self):
+        job = self._job
+        if not self.frame.winfo_exists():
+            return self._abandon_import()
+        self.progress.set(job["fraction"])
+        self.status_lbl.configure(text=f"Verificando respaldo... {job['fraction']:.0%}")
+        if job["result"] is None and job["error"] is None:
+            self.frame.after(100, self._poll_import)
+            return
+
+        self._job = None
+        self.progress.pack_forget()
+        self.status_lbl.pack_forget()
+        self.export_btn.configure(state="normal")
+        self.import_btn.configure(state="normal")
+        if job["error"] is not None:
+            return messagebox.showerror("Error", f"No se puede restaurar:\n{job['error']}")
+
+        candidate = job["result"]
+        msg = (f"El respaldo es válido:\n"
+               f"  {candidate['documents']} documentos\n"
+               f"  {candidate['products']} productos\n"
+               f"  {candidate['clients']} clientes\n")
+        if candidate["fk_violations"]:
+            msg += f"\nAviso: {candidate['fk_violations']} referencias a registros que ya no existen.\n"
+        msg += "\nSe reemplazarán los datos actuales. ¿Continuar?"
+        if not messagebox.askyesno("Restaurar", msg):
+            return backups.discard_restore(candidate)
         try:
-            shutil.copy(src, "data/riostore.db")
-            messagebox.showinfo("OK","Base de datos restaurada. Reinicie la app.")
+            backups.apply_restore(candidate, models.db)
         except Exception as e:
-            messagebox.showerror("Error", str(e))
+            return messagebox.showerror("Error", f"No se pudo restaurar:\n{e}")
+        messagebox.showinfo("OK", "Base de datos restaurada. Ya puede seguir trabajando.")
+
+    def _abandon_import(self):
+        # La copia extraída se descarta aquí o, si todavía se está
+        # preparando, en el hilo de run() al terminar
+        job = self._job
+        if job is None or "lock" not in job:
+            return  # no hay importación en curso (o es una exportación)
+        self._job = None
+        with job["lock"]:
+            job["abandoned"] = True
+            result = job["result"]
+        if result is not None:
+            backups.discard_restore(result)
 
     def _back(self):
         self.frame.destroy()
@@ -1,8 +1,14 @@
 # gui/clients.py
 import customtkinter as ctk
-from tkinter import messagebox, ttk
+from tkinter import messagebox
 import ctypes
+import sqlite3
 from models import Client
+from gui.utils import BulkImport, PagedSource, VirtualTable, text_sort_key
+from gui.search import DEBOUNCE_MS
+
+# Clientes por página; la siguiente se pide al llegar a ella con el scroll
+PAGE_SIZE = 200
 
 SW_MAXIMIZE = 3
 def maximize_window(win):
@@ -44,10 +50,13 @@ class ClientsWindow:
         # 2) Search
         self.search_frame.pack(fill="x", pady=10, padx=20)
         self.search_var = ctk.StringVar()
-        ctk.CTkEntry(self.search_frame,
-                     placeholder_text="Buscar por nombre o cédula/RUC...",
-                     textvariable=self.search_var)\
-            .pack(side="left", fill="x", expand=True)
+        search_e = ctk.CTkEntry(self.search_frame,
+                                placeholder_text="Buscar por nombre o cédula/RUC...",
+                                textvariable=self.search_var)
+        search_e.pack(side="left", fill="x", expand=True)
+        # Busca al dejar de escribir; cada búsqueda reemplaza a la anterior
+        self._search_job = None
+        search_e.bind("<KeyRelease>", self._schedule_search)
         ctk.CTkButton(self.search_frame, text="Buscar",
                       command=self._load_clients).pack(side="left", padx=5)
         ctk.CTkButton(self.search_frame, text="Limpiar",
@@ -64,14 +73,13 @@ class ClientsWindow:
             "address":"Dirección",
             "email":"Email"
         }
-        self.tree = ttk.Treeview(self.table_frame,
-                                 columns=cols, show="headings",
-                                 displaycolumns=display)
-        for c in cols:
-            self.tree.heading(c, text=heads.get(c,""),
-                              command=lambda _c=c: self.sort_by(_c, False))
-            self.tree.column(c, width=150, anchor="center")
-        self.tree.pack(fill="both", expand=True)
+        self.table = VirtualTable(self.table_frame,
+                                  columns=cols,
+                                  headings=heads,
+                                  displaycolumns=display,
+                                  widths={c: 150 for c in cols},
+                                  sort_key=text_sort_key)
+        self.table.pack(fill="both", expand=True)
 
         # 4) Actions
         self.actions_frame.pack(fill="x", pady=10, padx=20)
@@ -84,6 +92,8 @@ class ClientsWindow:
         ctk.CTkButton(self.actions_frame, text="Eliminar Seleccionado",
                       command=self._delete_client)\
             .pack(side="left", padx=5)
+        BulkImport(self.actions_frame, self.frame, "clients",
+                   self._load_clients).pack(side="left", padx=5)
 
         # initial load
         self._load_clients()
@@ -93,15 +103,34 @@ class ClientsWindow:
             self._open_form(False)
 
     def _load_clients(self):
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-        term = self.search_var.get().strip()
-        items = Client.search(term) if term else Client.all()
-        for c in items:
-            self.tree.insert("", "end", values=(
-                c["id"], c["full_name"], c["cedula"] or "",
-                c["contact"] or "", c["address"] or "", c["email"] or ""
-            ))
+        # Búsqueda en SQL; la tabla pide las páginas a medida que se recorre
+        term = self.search_var.get().strip() or None
+        self.table.load(lambda: PagedSource(
+            lambda after, limit: self._fetch_page(term, after, limit),
+            count=lambda: Client.count(term),
+            page_size=PAGE_SIZE
+        ))
+
+    def _schedule_search(self, event=None):
+        if self._search_job:
+            self.frame.after_cancel(self._search_job)
+        self._search_job = self.frame.after(DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        self._load_clients()
+
+    @staticmethod
+    def _fetch_page(term, after, limit):
+        items = Client.page(after, limit, term)
+        rows = [
+            (c["id"], c["full_name"], c["cedula"] or "",
+             c["contact"] or "", c["address"] or "", c["email"] or "")
+            for c in items
+        ]
+        if items:
+            after = (items[-1]["full_name"], items[-1]["id"])
+        return rows, after
 
     def _reset_search(self):
         self.search_var.set("")
@@ -110,10 +139,10 @@ class ClientsWindow:
     def _open_form(self, edit):
         self.edit_id = None
         if edit:
-            sel = self.tree.selection()
+            sel = self.table.selected()
             if not sel:
                 return messagebox.showerror("Error","Seleccione un cliente.")
-            self.edit_id = self.tree.item(sel[0])["values"][0]
+            self.edit_id = sel[0][0]
 
         # hide listing frames
         for f in (self.header_frame, self.search_frame,
@@ -152,10 +181,9 @@ class ClientsWindow:
         d = {k: w.get().strip() for k,w in self.widgets.items()}
         if not d["full_name"]:
             return messagebox.showerror("Error","El nombre es obligatorio.")
-        existing = [c["cedula"] for c in Client.all() if c["cedula"]]
-        if d["cedula"] and d["cedula"] in existing:
-            if not (self.edit_id and Client.get(self.edit_id)["cedula"]==d["cedula"]):
-                return messagebox.showerror("Error","Cédula/RUC ya registrado.")
+        existing = Client.by_cedula(d["cedula"]) if d["cedula"] else None
+        if existing and existing["id"] != self.edit_id:
+            return messagebox.showerror("Error","Cédula/RUC ya registrado.")
         # commit
         if self.edit_id:
             Client.update(self.edit_id,
@@ -182,24 +210,19 @@ class ClientsWindow:
         self.actions_frame.pack(fill="x", pady=10, padx=20)
 
     def _delete_client(self):
-        sel = self.tree.selection()
+        sel = self.table.selected()
         if not sel:
             return messagebox.showerror("Error","Seleccione un cliente.")
-        cid = self.tree.item(sel[0])["values"][0]
+        cid = sel[0][0]
         if not messagebox.askyesno("Confirmar","¿Eliminar este cliente?"):
             return
-        Client.delete(cid)
+        try:
+            Client.delete(cid)
+        except sqlite3.IntegrityError:
+            return messagebox.showerror("No se puede eliminar",
+                                        "El cliente tiene documentos guardados.")
         self._load_clients()
 
-    def sort_by(self, col, descending):
-        data = [(self.tree.set(k, col).lower(), k)
-                for k in self.tree.get_children()]
-        data.sort(reverse=descending)
-        for idx, (_, k) in enumerate(data):
-            self.tree.move(k, "", idx)
-        self.tree.heading(col,
-            command=lambda: self.sort_by(col, not descending))
-
     def _back(self):
         self.frame.destroy()
         if self.return_to == "proforma":
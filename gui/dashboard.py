@@ -4,6 +4,20 @@ import ctypes
 import customtkinter as ctk
 from PIL import Image
 from gui.login import LoginWindow
+import kpis
+
+LOGO_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "resources", "logo.png")
+_logo = None   # CTkImage del logo, decodificado una sola vez
+
+
+def _logo_image():
+    global _logo
+    if _logo is None and os.path.exists(LOGO_PATH):
+        img = Image.open(LOGO_PATH)
+        img.load()
+        _logo = ctk.CTkImage(light_image=img, dark_image=img, size=(180, 180))
+    return _logo
+
 
 SW_MAXIMIZE = 3
 def maximize_window(win):
@@ -37,15 +51,13 @@ class DashboardWindow:
         ).pack()
 
         # --- Logo debajo del título ---
-        logo_path = os.path.join(
-            os.path.dirname(__file__),
-            os.pardir, "resources", "logo.png"
-        )
-        if os.path.exists(logo_path):
-            img = Image.open(logo_path)
-            logo_img = ctk.CTkImage(light_image=img, dark_image=img, size=(180, 180))
+        logo_img = _logo_image()
+        if logo_img is not None:
             ctk.CTkLabel(self.frame, image=logo_img, text="").pack(pady=(0, 20))
 
+        # --- Indicadores (se calculan en segundo plano) ---
+        self._build_kpis()
+
         # --- Botones de módulos en grid ---
         grid_frame = ctk.CTkFrame(self.frame, corner_radius=0, fg_color="#1f1f1f")
         grid_frame.pack(padx=60, pady=10)
@@ -95,6 +107,65 @@ class DashboardWindow:
             command=self.logout
         ).pack()
 
+    def _build_kpis(self):
+        strip = ctk.CTkFrame(self.frame, corner_radius=0, fg_color="#1f1f1f")
+        strip.pack(padx=60, pady=(0, 10))
+        self.kpi_labels = {}
+        cards = [
+            ("today",     "Ventas de hoy"),
+            ("month",     "Mes a la fecha"),
+            ("low_stock", "Stock bajo"),
+            ("pending",   "Proformas pendientes"),
+            ("top",       "Más vendidos del mes"),
+        ]
+        for col, (key, title) in enumerate(cards):
+            card = ctk.CTkFrame(strip, corner_radius=8, fg_color="#2b2b2b")
+            card.grid(row=0, column=col, padx=8, sticky="ns")
+            ctk.CTkLabel(card, text=title, font=("Arial", 12),
+                         text_color="#AAAAAA").pack(padx=16, pady=(10, 0))
+            lbl = ctk.CTkLabel(card, text="…", font=("Arial", 18, "bold"),
+                               text_color="white", justify="center")
+            lbl.pack(padx=16, pady=(0, 10))
+            self.kpi_labels[key] = lbl
+
+        # Se muestra lo último calculado y se actualiza si está vencido
+        self._shown = None
+        self._show_kpis()
+        kpis.refresh()
+        self.frame.after(200, self._poll_kpis)
+
+    def _poll_kpis(self):
+        if not self.frame.winfo_exists():
+            return
+        self._show_kpis()
+        if kpis.running():
+            self.frame.after(200, self._poll_kpis)
+        else:
+            # Mientras el panel esté abierto se recalcula al vencer el TTL
+            self.frame.after(kpis.TTL * 1000, self._refresh_kpis)
+
+    def _refresh_kpis(self):
+        if not self.frame.winfo_exists():
+            return
+        kpis.refresh()
+        self._poll_kpis()
+
+    def _show_kpis(self):
+        values = kpis.get()
+        if values is None or values is self._shown:
+            return
+        self._shown = values
+        lbl = self.kpi_labels
+        for key in ("today", "month"):
+            v = values[key]
+            lbl[key].configure(text=f"$ {v['amount']:,.2f}\n{v['docs']} nota(s)")
+        lbl["low_stock"].configure(text=str(values["low_stock"]),
+                                   text_color="#FF8080" if values["low_stock"] else "white")
+        lbl["pending"].configure(text=str(values["pending"]))
+        top = [f"{(p['name'] or '-')[:22]} ({p['qty']})" for p in values["top"]]
+        lbl["top"].configure(text="\n".join(top) if top else "—",
+                             font=("Arial", 12 if top else 18, "bold"))
+
     def open_users(self):
         self.frame.destroy()
         from gui.users import UsersWindow
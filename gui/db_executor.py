@@ -0,0 +1,134 @@
+# gui/db_executor.py
+import queue
+import threading
+from tkinter import messagebox
+
+from models import db
+
+# Cada cuánto (ms) revisa el hilo de Tk si hay resultados
+POLL_MS = 30
+
+
+class Request:
+    """Pedido encolado; cancel() descarta su resultado (y lo interrumpe si se puede)."""
+    def __init__(self, executor, widget, fn, args, kwargs, key, interrupt, on_done, on_error):
+        self._executor = executor
+        self.widget    = widget
+        self.fn        = fn
+        self.args      = args
+        self.kwargs    = kwargs
+        self.key       = key
+        self.interrupt = interrupt
+        self.on_done   = on_done
+        self.on_error  = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        self._executor._cancel(self)
+
+
+class DbExecutor:
+    """
+    Hilo que hace las consultas de las ventanas para que Tk no se congele
+    mientras SQLite trabaja. Los resultados vuelven al hilo de Tk con
+    after(), y solo si el widget del pedido sigue existiendo.
+
+    Pedidos con la misma key se reemplazan: el último gana (p. ej. cada
+    tecla de una búsqueda). Si el anterior todavía no empezó no se ejecuta;
+    si está corriendo y es de solo lectura (interrupt=True) se le corta la
+    consulta, y en todo caso su resultado se descarta.
+    """
+    def __init__(self):
+        self._jobs    = queue.Queue()
+        self._results = queue.Queue()
+        self._lock    = threading.Lock()
+        self._latest  = {}       # key -> último Request
+        self._running = None     # (Request, conexión) en curso
+        self._pending = 0        # solo se toca desde el hilo de Tk
+        self._polling = False
+        self._thread  = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, widget, fn, *args, key=None, interrupt=False,
+               on_done=None, on_error=None, **kwargs):
+        """
+        Ejecuta fn(*args, **kwargs) en el hilo de la base. on_done(resultado)
+        u on_error(excepción) se llaman en el hilo de Tk; sin on_error el
+        error se muestra en un mensaje. fn no debe tocar widgets.
+        """
+        request = Request(self, widget, fn, args, kwargs, key, interrupt, on_done, on_error)
+        if key is not None:
+            with self._lock:
+                previous = self._latest.get(key)
+                self._latest[key] = request
+            if previous is not None:
+                self._cancel(previous)
+        self._pending += 1
+        self._jobs.put(request)
+        if not self._polling:
+            self._polling = True
+            root = widget.winfo_toplevel()
+            root.after(POLL_MS, lambda: self._poll(root))
+        return request
+
+    def cancel(self, key):
+        """Cancela el pedido pendiente con esa key (p. ej. al cerrar la ventana)."""
+        with self._lock:
+            request = self._latest.get(key)
+        if request is not None:
+            request.cancel()
+
+    def _cancel(self, request):
+        with self._lock:
+            request.cancelled = True
+            if self._latest.get(request.key) is request:
+                del self._latest[request.key]
+            # interrupt() solo corta la sentencia que esté corriendo en esa
+            # conexión; se hace con el lock para no alcanzar al pedido siguiente
+            if request.interrupt and self._running and self._running[0] is request:
+                self._running[1].interrupt()
+
+    def _loop(self):
+        while True:
+            request = self._jobs.get()
+            result, error = None, None
+            with self._lock:
+                if request.cancelled:
+                    self._results.put((request, None, None))
+                    continue
+                self._running = (request, db.conn)
+            try:
+                result = request.fn(*request.args, **request.kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                with self._lock:
+                    self._running = None
+            self._results.put((request, result, error))
+
+    def _poll(self, root):
+        while True:
+            try:
+                request, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            with self._lock:
+                if self._latest.get(request.key) is request:
+                    del self._latest[request.key]
+            if request.cancelled or not request.widget.winfo_exists():
+                continue
+            if error is not None:
+                if request.on_error:
+                    request.on_error(error)
+                else:
+                    messagebox.showerror("Error", f"No se pudo consultar la base de datos:\n{error}")
+            elif request.on_done:
+                request.on_done(result)
+        if self._pending:
+            root.after(POLL_MS, lambda: self._poll(root))
+        else:
+            self._polling = False
+
+
+executor = DbExecutor()
@@ -3,16 +3,23 @@
 import os
 import platform
 import subprocess
+import threading
 from pathlib import Path
+from datetime import date
 
 import customtkinter as ctk
-from tkinter import ttk, messagebox
-from models import Document, Client, DocumentItem
-from gui.utils import maximize_window
+from tkinter import messagebox, filedialog
+from models import Document, Client
+from gui.utils import maximize_window, VirtualTable, PagedSource
+from gui.db_executor import executor
+from gui.pdf_worker import worker
 from paths import get_pdf_backup_dir
+import pdf_store
+import batch_export
+import sales_export
 
 
-# RUTA UNIVERSAL DE RESPALDO DE PDFs
+# RESPALDOS DE PDFs ANTERIORES (los nuevos se regeneran desde la BD)
 BACKUP_DIR = Path(get_pdf_backup_dir())
 
 # Lista de meses para el filtro
@@ -21,6 +28,9 @@ MONTHS = [
     "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
 ]
 
+# Documentos por página; la siguiente se pide al llegar a ella con el scroll
+PAGE_SIZE = 100
+
 class DocumentWindow:
     def __init__(self, master, user):
         ctk.set_appearance_mode("Light")
@@ -57,15 +67,16 @@ class DocumentWindow:
 
         # Filtro por cliente
         ctk.CTkLabel(filterf, text="Cliente:").pack(side="left", padx=(0,5))
-        self._load_clients()
+        self.client_map = {}
         self.cliente_cb = ctk.CTkComboBox(
             filterf,
-            values=["Todos"] + self.client_values,
+            values=["Todos"],
             state="readonly",
             command=lambda _: self._refresh_table()
         )
         self.cliente_cb.set("Todos")
         self.cliente_cb.pack(side="left", padx=(0,15))
+        self._load_clients()
 
         # --- NUEVO: filtro por mes ---
         ctk.CTkLabel(filterf, text="Mes:").pack(side="left", padx=(0,5))
@@ -78,6 +89,21 @@ class DocumentWindow:
         self.month_cb.set("Todos")
         self.month_cb.pack(side="left", padx=(0,5))
 
+        # Filtro por año (acompaña al de mes para consultar un rango de fechas)
+        ctk.CTkLabel(filterf, text="Año:").pack(side="left", padx=(10,5))
+        years = [str(y) for y in Document.years()]
+        this_year = str(date.today().year)
+        if this_year not in years:
+            years.insert(0, this_year)
+        self.year_cb = ctk.CTkComboBox(
+            filterf,
+            values=["Todos"] + years,
+            state="readonly",
+            command=lambda _: self._refresh_table()
+        )
+        self.year_cb.set("Todos")  # como antes: se listan todos los documentos
+        self.year_cb.pack(side="left", padx=(0,5))
+
         # — Botón de búsqueda adicional (opcional) —
         ctk.CTkButton(filterf, text="Filtrar", command=self._refresh_table)\
             .pack(side="left", padx=(15,0))
@@ -85,29 +111,19 @@ class DocumentWindow:
         # — Tabla de documentos —
         self.tablef = ctk.CTkFrame(self.frame)
         self.tablef.pack(fill="both", expand=True, padx=20, pady=10)
-        cols = ("tipo", "fecha", "cliente", "total", "id")
-        self.tree = ttk.Treeview(
+        cols = ("tipo", "numero", "fecha", "cliente", "total", "id")
+        self.table = VirtualTable(
             self.tablef,
             columns=cols,
-            show="headings",
+            headings={"tipo": "Tipo", "numero": "N°", "fecha": "Fecha",
+                      "cliente": "Cliente", "total": "Total", "id": "ID"},
+            widths={"tipo": 80, "numero": 70, "fecha": 100,
+                    "cliente": 200, "total": 80, "id": 0},
+            key_index=5,
+            sortable=False,
             height=18
         )
-        # Configuro columnas
-        for col, txt, w in [
-            ("tipo",    "Tipo",    80),
-            ("fecha",   "Fecha",   100),
-            ("cliente", "Cliente", 200),
-            ("total",   "Total",   80),
-            ("id",      "ID",      0),
-        ]:
-            self.tree.heading(col, text=txt)
-            self.tree.column(col, anchor="center", width=w, stretch=(col!="id"))
-        self.tree.pack(side="left", fill="both", expand=True)
-        vs = ttk.Scrollbar(self.tablef,
-                           orient="vertical",
-                           command=self.tree.yview)
-        vs.pack(side="right", fill="y")
-        self.tree.configure(yscrollcommand=vs.set)
+        self.table.pack(fill="both", expand=True)
 
         # — Botones de acción —
         actions = ctk.CTkFrame(self.frame)
@@ -115,6 +131,24 @@ class DocumentWindow:
         # Abrir PDF
         ctk.CTkButton(actions, text="Abrir PDF", width=120,
                       command=self._open_doc).pack(side="left")
+        # Exportar todos los documentos filtrados (zip o PDF combinado)
+        self.export_btn = ctk.CTkButton(actions, text="Exportar lote", width=120,
+                                        command=self._export_batch)
+        self.export_btn.pack(side="left", padx=10)
+        # Ventas con sus ítems en CSV / JSON Lines (para contabilidad)
+        self.sales_btn = ctk.CTkButton(actions, text="Exportar ventas", width=120,
+                                       command=self._export_sales)
+        self.sales_btn.pack(side="left")
+        # Progreso de la exportación (visible solo mientras corre)
+        self.exportf = ctk.CTkFrame(actions, fg_color="transparent")
+        self.export_bar = ctk.CTkProgressBar(self.exportf, width=200)
+        self.export_bar.pack(side="left", padx=5)
+        self.export_lbl = ctk.CTkLabel(self.exportf, text="")
+        self.export_lbl.pack(side="left", padx=5)
+        ctk.CTkButton(self.exportf, text="Cancelar", width=90,
+                      command=lambda: self._export_cancel.set()).pack(side="left", padx=5)
+        self._export_cancel = threading.Event()
+        self._export_state  = None
         # Eliminar solo Admin
         if self.user.get("role") == "Administrador":
             ctk.CTkButton(
@@ -129,88 +163,216 @@ class DocumentWindow:
         self._refresh_table()
 
     def _load_clients(self):
-        self.client_objs  = Client.all()
-        self.client_map   = {
+        # La lista de clientes del filtro llega en segundo plano
+        executor.submit(self.cliente_cb, Client.all, on_done=self._clients_loaded)
+
+    def _clients_loaded(self, clients):
+        self.client_map = {
             f"{c['full_name']} ({c['cedula'] or '-'})": c["id"]
-            for c in self.client_objs
+            for c in clients
         }
-        self.client_values = list(self.client_map.keys())
-
-    def _refresh_table(self):
-        # Limpio
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
+        self.cliente_cb.configure(values=["Todos"] + list(self.client_map))
 
+    def _current_filters(self):
         tipo    = self.tipo_cb.get()
         cliente = self.cliente_cb.get()
         mes_sel = self.month_cb.get()  # nombre del mes
-        search  = ""  # no hay búsqueda libre aquí
+        anio    = self.year_cb.get()
 
-        # Re-cargo documentos
-        self._load_clients()
-        docs = Document.all()  # ORDER BY date DESC
-
-        for d in docs:
-            # — filtro tipo —
-            if tipo != "Todos" and d["type"] != tipo:
-                continue
-
-            # — filtro cliente —
-            cli = Client.get(d["client_id"])
-            cli_disp = f"{cli['full_name']} ({cli['cedula'] or '-'})"
-            if cliente != "Todos" and cli_disp != cliente:
-                continue
-
-            # — filtro mes —
-            if mes_sel != "Todos":
-                # d["date"] viene en "DD/MM/YYYY/..." → extraigo el mes
-                try:
-                    mes_num = int(d["date"].split("/")[1])
-                except:
-                    mes_num = None
-                if mes_num is None or MONTHS[mes_num-1] != mes_sel:
-                    continue
-
-            # inserto, guardo id oculto
-            self.tree.insert(
-                "", "end",
-                values=(
-                    d["type"],
-                    d["date"],
-                    cli_disp,
-                    f"{d['total']:.2f}",
-                    d["id"]
-                )
+        filters = {
+            "type_": None if tipo == "Todos" else tipo,
+            "client_id": None if cliente == "Todos" else self.client_map.get(cliente),
+        }
+        mes_num = None if mes_sel == "Todos" else MONTHS.index(mes_sel) + 1
+        if anio != "Todos" and mes_num:
+            y = int(anio)
+            filters["start"] = date(y, mes_num, 1)
+            filters["end"] = date(y + 1, 1, 1) if mes_num == 12 else date(y, mes_num + 1, 1)
+        elif anio != "Todos":
+            filters["start"] = date(int(anio), 1, 1)
+            filters["end"] = date(int(anio) + 1, 1, 1)
+        elif mes_num:
+            filters["month"] = mes_num
+        return filters
+
+    def _refresh_table(self):
+        # Filtros en SQL; la tabla pide las páginas a medida que se recorre
+        filters = self._current_filters()
+        self.table.load(lambda: PagedSource(
+            lambda after, limit: self._fetch_page(filters, after, limit),
+            count=lambda: Document.count(**filters),
+            page_size=PAGE_SIZE
+        ))
+
+    @staticmethod
+    def _fetch_page(filters, after, limit):
+        docs = Document.listing(after=after, limit=limit, **filters)
+        rows = [
+            (
+                d["type"],
+                f"{d['number']:06d}" if d["number"] else "",
+                d["date"],
+                f"{d['client_name']} ({d['client_cedula'] or '-'})",
+                f"{d['total']:.2f}",
+                d["id"]  # id oculto
             )
+            for d in docs
+        ]
+        if docs:
+            after = (docs[-1]["issued_at"], docs[-1]["id"])
+        return rows, after
 
     def _open_doc(self):
-        sel = self.tree.selection()
+        sel = self.table.selected()
         if not sel:
             return messagebox.showinfo("Abrir PDF", "Seleccione un documento.")
-        vals   = self.tree.item(sel[0])["values"]
-        doc_ty = vals[0]
-        doc_id = vals[4]
+        vals   = sel[0]
+        executor.submit(self.frame, self._locate_pdf, vals[0], vals[5],
+                        key=("open_doc", id(self)), on_done=self._pdf_located)
 
-        # Busca siempre en la carpeta universal de respaldos
-        f1 = BACKUP_DIR / f"{doc_ty}_{doc_id}.pdf"
-        f2 = BACKUP_DIR / f"{doc_ty}_{doc_id:06d}.pdf"
-        backup_file = f1 if f1.exists() else (f2 if f2.exists() else None)
+    @staticmethod
+    def _locate_pdf(doc_ty, doc_id):
+        """
+        Corre en el hilo de la base. Devuelve (ruta, None) si el PDF ya existe,
+        (None, (doc, ruta)) si hay que generarlo, o None si el documento no existe.
+        """
+        # Documentos anteriores a guardar método de pago e info adicional en
+        # la BD: si queda su respaldo se abre ese, que los tiene impresos
+        d = Document.get(doc_id)
+        if not d:
+            return None
+        if d["payment_method"] is None:
+            for f in (BACKUP_DIR / f"{doc_ty}_{doc_id}.pdf",
+                      BACKUP_DIR / f"{doc_ty}_{doc_id:06d}.pdf"):
+                if f.exists():
+                    return str(f), None
 
-        if not backup_file:
-            return messagebox.showerror(
-                "Error",
-                f"No se encontró el PDF de respaldo:\n{f1}\nni\n{f2}"
-            )
+        # Si no, sale de la caché o se regenera desde la BD
+        doc = pdf_store.snapshot(doc_id)
+        path = pdf_store.cached(doc_id, doc)
+        if path:
+            return path, None
+        return None, (doc, pdf_store.cache_path(doc_id, doc))
+
+    def _pdf_located(self, found):
+        if found is None:
+            return messagebox.showerror("Error", "El documento ya no existe.")
+        path, pending = found
+        if path:
+            return self._open_file(path)
+        # Falta en la caché: se genera en el hilo de los PDFs
+        doc, path = pending
+        worker.submit(self.frame, pdf_store.render_cached, doc, path,
+                      on_done=self._open_file,
+                      on_error=lambda p, e: messagebox.showerror("Error al generar PDF", str(e)))
+
+    @staticmethod
+    def _open_file(path):
         try:
             if os.name == "nt":
-                os.startfile(str(backup_file))
+                os.startfile(str(path))
             elif platform.system() == "Darwin":
-                subprocess.run(["open", str(backup_file)])
+                subprocess.run(["open", str(path)])
             else:
-                subprocess.run(["xdg-open", str(backup_file)])
+                subprocess.run(["xdg-open", str(path)])
         except Exception as e:
             messagebox.showerror("Error al abrir PDF", str(e))
 
+    def _export_batch(self):
+        if self._export_state is not None:
+            return
+        filters = self._current_filters()
+        path = filedialog.asksaveasfilename(
+            defaultextension=".zip",
+            filetypes=[("ZIP (un PDF por documento)", "*.zip"), ("PDF combinado", "*.pdf")],
+            title="Exportar documentos filtrados",
+            initialfile=f"documentos_{date.today():%Y-%m-%d}.zip"
+        )
+        if not path:
+            return
+        fmt = "pdf" if path.lower().endswith(".pdf") else "zip"
+
+        def export(progress):
+            # La selección también corre en el hilo de la exportación
+            ids = batch_export.select_documents(**filters)
+            progress(0, len(ids))
+            return batch_export.export(ids, path, fmt, progress=progress,
+                                       cancel=self._export_cancel)
+        self._start_export("Exportar lote", export)
+
+    def _export_sales(self):
+        if self._export_state is not None:
+            return
+        filters = self._current_filters()
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV (un renglón por ítem)", "*.csv"), ("JSON Lines", "*.jsonl")],
+            title="Exportar ventas filtradas",
+            initialfile=f"ventas_{date.today():%Y-%m-%d}.csv"
+        )
+        if not path:
+            return
+        fmt = "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+
+        def export(progress):
+            # El conteo también corre en el hilo de la exportación
+            total = Document.count(**filters)
+            if not total:
+                raise ValueError("No hay documentos con estos filtros.")
+            progress(0, total)
+            return sales_export.export(path, fmt, progress=progress,
+                                       cancel=self._export_cancel, **filters)
+        self._start_export("Exportar ventas", export)
+
+    def _start_export(self, title, export):
+        # export(progress) corre en otro hilo; _poll_export muestra el avance.
+        # El total lo informa el primer progress (hasta entonces, "Preparando…")
+        self._export_cancel.clear()
+        state = self._export_state = {"title": title, "done": 0, "total": None,
+                                      "result": None, "error": None}
+
+        def progress(done, total):
+            state["done"], state["total"] = done, total
+
+        def run():
+            try:
+                state["result"] = export(progress)
+            except BaseException as e:
+                state["error"] = e
+
+        self.export_btn.configure(state="disabled")
+        self.sales_btn.configure(state="disabled")
+        self.export_bar.set(0)
+        self.exportf.pack(side="left", padx=10)
+        threading.Thread(target=run, daemon=True).start()
+        self.frame.after(100, self._poll_export)
+
+    def _poll_export(self):
+        state = self._export_state
+        if not self.frame.winfo_exists():
+            # Se cerró la ventana: la exportación no debe seguir sola
+            self._export_cancel.set()
+            return
+        if state["total"]:
+            self.export_bar.set(min(state["done"] / state["total"], 1))
+            self.export_lbl.configure(text=f"{state['done']}/{state['total']}")
+        else:
+            self.export_lbl.configure(text="Preparando…")
+        if state["result"] is None and state["error"] is None:
+            self.frame.after(100, self._poll_export)
+            return
+
+        self._export_state = None
+        self.exportf.pack_forget()
+        self.export_btn.configure(state="normal")
+        self.sales_btn.configure(state="normal")
+        if isinstance(state["error"], (batch_export.ExportCancelled, sales_export.ExportCancelled)):
+            messagebox.showinfo(state["title"], "Exportación cancelada.")
+        elif state["error"] is not None:
+            messagebox.showerror("Error al exportar", str(state["error"]))
+        else:
+            messagebox.showinfo(state["title"], f"{state['result']} documento(s) exportado(s).")
+
     def _delete_docs(self):
         # Solo Admin
         if self.user.get("role") != "Administrador":
@@ -218,7 +380,7 @@ class DocumentWindow:
                 "Permiso denegado",
                 "Solo administradores pueden eliminar documentos."
             )
-        sels = self.tree.selection()
+        sels = self.table.selected()
         if not sels:
             return messagebox.showinfo("Eliminar", "Seleccione al menos un documento.")
         if not messagebox.askyesno(
@@ -227,13 +389,11 @@ class DocumentWindow:
         ):
             return
 
-        for iid in sels:
-            vals   = self.tree.item(iid)["values"]
+        for vals in sels:
             doc_ty = vals[0]
-            doc_id = vals[4]
+            doc_id = vals[5]
             # Borro en BD
-            DocumentItem.delete_by_document(doc_id)
-            Document.delete(doc_id)
+            Document.delete(doc_id)   # con sus ítems, en una transacción
             # Borro respaldos
             for fn in (
                 BACKUP_DIR / f"{doc_ty}_{doc_id}.pdf",
@@ -242,12 +402,15 @@ class DocumentWindow:
                 if fn.exists():
                     try: fn.unlink()
                     except: pass
-            # Quito de la tabla
-            self.tree.delete(iid)
+            pdf_store.discard(doc_id)
+
+        # Quito de la tabla
+        self.table.remove(vals[5] for vals in sels)
 
         messagebox.showinfo("Eliminar", "Documento(s) eliminado(s) correctamente.")
 
     def _back(self):
+        self._export_cancel.set()
         self.frame.destroy()
         from gui.dashboard import DashboardWindow
         DashboardWindow(self.master, self.user)
@@ -1,14 +1,20 @@
 # gui/inventory.py
 
 import customtkinter as ctk
-from tkinter import messagebox, ttk
+from tkinter import messagebox
 import ctypes
-from models import Product, db
-from gui.utils import StockForm
+import sqlite3
+from models import Product
+from gui.utils import (BulkImport, PagedSource, StockForm, VirtualTable, default_sort_key,
+                       STOCK_REASONS)
 from customtkinter import CTkScrollableFrame  # junto a tus otros imports de ctk
+from gui.search import DEBOUNCE_MS
 
 
 
+# Productos por página; la siguiente se pide al llegar a ella con el scroll
+PAGE_SIZE = 200
+
 SW_MAXIMIZE = 3
 def maximize_window(win):
     win.update_idletasks()
@@ -60,10 +66,13 @@ class InventoryWindow:
         # 3) Búsqueda
         self.search_frame.pack(fill="x", pady=10, padx=20)
         self.search_var = ctk.StringVar()
-        ctk.CTkEntry(self.search_frame,
-                     placeholder_text="Buscar por nombre o código...",
-                     textvariable=self.search_var)\
-            .pack(side="left", fill="x", expand=True)
+        search_e = ctk.CTkEntry(self.search_frame,
+                                placeholder_text="Buscar por nombre o código...",
+                                textvariable=self.search_var)
+        search_e.pack(side="left", fill="x", expand=True)
+        # Busca al dejar de escribir; cada búsqueda reemplaza a la anterior
+        self._search_job = None
+        search_e.bind("<KeyRelease>", self._schedule_search)
         ctk.CTkButton(self.search_frame, text="Buscar",
                       command=self.load_products)\
             .pack(side="left", padx=5)
@@ -82,19 +91,15 @@ class InventoryWindow:
             "cost_price":"Costo","sell_price":"Venta","type":"Tipo",
             "stock":"Stock","margin":"Ganancia","margin_pct":"Porcentaje"
         }
-        self.tree = ttk.Treeview(self.table_frame,
-                                 columns=cols,
-                                 show="headings",
-                                 displaycolumns=display)
-        for c in cols:
-            self.tree.heading(c,
-                text=headings.get(c,""),
-                command=(lambda _c=c: self.sort_by(_c, False))
-            )
-            self.tree.column(c, width=100, anchor="center")
-        self.tree.tag_configure("out_of_stock", background="#FFCCCC")
-        self.tree.tag_configure("low_stock", background="#FFFFCC")
-        self.tree.pack(fill="both", expand=True)
+        self.table = VirtualTable(self.table_frame,
+                                  columns=cols,
+                                  headings=headings,
+                                  displaycolumns=display,
+                                  sort_key=self._sort_key,
+                                  tag_fn=self._stock_tag)
+        self.table.tree.tag_configure("out_of_stock", background="#FFCCCC")
+        self.table.tree.tag_configure("low_stock", background="#FFFFCC")
+        self.table.pack(fill="both", expand=True)
 
         # 5) Botones
         self.actions_frame.pack(fill="x", pady=10, padx=20)
@@ -116,35 +121,65 @@ class InventoryWindow:
             ctk.CTkButton(self.actions_frame, text="Eliminar Categoría",
                           command=self._delete_category)\
                 .pack(side="left", padx=5)
+            BulkImport(self.actions_frame, self.frame, "products",
+                       self._after_import).pack(side="left", padx=5)
 
         # carga inicial
         self.load_products()
 
     def load_products(self):
-        for r in self.tree.get_children():
-            self.tree.delete(r)
-        term = self.search_var.get().strip()
+        # Filtros en SQL; la tabla pide las páginas a medida que se recorre
+        term = self.search_var.get().strip() or None
         cat  = self.cat_var.get()
-        if term:
-            items = Product.search(term)
-        elif cat and cat != "Todos":
-            items = Product.by_category(cat)
-        else:
-            items = Product.all()
+        filters = {"term": term,
+                   "category": cat if cat and cat != "Todos" and not term else None}
+        self.table.load(lambda: PagedSource(
+            lambda after, limit: self._fetch_page(filters, after, limit),
+            count=lambda: Product.count(**filters),
+            page_size=PAGE_SIZE
+        ))
+
+    def _schedule_search(self, event=None):
+        if self._search_job:
+            self.frame.after_cancel(self._search_job)
+        self._search_job = self.frame.after(DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_job = None
+        self.load_products()
+
+    @staticmethod
+    def _fetch_page(filters, after, limit):
+        items = Product.page(after, limit, **filters)
+        rows = []
         for p in items:
             margin = p["sell_price"] - p["cost_price"]
             if p["type"] == "Servicio":
                 pct = 100.0
-                tag = ""
             else:
                 pct = (margin / p["cost_price"] * 100) if p["cost_price"] else 0
-                tag = ("out_of_stock" if p["stock"]==0
-                       else "low_stock" if p["stock"]==1 else "")
-            self.tree.insert("", "end", values=(
+            rows.append((
                 p["id"], p["code"] or "", p["name"], p["category"] or "",
                 p["cost_price"], p["sell_price"], p["type"], p["stock"],
                 round(margin,2), f"{round(pct,2)}%"
-            ), tags=(tag,))
+            ))
+        if items:
+            after = (items[-1]["name"], items[-1]["id"])
+        return rows, after
+
+    @staticmethod
+    def _stock_tag(row):
+        # row: (id, code, name, category, cost, sell, type, stock, margin, pct)
+        if row[6] == "Servicio":
+            return ("",)
+        return ("out_of_stock" if row[7]==0
+                else "low_stock" if row[7]==1 else "",)
+
+    @staticmethod
+    def _sort_key(col, value):
+        if col in ("name", "category"):
+            return (1, 0.0, str(value).lower())
+        return default_sort_key(col, value)
 
     def _reset_filters(self):
         self.search_var.set("")
@@ -155,10 +190,10 @@ class InventoryWindow:
         # determina si es edición y obtiene id
         self.edit_id = None
         if edit:
-            sel = self.tree.selection()
+            sel = self.table.selected()
             if not sel:
                 return messagebox.showerror("Error","Seleccione un producto.")
-            self.edit_id = self.tree.item(sel[0])["values"][0]
+            self.edit_id = sel[0][0]
 
         # oculta los paneles principales
         for f in (self.header_frame, self.filter_frame,
@@ -278,7 +313,7 @@ class InventoryWindow:
                 if new_cat in cats and new_cat != old_cat:
                     return messagebox.showerror("Error","La categoría ya existe.")
                 if old_cat:
-                    db.execute("UPDATE products SET category=? WHERE category=?", (new_cat, old_cat))
+                    Product.rename_category(old_cat, new_cat)
                 category = new_cat
             else:
                 category = d.pop("category_cb","")
@@ -310,25 +345,31 @@ class InventoryWindow:
         self.actions_frame.pack(fill="x", pady=10, padx=20)
 
     def delete_product(self):
-        sel = self.tree.selection()
+        sel = self.table.selected()
         if not sel:
             return messagebox.showerror("Error","Seleccione un producto.")
-        pid = self.tree.item(sel[0])["values"][0]
+        pid = sel[0][0]
         if self.current_user["role"]!="Administrador":
             return messagebox.showerror("Permiso","Solo Admin puede eliminar.")
         if not messagebox.askyesno("Confirmar","Eliminar?"):
             return
-        Product.delete(pid)
+        try:
+            Product.delete(pid)
+        except sqlite3.IntegrityError:
+            return messagebox.showerror(
+                "No se puede eliminar",
+                "El producto figura en documentos guardados. Puede dejar su stock en 0."
+            )
         self.load_products()
 
     def adjust_stock(self):
         # Solo admins pueden ajustar stock
         if self.current_user["role"] != "Administrador":
             return messagebox.showerror("Permiso","Solo Admin puede ajustar stock.")
-        sel = self.tree.selection()
+        sel = self.table.selected()
         if not sel:
             return messagebox.showerror("Error","Seleccione un producto.")
-        pid = self.tree.item(sel[0])["values"][0]
+        pid = sel[0][0]
         p = Product.get(pid)
 
         # Crear pop‑up integrado
@@ -337,7 +378,7 @@ class InventoryWindow:
             corner_radius=8,
             fg_color="silver",
             width=450,
-            height=360
+            height=400
         )
         self.popup.place(relx=0.5, rely=0.5, anchor="center")
         self.popup.grab_set()  # atrapa el foco aquí
@@ -353,7 +394,11 @@ class InventoryWindow:
                      text="Cantidad (+ ingreso, - egreso):",
                      font=("Arial", 12, "bold")).pack(pady=(0,5))
         self.qty_entry = ctk.CTkEntry(self.popup, width=120, height=30, font=("Arial",12))
-        self.qty_entry.pack(pady=(0,15))
+        self.qty_entry.pack(pady=(0,10))
+        self.reason_cb = ctk.CTkComboBox(self.popup, values=list(STOCK_REASONS),
+                                         state="readonly", width=160)
+        self.reason_cb.set("Ajuste")
+        self.reason_cb.pack(pady=(0,15))
 
         btnf = ctk.CTkFrame(self.popup)
         btnf.pack(pady=(0,15))
@@ -367,7 +412,10 @@ class InventoryWindow:
             delta = int(self.qty_entry.get())
         except:
             return messagebox.showerror("Error","Cantidad inválida.")
-        Product.adjust_stock(pid, delta)
+        reason = STOCK_REASONS[self.reason_cb.get()]
+        if reason == "return" and delta <= 0:
+            return messagebox.showerror("Error","Una devolución debe ser un ingreso (+).")
+        Product.adjust_stock(pid, delta, reason)
         self.load_products()
         self._cancel_popup()
 
@@ -382,24 +430,13 @@ class InventoryWindow:
         if not messagebox.askyesno("Confirmar",
                                    f"Eliminar categoría '{cat}'?"):
             return
-        db.execute("UPDATE products SET category='' WHERE category=?", (cat,))
+        Product.clear_category(cat)
         self.cat_cb.configure(values=["Todos"]+Product.get_categories())
         self._reset_filters()
 
-    def sort_by(self, col, descending):
-        data = []
-        for iid in self.tree.get_children():
-            val = self.tree.set(iid, col).rstrip('%')
-            try:
-                key = float(val) if col not in ("name","category") else val.lower()
-            except:
-                key = val.lower()
-            data.append((key, iid))
-        data.sort(reverse=descending)
-        for index, (_, iid) in enumerate(data):
-            self.tree.move(iid, "", index)
-        self.tree.heading(col, 
-            command=lambda: self.sort_by(col, not descending))
+    def _after_import(self):
+        self.cat_cb.configure(values=["Todos"]+Product.get_categories())
+        self._reset_filters()
 
     def _back(self):
         self.frame.destroy()
@@ -4,6 +4,7 @@ from PIL import Image
 from tkinter import messagebox
 from models import User
 from gui.utils import make_window_responsive, ScrollableFrame
+from gui.db_executor import executor
 
 class LoginWindow:
     def __init__(self, master):
@@ -66,14 +67,26 @@ class LoginWindow:
         self.password.bind("<Return>", lambda e: self.login())
 
         # Botón
-        ctk.CTkButton(container,
-                      text="Iniciar sesión",
-                      command=self.login)\
-            .grid(row=5, column=0, pady=20)
+        self.login_btn = ctk.CTkButton(container,
+                                       text="Iniciar sesión",
+                                       command=self.login)
+        self.login_btn.grid(row=5, column=0, pady=20)
 
     def login(self):
-        user = User.authenticate(self.username.get(),
-                                 self.password.get())
+        # bcrypt tarda a propósito: se verifica fuera del hilo de la ventana
+        if self.login_btn.cget("state") == "disabled":
+            return
+        self.login_btn.configure(state="disabled", text="Verificando…")
+        executor.submit(self.login_btn, User.authenticate,
+                        self.username.get(), self.password.get(),
+                        on_done=self._logged_in, on_error=self._login_failed)
+
+    def _login_failed(self, error):
+        self.login_btn.configure(state="normal", text="Iniciar sesión")
+        messagebox.showerror("Error", f"No se pudo iniciar sesión:\n{error}")
+
+    def _logged_in(self, user):
+        self.login_btn.configure(state="normal", text="Iniciar sesión")
         if not user:
             messagebox.showerror("Error",
                                  "Usuario o contraseña incorrectos.")
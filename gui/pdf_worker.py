@@ -0,0 +1,91 @@
+# gui/pdf_worker.py
+import queue
+import shutil
+import threading
+from tkinter import messagebox
+
+import pdf_store
+
+# Cada cuánto (ms) revisa el hilo de Tk si hay PDFs terminados
+POLL_MS = 100
+
+
+class PdfWorker:
+    """
+    Hilo en segundo plano que genera PDFs en cola (y sus copias de respaldo
+    y en la caché de pdf_store) sin bloquear la ventana. Cada trabajo recibe
+    una "foto" inmutable del documento, así la cajera puede empezar la
+    siguiente venta enseguida. Los resultados vuelven al hilo de Tk con
+    after(); sin on_error, un error se muestra en un mensaje.
+    """
+    def __init__(self):
+        self._jobs     = queue.Queue()
+        self._results  = queue.Queue()
+        self._pending  = 0      # solo se toca desde el hilo de Tk
+        self._polling  = False
+        self._thread   = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, widget, render, doc, path, backup_path=None, store_id=None,
+               on_done=None, on_error=None):
+        """
+        Encola render(doc, path). widget: cualquier widget vivo (se usa su
+        ventana raíz para el after, así los avisos llegan aunque se cierre
+        la pantalla que generó el PDF). Con store_id el PDF también se copia
+        a la caché de pdf_store como el documento store_id.
+        """
+        root = widget.winfo_toplevel()
+        self._pending += 1
+        self._jobs.put((render, doc, path, backup_path, store_id, on_done, on_error))
+        if not self._polling:
+            self._polling = True
+            root.after(POLL_MS, lambda: self._poll(root))
+
+    def pending(self):
+        return self._pending
+
+    def _loop(self):
+        while True:
+            render, doc, path, backup_path, store_id, on_done, on_error = self._jobs.get()
+            try:
+                render(doc, path)
+            except Exception as e:
+                self._results.put((on_error, path, e, None))
+                continue
+            # El PDF ya está; si falla una copia solo se avisa
+            warning = None
+            try:
+                if backup_path and str(backup_path) != str(path):
+                    shutil.copyfile(path, backup_path)
+            except Exception as e:
+                warning = f"El PDF se guardó, pero no su copia de respaldo:\n{e}"
+            try:
+                if store_id is not None:
+                    pdf_store.store(store_id, doc, path)
+            except Exception as e:
+                warning = f"El PDF se guardó, pero no su copia en caché:\n{e}"
+            self._results.put((on_done, path, None, warning))
+
+    def _poll(self, root):
+        while True:
+            try:
+                callback, path, error, warning = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if warning is not None:
+                messagebox.showwarning("Respaldo del PDF", warning)
+            if error is not None:
+                if callback:
+                    callback(path, error)
+                else:
+                    messagebox.showerror("Error al generar PDF", f"{path}\n{error}")
+            elif callback:
+                callback(path)
+        if self._pending:
+            root.after(POLL_MS, lambda: self._poll(root))
+        else:
+            self._polling = False
+
+
+worker = PdfWorker()
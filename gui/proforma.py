@@ -1,40 +1,49 @@
 import os
 import platform
-import shutil
-import tempfile
-import threading
-import time
+import sqlite3
 
 import customtkinter as ctk
-from reportlab.lib.utils import simpleSplit
 from tkinter import messagebox, ttk, filedialog
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
 
 
-from models import Document, DocumentItem, Product, Client
+from db import is_busy
+from models import Document, Product, Client
 from gui.utils import maximize_window
-from paths import get_pdf_backup_dir
-
-# — Datos de la empresa (idénticos a nota_venta.py) —
-LOGO_PATH      = os.path.join(os.path.dirname(__file__), os.pardir, "resources", "logo2.png")
-BUSINESS_NAME  = "Tech RioStore"
-OWNER_NAME     = "Luis Enrique Reinoso Peñafiel"
-ADDRESS_LINE_1 = "Mayor Ruiz 28-33 y Venezuela"
-ADDRESS_LINE_2 = "Riobamba – Chimborazo – Ecuador"
-RUC            = "RUC: 0603918426001"
-PHONE          = "0997927337 / 0984616768"
-EMAIL          = "luis_enrique_reinoso@hotmail.com"
-FACEBOOK       = "facebook.com/TechRioStore"
-ADDITIONAL_TEXT = "Contribuyente Negocio Popular - Régimen RIMPE"
-
-PDF_BACKUP_DIR = get_pdf_backup_dir()
-os.makedirs(PDF_BACKUP_DIR, exist_ok=True)
+from gui.search import IncrementalSearch, SearchIndex
+from gui.pdf_worker import worker
+from gui.db_executor import executor
+from pdf_layout import render as render_pdf
+import pdf_store
+import kpis
+
+
+# Listas de búsqueda: se arman en el hilo de la base (consulta + índice)
+def _client_entries():
+    client_map = {f"{c['full_name']} ({c['cedula'] or '-'})": c for c in Client.all()}
+    index = SearchIndex(
+        (display, f"{c['full_name']} {c['cedula'] or ''}")
+        for display, c in client_map.items()
+    )
+    return client_map, index
+
+
+def _product_entries():
+    prod_map = {}
+    for p in Product.all():
+        codigo = p['code'] or 'SIN-COD'
+        prod_map[f"[{codigo}] {p['name']} (Stock: {p['stock']})"] = p
+    index = SearchIndex(
+        (display, f"{p['code'] or ''} {p['name'] or ''}")
+        for display, p in prod_map.items()
+    )
+    return prod_map, index
+
 
 class ProformaWindow:
+    # Una proforma no descuenta stock: pasarse solo pide confirmación
+    STRICT_STOCK = False
+
     def __init__(self, master, user):
         ctk.set_appearance_mode("Light")
         ctk.set_default_color_theme("blue")
@@ -91,7 +100,6 @@ class ProformaWindow:
         # Entry de búsqueda de clientes
         self.client_search = ctk.CTkEntry(client_frame, placeholder_text="Buscar cliente...")
         self.client_search.pack(side="left", fill="x", expand=True)
-        self.client_search.bind("<KeyRelease>", self._filter_clients)
         
         # Botón flecha para mostrar/ocultar lista
         self.client_dropdown_btn = ctk.CTkButton(
@@ -116,9 +124,14 @@ class ProformaWindow:
         client_scrollbar = ttk.Scrollbar(self.client_dropdown_frame, orient="vertical", command=self.client_listbox.yview)
         client_scrollbar.pack(side="right", fill="y")
         self.client_listbox.configure(yscrollcommand=client_scrollbar.set)
-        
-        self._populate_client_list()
+
+        # Búsqueda incremental (con espera entre teclas) sobre el índice de clientes
+        self.client_finder = IncrementalSearch(
+            self.client_search, self.client_listbox, self.client_index,
+            active=lambda: self.client_dropdown_visible
+        )
         self.client_dropdown_visible = False
+        self._populate_client_list()
 
     def _update_date(self):
         """Actualizar la fecha y hora actual"""
@@ -136,43 +149,37 @@ class ProformaWindow:
             self.client_dropdown_visible = True
             self._populate_client_list()
 
-    def _load_clients_list(self):
-        self.client_objs = Client.all()
-        self.client_values = [
-            f"{c['full_name']} ({c['cedula'] or '-'})"
-            for c in self.client_objs
-        ]
-        self.client_map = {}
-        for i, client in enumerate(self.client_objs):
-            display_text = self.client_values[i]
-            self.client_map[display_text] = client
+    def _load_clients_list(self, select=None):
+        # Hasta que llegue la lista, la búsqueda no muestra nada
+        if not hasattr(self, "client_map"):
+            self.client_map, self.client_values = {}, []
+            self.client_index = SearchIndex(())
+        executor.submit(self.frame, _client_entries, key=("clients", id(self)),
+                        on_done=lambda result: self._clients_loaded(result, select))
+
+    def _clients_loaded(self, result, select=None):
+        self.client_map, self.client_index = result
+        self.client_values = list(self.client_map)
+        self.client_finder.set_index(self.client_index)
+        if self.client_dropdown_visible:
+            self._filter_clients()
+        if select:
+            # Seleccionar el cliente recién creado (buscado por nombre)
+            for display_text in self.client_values:
+                if select in display_text:
+                    self.client_search.delete(0, 'end')
+                    self.client_search.insert(0, display_text)
+                    break
 
     def _populate_client_list(self):
-        """Poblar lista con todos los clientes"""
-        for item in self.client_listbox.get_children():
-            self.client_listbox.delete(item)
-        for display_text in self.client_values:
-            self.client_listbox.insert("", "end", text=display_text)
+        """Poblar lista con los primeros clientes"""
+        self.client_finder.show("")
 
     def _filter_clients(self, event=None):
         """Filtrar clientes por búsqueda"""
         if not self.client_dropdown_visible:
             return
-            
-        search_term = self.client_search.get().lower()
-        
-        # Limpiar listbox
-        for item in self.client_listbox.get_children():
-            self.client_listbox.delete(item)
-        
-        # Filtrar y mostrar coincidencias
-        for display_text, client in self.client_map.items():
-            nombre = client['full_name'].lower()
-            cedula = (client['cedula'] or '').lower()
-            if (search_term in nombre or 
-                search_term in cedula or 
-                search_term == ''):
-                self.client_listbox.insert("", "end", text=display_text)
+        self.client_finder.show(self.client_search.get())
 
     def _select_client_from_search(self, event=None):
         """Seleccionar cliente de la lista de búsqueda con un solo click"""
@@ -284,6 +291,13 @@ class ProformaWindow:
             hover_color="green"  # Color verde al hacer hover
         )
         self.save_pdf_btn.pack(side="left", padx=10)
+        self._build_pdf_status()
+
+    def _build_pdf_status(self):
+        # Aviso de PDFs pendientes de generar en segundo plano
+        self.pdf_status = ctk.CTkLabel(self.actf, text="")
+        self.pdf_status.pack(side="left", padx=10)
+        self._update_pdf_status()
 
     def _show_main(self):
         self.header.pack(fill="x", pady=10, padx=10)
@@ -327,32 +341,21 @@ class ProformaWindow:
         data = {k: w.get().strip() for k, w in self.client_widgets.items()}
         if not data["full_name"]:
             return messagebox.showerror("Error","El nombre es obligatorio.")
-        existing = [c["cedula"] for c in Client.all() if c["cedula"]]
-        if data["cedula"] and data["cedula"] in existing:
+        if data["cedula"] and Client.by_cedula(data["cedula"]):
             return messagebox.showerror("Error","Cédula/RUC ya registrado.")
         Client.create(data["full_name"], data["cedula"],
                       data["contact"], data["address"], data["email"])
         self.client_form.destroy()
         self._show_main()
-        self._load_clients_list()
-        self._populate_client_list()
-        
-        # CORRECCIÓN: Seleccionar correctamente el cliente recién creado
-        if self.client_values:
-            # Buscar el cliente recién creado por nombre
-            nuevo_cliente_nombre = data["full_name"]
-            for display_text in self.client_values:
-                if nuevo_cliente_nombre in display_text:
-                    self.client_search.delete(0, 'end')
-                    self.client_search.insert(0, display_text)
-                    break
+        # Al llegar la lista nueva se selecciona el cliente recién creado
+        self._load_clients_list(select=data["full_name"])
 
     def _cancel_client_inline(self):
         self.client_form.destroy()
         self._show_main()
 
     # — Inline Ítem — #
-    def _add_item_inline(self):
+    def _add_item_inline(self, select_id=None):
         for w in (self.header, self.details,
                   self.table_frame, self.linef,
                   self.botf, self.extraf, self.actf):
@@ -361,13 +364,10 @@ class ProformaWindow:
         self.item_form.pack(fill="both", expand=True, padx=40, pady=20)
         ctk.CTkLabel(self.item_form, text="Agregar Ítem",
                      font=("Arial",20)).pack(pady=(0,10))
-        prods = Product.all()
+        # El catálogo llega en segundo plano (ver _products_loaded)
         self.prod_map = {}
-        for p in prods:
-            codigo = p['code'] or 'SIN-COD'
-            display_text = f"[{codigo}] {p['name']} (Stock: {p['stock']})"
-            self.prod_map[display_text] = p
-        
+        self.prod_index = SearchIndex(())
+
         row = ctk.CTkFrame(self.item_form)
         row.pack(fill="x", pady=5)
         ctk.CTkLabel(row, text="Producto:").pack(side="left", padx=(0,5))
@@ -377,9 +377,8 @@ class ProformaWindow:
         prod_frame.pack(side="left", fill="x", expand=True, padx=(0,5))
         
         # Entry para búsqueda
-        self.prod_search = ctk.CTkEntry(prod_frame, placeholder_text="Buscar por código o nombre...")
+        self.prod_search = ctk.CTkEntry(prod_frame, placeholder_text="Cargando productos...")
         self.prod_search.pack(side="left", fill="x", expand=True)
-        self.prod_search.bind("<KeyRelease>", self._filter_products)
         
         # Botón flecha para mostrar/ocultar lista de productos
         self.prod_dropdown_btn = ctk.CTkButton(
@@ -404,10 +403,17 @@ class ProformaWindow:
         prod_scrollbar = ttk.Scrollbar(self.prod_dropdown_frame, orient="vertical", command=self.search_listbox.yview)
         prod_scrollbar.pack(side="right", fill="y")
         self.search_listbox.configure(yscrollcommand=prod_scrollbar.set)
-        
-        self._populate_search_list()
+
+        # Búsqueda incremental (con espera entre teclas) sobre el índice de productos
+        self.prod_finder = IncrementalSearch(
+            self.prod_search, self.search_listbox, self.prod_index,
+            active=lambda: self.prod_dropdown_visible
+        )
         self.prod_dropdown_visible = False
-        
+        self._populate_search_list()
+        executor.submit(self.item_form, _product_entries, key=("products", id(self)),
+                        on_done=lambda result: self._products_loaded(result, select_id))
+
         ctk.CTkLabel(self.item_form, text="Cantidad:").pack(anchor="w", pady=5)
         self.qty_e = ctk.CTkEntry(self.item_form)
         self.qty_e.insert(0, "1")
@@ -422,6 +428,19 @@ class ProformaWindow:
         ctk.CTkButton(btnf, text="Cancelar",
                       command=self._cancel_item_inline).pack(side="left")
 
+    def _products_loaded(self, result, select_id=None):
+        self.prod_map, self.prod_index = result
+        self.prod_finder.set_index(self.prod_index)
+        self.prod_search.configure(placeholder_text="Buscar por código o nombre...")
+        if self.prod_dropdown_visible:
+            self._filter_products()
+        if select_id is not None and not self.prod_search.get():
+            # Editando un ítem: mostrar su producto
+            for display_text, product in self.prod_map.items():
+                if product["id"] == select_id:
+                    self.prod_search.insert(0, display_text)
+                    break
+
     def _toggle_product_dropdown(self):
         """Mostrar/ocultar dropdown de productos"""
         if self.prod_dropdown_visible:
@@ -435,31 +454,14 @@ class ProformaWindow:
             self._populate_search_list()
 
     def _populate_search_list(self):
-        """Poblar lista con todos los productos"""
-        for item in self.search_listbox.get_children():
-            self.search_listbox.delete(item)
-        for display_text in self.prod_map.keys():
-            self.search_listbox.insert("", "end", text=display_text)
+        """Poblar lista con los primeros productos"""
+        self.prod_finder.show("")
 
     def _filter_products(self, event=None):
         """Filtrar productos por búsqueda"""
         if not self.prod_dropdown_visible:
             return
-            
-        search_term = self.prod_search.get().lower()
-        
-        # Limpiar listbox
-        for item in self.search_listbox.get_children():
-            self.search_listbox.delete(item)
-        
-        # Filtrar y mostrar coincidencias
-        for display_text, product in self.prod_map.items():
-            codigo = product['code'] or ''
-            nombre = product['name'] or ''
-            if (search_term in codigo.lower() or 
-                search_term in nombre.lower() or 
-                search_term == ''):
-                self.search_listbox.insert("", "end", text=display_text)
+        self.prod_finder.show(self.prod_search.get())
 
     def _select_from_search(self, event=None):
         """Seleccionar producto de la lista de búsqueda con un solo click"""
@@ -595,10 +597,19 @@ class ProformaWindow:
             qty = int(self.qty_e.get()); price = float(self.price_e.get())
         except:
             return messagebox.showerror("Error","Cantidad/precio inválido.")
-        if p["type"] == "Producto" and qty > p["stock"]:
-            if not messagebox.askyesno("Atención",
-                    f"Stock disponible: {p['stock']}. Continuar?"):
-                return
+        if p["type"] == "Producto":
+            # Stock actual (el de la lista puede estar desactualizado si otra
+            # caja vendió), descontando lo que ya está en esta nota
+            current = Product.get(p["id"])
+            stock = current["stock"] if current else 0
+            stock -= sum(it[3] for it in self.items if it[0] == p["id"])
+            if qty > stock:
+                if self.STRICT_STOCK:
+                    return messagebox.showerror(
+                        "Stock insuficiente", f"Stock disponible: {max(stock, 0)}.")
+                if not messagebox.askyesno("Atención",
+                        f"Stock disponible: {stock}. Continuar?"):
+                    return
         sub = qty * price
         codigo = p['code'] or 'SIN-COD'
         self.items.append((p["id"], codigo, p["name"], qty, price, sub))
@@ -617,18 +628,8 @@ class ProformaWindow:
             return messagebox.showerror("Error","Seleccione un ítem.")
         idx = self.tree.index(sel[0])
         item = self.items[idx]
-        self._add_item_inline()
-        
-        # Buscar el display text correcto
-        key = None
-        for display_text, product in self.prod_map.items():
-            if product["id"] == item[0]:
-                key = display_text
-                break
-        
-        if key:
-            self.prod_search.delete(0, 'end')
-            self.prod_search.insert(0, key)
+        # El producto del ítem se muestra cuando llega el catálogo
+        self._add_item_inline(select_id=item[0])
         self.qty_e.delete(0,"end");   self.qty_e.insert(0,str(item[3]))
         self.price_e.delete(0,"end"); self.price_e.insert(0,str(item[4]))
         btns = self.item_form.pack_slaves()[-1].pack_slaves()
@@ -740,16 +741,24 @@ class ProformaWindow:
         if not cliente_obj:
             return messagebox.showerror("Error","Cliente no válido.")
 
-        # Guardar registro en BD (sin descontar stock)
-        doc_id = Document.create(
-            "PROFORMA",
-            self.date_str,
-            cliente_obj["id"],
-            float(self.disc_e.get()),
-            float(self.total_lbl.cget("text"))
-        )
-        for pid, _, _, qty, unit, sub in self.items:  # Ajuste para el código agregado
-            DocumentItem.add(doc_id, pid, qty, unit, sub)
+        # Guardar registro en BD (sin descontar stock), todo en una transacción
+        try:
+            doc_id, _ = Document.create_with_items(
+                "PROFORMA",
+                self.date_str,
+                cliente_obj["id"],
+                float(self.disc_e.get()),
+                float(self.total_lbl.cget("text")),
+                self.items,
+                payment_method=self.payment_method,
+                additional_info=self.additional_info
+            )
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            return messagebox.showerror("Base ocupada",
+                                        "Otra caja está guardando. Intente de nuevo en unos segundos.")
+        kpis.note_document("PROFORMA", self.date_str, float(self.total_lbl.cget("text")))
 
         # CAMBIO: Usar fecha actual para nombre de archivo
         current_date = datetime.now().strftime("%d-%m-%Y-%H-%M")
@@ -764,219 +773,45 @@ class ProformaWindow:
         if not file_path:
             return
 
-        # Numeración independiente
-        seq = len([d for d in Document.all() if d["type"]=="PROFORMA"])
-        # Generar PDF
-        self._build_pdf(cliente, doc_id, file_path, seq, self.additional_info, self.payment_method)
-
-        # Ofrecer abrir
-        if messagebox.askyesno("Abrir PDF", "¿Deseas abrir el PDF ahora?"):
-            try:
-                if os.name == "nt":
-                    os.startfile(file_path)
-                elif platform.system() == "Darwin":
-                    os.system(f"open '{file_path}'")
-                else:
-                    os.system(f"xdg-open '{file_path}'")
-            except Exception as e:
-                messagebox.showerror("Error al abrir PDF", str(e))
-
-        messagebox.showinfo("Listo", "Proforma guardada correctamente.")
-        
-        # Respaldo automático
-        try:
-            backup_name = f"PROFORMA_{doc_id}.pdf"
-            backup_path = os.path.join(PDF_BACKUP_DIR, backup_name)
-            if os.path.abspath(file_path) != os.path.abspath(backup_path):
-                shutil.copyfile(file_path, backup_path)
-        except Exception as e:
-            print("Error al guardar respaldo de Proforma:", e)
+        # Generar PDF en segundo plano a partir de lo guardado en la BD
+        doc = pdf_store.snapshot(doc_id)
+        worker.submit(
+            self.frame, render_pdf, doc, file_path, store_id=doc_id,
+            on_done=lambda path: self._pdf_ready(path, "Proforma guardada correctamente."),
+            on_error=self._pdf_failed
+        )
+        self._update_pdf_status()
 
         # Resetear todos los campos automáticamente
         self._reset_all_fields()
 
-    def _build_pdf(self, cliente, doc_id, path, seq, info_adicional, metodo_pago):
-        c = canvas.Canvas(path, pagesize=A4)
-        W, H = A4
-        
-        # Márgenes estándar A4: 2.54 cm = 72.288 puntos ≈ 72 puntos
-        MARGIN_TOP = 72
-        MARGIN_BOTTOM = 72
-        MARGIN_LEFT = 72
-        MARGIN_RIGHT = 72
-        
-        usable_width = W - MARGIN_LEFT - MARGIN_RIGHT
-        usable_height = H - MARGIN_TOP - MARGIN_BOTTOM
-        line_h = 16        # interlineado
-
-        def nueva_pagina():
-            """Función para crear nueva página manteniendo configuración"""
-            c.showPage()
-            # Restablecer configuraciones de fuente para nueva página
-            c.setFont("Helvetica", 9)
-            c.setFillColor(colors.black)
-            c.setStrokeColor(colors.black)
-            return H - MARGIN_TOP
-
-        # — ENCABEZADO —
-        y_cursor = H - MARGIN_TOP
-        # MANTENER EL TAMAÑO ORIGINAL DEL LOGO (mismo que nota_venta.py)
-        logo_size = line_h * 7
-        
-        if os.path.exists(LOGO_PATH):
-            c.drawImage(LOGO_PATH, MARGIN_LEFT, y_cursor - logo_size, 
-                       width=logo_size, height=logo_size, mask='auto')
-        
-        # MANTENER LOS DATOS DE EMPRESA IDÉNTICOS (mismo que nota_venta.py)
-        c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(W/2, y_cursor - line_h, BUSINESS_NAME)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawCentredString(W/2, y_cursor - 2*line_h, RUC)
-        c.setFont("Helvetica", 10)
-        
-        empresa_info = [OWNER_NAME, ADDRESS_LINE_1, ADDRESS_LINE_2, PHONE, EMAIL]
-        for i, txt in enumerate(empresa_info, start=3):
-            c.drawCentredString(W/2, y_cursor - i*line_h, txt)
-        
-        y_cursor -= (len(empresa_info) + 3) * line_h
-        c.setFont("Helvetica-Oblique", 10)
-        c.drawCentredString(W/2, y_cursor, ADDITIONAL_TEXT)
-
-        # — TÍTULO PROFORMA —
-        y_cursor -= 3*line_h
-        c.setFont("Helvetica-Bold", 16)
-        c.drawCentredString(W/2, y_cursor, "PROFORMA")
-        c.setFont("Helvetica", 10)
-        c.drawRightString(W - MARGIN_RIGHT, y_cursor, f"N°: {seq:06d}")
-        c.drawRightString(W - MARGIN_RIGHT, y_cursor - line_h, f"Fecha: {self.date_str}")
-
-        # — DATOS DEL CLIENTE —
-        y_cursor -= 3*line_h
-        if y_cursor < MARGIN_BOTTOM + 6*line_h:
-            y_cursor = nueva_pagina()
-            
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(MARGIN_LEFT, y_cursor, "Cliente:")
-        c.setFont("Helvetica", 9)
-        
-        cliente_info = [
-            f"Nombre: {cliente['full_name']}",
-            f"Cédula/RUC: {cliente['cedula'] or '-'}",
-            f"Dirección: {cliente['address'] or '-'}",
-            f"Contacto: {cliente['contact'] or '-'}",
-            f"Correo: {cliente.get('email','-')}"
-        ]
-        
-        for i, fld in enumerate(cliente_info, start=1):
-            if y_cursor - i*line_h < MARGIN_BOTTOM:
-                y_cursor = nueva_pagina()
-                i = 1
-            c.setFont("Helvetica", 9)  # Mantener fuente consistente
-            c.drawString(MARGIN_LEFT, y_cursor - i*line_h, fld)
-
-        # — TABLA DE ÍTEMS —
-        y_cursor -= (len(cliente_info) + 2) * line_h
-        if y_cursor < MARGIN_BOTTOM + 4*line_h:
-            y_cursor = nueva_pagina()
-            
-        # Encabezado de tabla
-        c.setFillColorRGB(0.7,0.9,1)
-        c.rect(MARGIN_LEFT, y_cursor - line_h - 4, usable_width, line_h+4, fill=1, stroke=0)
-        c.setFillColor(colors.black)
-        c.setFont("Helvetica-Bold", 9)
-        
-        # Columnas ajustadas
-        x_cod = MARGIN_LEFT + 5
-        x_desc = MARGIN_LEFT + 80
-        x_qty = MARGIN_LEFT + 300
-        x_unit = MARGIN_LEFT + 380
-        x_sub = W - MARGIN_RIGHT - 5
-        
-        c.drawString(x_cod, y_cursor - line_h, "Código")
-        c.drawString(x_desc, y_cursor - line_h, "Descripción")
-        c.drawRightString(x_qty, y_cursor - line_h, "Cant.")
-        c.drawRightString(x_unit, y_cursor - line_h, "P. Unit.")
-        c.drawRightString(x_sub, y_cursor - line_h, "Subtotal")
-        
-        y_cursor -= line_h + 6
-        c.setStrokeColor(colors.grey)
-        c.line(MARGIN_LEFT, y_cursor, W - MARGIN_RIGHT, y_cursor)
-        
-        # Items
-        for _, codigo, name, qty, price, sub in self.items:
-            y_cursor -= line_h
-            if y_cursor < MARGIN_BOTTOM + line_h:
-                y_cursor = nueva_pagina()
-                
-            c.setFont("Helvetica", 9)  # Mantener fuente consistente
-            c.drawString(x_cod, y_cursor, str(codigo)[:12])
-            c.drawString(x_desc, y_cursor, name[:35])
-            c.drawRightString(x_qty, y_cursor, str(qty))
-            c.drawRightString(x_unit, y_cursor, f"{price:.2f}")
-            c.drawRightString(x_sub, y_cursor, f"{sub:.2f}")
-
-        # — RESUMEN DE TOTALES —
-        y_cursor -= 2*line_h
-        if y_cursor < MARGIN_BOTTOM + 3*line_h:
-            y_cursor = nueva_pagina()
-            
-        c.setStrokeColor(colors.black)
-        c.line(W - MARGIN_RIGHT - 200, y_cursor, W - MARGIN_RIGHT, y_cursor)
-        
-        c.setFont("Helvetica-Bold", 10)
-        subtotal = float(self.total_lbl.cget("text")) + float(self.disc_e.get() or 0)
-        
-        y_cursor -= line_h
-        c.drawRightString(x_sub, y_cursor, f"Subtotal: {subtotal:.2f}")
-        
-        if float(self.disc_e.get() or 0) > 0:
-            y_cursor -= line_h
-            c.drawRightString(x_sub, y_cursor, f"Descuento: {float(self.disc_e.get()):.2f}")
-            
-        y_cursor -= line_h
-        c.drawRightString(x_sub, y_cursor, f"Total: {self.total_lbl.cget('text')}")
+    def _update_pdf_status(self):
+        if not self.pdf_status.winfo_exists():
+            return
+        n = worker.pending()
+        self.pdf_status.configure(text=f"Generando {n} PDF(s)..." if n else "")
 
-        # — INFORMACIÓN ADICIONAL (si la hay) —
-        if info_adicional:
-            y_cursor -= 2 * line_h
-            if y_cursor < MARGIN_BOTTOM + 4 * line_h:
-                y_cursor = nueva_pagina()
+    def _pdf_ready(self, path, message):
+        # La copia en la caché ya la hizo el worker (store_id)
+        self._update_pdf_status()
+        if messagebox.askyesno("Abrir PDF", f"{message}\n¿Deseas abrir el PDF ahora?"):
+            self._open_pdf(path)
 
-            c.setFont("Helvetica-Bold", 9)
-            c.drawString(MARGIN_LEFT, y_cursor, "Información Adicional:")
-            y_cursor -= line_h
+    def _pdf_failed(self, path, error):
+        self._update_pdf_status()
+        messagebox.showerror("Error al generar PDF", f"{path}\n{error}")
 
-            c.setFont("Helvetica", 9)
-            text_obj = c.beginText(MARGIN_LEFT + 10, y_cursor)
-            
-            # Dividir texto respetando márgenes
-            for ln in simpleSplit(info_adicional, "Helvetica", 9, usable_width - 10):
-                if text_obj.getY() < MARGIN_BOTTOM + line_h:
-                    c.drawText(text_obj)
-                    y_cursor = nueva_pagina()
-                    text_obj = c.beginText(MARGIN_LEFT + 10, y_cursor)
-                text_obj.textLine(ln)
-            c.drawText(text_obj)
-            y_cursor = text_obj.getY() - line_h
-
-        # — MÉTODO DE PAGO —
-        y_cursor -= line_h
-        if y_cursor < MARGIN_BOTTOM + 2*line_h:
-            y_cursor = nueva_pagina()
-            
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(MARGIN_LEFT, y_cursor, "Método de pago:")
-        c.setFont("Helvetica", 9)
-        
-        # Manejar método de pago largo que puede necesitar múltiples líneas
-        metodo_lines = simpleSplit(metodo_pago, "Helvetica", 9, usable_width - 100)
-        for i, line in enumerate(metodo_lines):
-            if y_cursor - i*line_h < MARGIN_BOTTOM:
-                y_cursor = nueva_pagina()
-                i = 0
-            c.drawString(MARGIN_LEFT + 100, y_cursor - i*line_h, line)
-
-        c.save()
+    @staticmethod
+    def _open_pdf(file_path):
+        try:
+            if os.name == "nt":
+                os.startfile(file_path)
+            elif platform.system() == "Darwin":
+                os.system(f"open '{file_path}'")
+            else:
+                os.system(f"xdg-open '{file_path}'")
+        except Exception as e:
+            messagebox.showerror("Error al abrir PDF", str(e))
 
     def _print(self):
         pass
@@ -0,0 +1,129 @@
+# gui/search.py
+import unicodedata
+
+# Resultados mostrados como máximo en las listas desplegables
+MAX_RESULTS = 200
+# Espera (ms) desde la última tecla antes de buscar
+DEBOUNCE_MS = 150
+
+
+def fold(text):
+    """Normaliza para buscar: minúsculas y sin acentos ("Peñafiel" → "penafiel")."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def _trigrams(text):
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    Índice en memoria para buscar por subcadena sin distinguir acentos.
+    entries: iterable de (texto_mostrado, texto_buscable), en el orden en que
+    deben aparecer los resultados.
+
+    - Los textos se normalizan una sola vez al crear el índice.
+    - Consultas de 3+ letras se resuelven con un índice de trigramas
+      (se construye la primera vez que hace falta).
+    - Si la consulta solo creció respecto a una anterior, se filtran los
+      resultados previos en vez de recorrer todo el catálogo.
+    """
+    def __init__(self, entries):
+        self.displays = []
+        self._norm    = []
+        for display, haystack in entries:
+            self.displays.append(display)
+            self._norm.append(fold(haystack))
+        self._grams   = None   # trigrama -> lista de posiciones
+        self._history = {}     # consulta -> posiciones que coinciden
+
+    def _build_grams(self):
+        self._grams = {}
+        for pos, text in enumerate(self._norm):
+            for g in _trigrams(text):
+                self._grams.setdefault(g, []).append(pos)
+
+    def _candidates(self, q):
+        # 1) Resultados de una consulta anterior que sea prefijo de esta
+        for n in range(len(q) - 1, 0, -1):
+            prev = self._history.get(q[:n])
+            if prev is not None:
+                return prev
+        # 2) Intersección de trigramas (empezando por la lista más corta)
+        if len(q) >= 3:
+            if self._grams is None:
+                self._build_grams()
+            postings = sorted((self._grams.get(g, []) for g in _trigrams(q)), key=len)
+            if not postings[0]:
+                return []
+            common = set(postings[0])
+            for plist in postings[1:]:
+                common.intersection_update(plist)
+            return sorted(common)
+        # 3) Una o dos letras: recorrido completo
+        return range(len(self._norm))
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Textos mostrados que contienen la consulta; primero los que empiezan por ella."""
+        q = fold(query).strip()
+        if not q:
+            return self.displays[:limit]
+
+        hits = self._history.get(q)
+        if hits is None:
+            norm = self._norm
+            hits = [pos for pos in self._candidates(q) if q in norm[pos]]
+            if len(self._history) > 64:
+                self._history.clear()
+            self._history[q] = hits
+
+        starts = [pos for pos in hits if self._norm[pos].startswith(q)]
+        if len(starts) < limit:
+            first = set(starts)
+            starts += [pos for pos in hits if pos not in first][:limit - len(starts)]
+        return [self.displays[pos] for pos in starts[:limit]]
+
+
+class IncrementalSearch:
+    """
+    Une un Entry, una lista (ttk.Treeview show="tree") y un SearchIndex:
+    espera DEBOUNCE_MS desde la última tecla y muestra los primeros
+    MAX_RESULTS resultados reutilizando las filas de la lista.
+    """
+    def __init__(self, entry, listbox, index=None, active=lambda: True,
+                 limit=MAX_RESULTS, delay=DEBOUNCE_MS):
+        self.entry   = entry
+        self.listbox = listbox
+        self.index   = index or SearchIndex(())
+        self.active  = active
+        self.limit   = limit
+        self.delay   = delay
+        self._job    = None
+        entry.bind("<KeyRelease>", self._schedule)
+
+    def set_index(self, index):
+        self.index = index
+
+    def _schedule(self, event=None):
+        if self._job:
+            self.entry.after_cancel(self._job)
+        self._job = self.entry.after(self.delay, self._run)
+
+    def _run(self):
+        self._job = None
+        if self.active():
+            self.show(self.entry.get())
+
+    def show(self, query=""):
+        results = self.index.search(query, self.limit)
+        items = self.listbox.get_children()
+        for i, text in enumerate(results):
+            if i < len(items):
+                self.listbox.item(items[i], text=text)
+            else:
+                self.listbox.insert("", "end", text=text)
+        if len(items) > len(results):
+            self.listbox.delete(*items[len(results):])
+        self.listbox.selection_remove(self.listbox.selection())
+        self.listbox.yview_moveto(0)
@@ -1,8 +1,9 @@
 # gui/users.py
 import customtkinter as ctk
-from tkinter import messagebox, ttk
+from tkinter import messagebox
 import ctypes
 from models import User
+from gui.utils import VirtualTable, text_sort_key
 
 SW_MAXIMIZE = 3
 def maximize_window(win):
@@ -45,16 +46,13 @@ class UsersWindow:
             "username":"Usuario",
             "role":"Rol"
         }
-        self.tree = ttk.Treeview(self.table_frame,
-                                 columns=cols,
-                                 show="headings",
-                                 displaycolumns=display)
-        for c in cols:
-            self.tree.heading(c,
-                              text=headings.get(c,""),
-                              command=(lambda _c=c: self.sort_by(_c, False)))
-            self.tree.column(c, width=150, anchor="center")
-        self.tree.pack(fill="both", expand=True)
+        self.table = VirtualTable(self.table_frame,
+                                  columns=cols,
+                                  headings=headings,
+                                  displaycolumns=display,
+                                  widths={c: 150 for c in cols},
+                                  sort_key=text_sort_key)
+        self.table.pack(fill="both", expand=True)
 
         # Botones
         self.actions_frame.pack(fill="x", pady=10, padx=20)
@@ -72,21 +70,19 @@ class UsersWindow:
         self._load_users()
 
     def _load_users(self):
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-        for u in User.all():
-            self.tree.insert("", "end", values=(
-                u["id"], u["full_name"], u["username"], u["role"]
-            ))
+        self.table.set_rows([
+            (u["id"], u["full_name"], u["username"], u["role"])
+            for u in User.all()
+        ])
 
     def _open_form(self, edit):
         # determina edición
         self.edit_id = None
         if edit:
-            sel = self.tree.selection()
+            sel = self.table.selected()
             if not sel:
                 return messagebox.showerror("Error", "Seleccione un usuario.")
-            self.edit_id = self.tree.item(sel[0])["values"][0]
+            self.edit_id = sel[0][0]
 
         # oculta tablas y botones
         for f in (self.header_frame, self.table_frame, self.actions_frame):
@@ -163,10 +159,10 @@ class UsersWindow:
         self.actions_frame.pack(fill="x", pady=10, padx=20)
 
     def _delete_user(self):
-        sel = self.tree.selection()
+        sel = self.table.selected()
         if not sel:
             return messagebox.showerror("Error", "Seleccione un usuario.")
-        uid = self.tree.item(sel[0])["values"][0]
+        uid = sel[0][0]
         if uid == self.current_user["id"]:
             return messagebox.showerror("Error", "No puede borrarse a sí mismo.")
         if not messagebox.askyesno("Confirmar", "¿Eliminar este usuario?"):
@@ -174,14 +170,6 @@ class UsersWindow:
         User.delete(uid)
         self._load_users()
 
-    def sort_by(self, col, descending):
-        data = [(self.tree.set(k, col).lower(), k)
-                for k in self.tree.get_children()]
-        data.sort(reverse=descending)
-        for idx, (_, k) in enumerate(data):
-            self.tree.move(k, "", idx)
-        self.tree.heading(col, command=lambda: self.sort_by(col, not descending))
-
     def _back(self):
         self.frame.destroy()
         from gui.dashboard import DashboardWindow
@@ -1,11 +1,17 @@
 # gui/utils.py
 
 import os
+import threading
 import customtkinter as ctk
 import ctypes
-from tkinter import messagebox
+from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 from models import Product
+import bulk_import
+from gui.db_executor import executor
+
+# Motivos de ajuste manual de stock (texto mostrado -> stock_movements.reason)
+STOCK_REASONS = {"Ajuste": "adjustment", "Devolución": "return"}
 
 # — Maximizar ventana en Windows —
 SW_MAXIMIZE = 3
@@ -38,6 +44,383 @@ class ScrollableFrame(ctk.CTkScrollableFrame):
         # Alias para compatibilidad con .scrollable_frame
         self.scrollable_frame = self
 
+# -------------------------------------------------------------------
+# Tabla con scroll virtual
+# -------------------------------------------------------------------
+def default_sort_key(col, value):
+    """Ordena numéricamente si el valor lo permite (admite "12.5%")."""
+    text = "" if value is None else str(value)
+    try:
+        return (0, float(text.rstrip("%")), "")
+    except ValueError:
+        return (1, 0.0, text.lower())
+
+
+def text_sort_key(col, value):
+    return "" if value is None else str(value).lower()
+
+
+class ListSource:
+    """Origen de filas en memoria: lista de tuplas."""
+    def __init__(self, rows=()):
+        self._rows = list(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self, start, stop):
+        return self._rows[start:stop]
+
+    def fill(self, stop):
+        pass
+
+    def missing(self, stop):
+        return False
+
+    def complete(self):
+        return True
+
+    def sort(self, index, descending, key):
+        self._rows.sort(key=lambda r: key(r[index]), reverse=descending)
+        return True
+
+    def find(self, keys, key_index):
+        return [r for r in self._rows if r[key_index] in keys]
+
+    def remove(self, keys, key_index):
+        self._rows = [r for r in self._rows if r[key_index] not in keys]
+
+
+class PagedSource:
+    """
+    Origen de filas paginado (p. ej. una consulta SQL por clave).
+    fetch(after, limit) -> (filas, after_siguiente); count() -> total opcional.
+    Cada página se pide solo cuando la tabla llega a ella (o todas, si se
+    ordena por una columna). rows() nunca consulta: devuelve lo ya cargado
+    y fill() trae el resto desde el hilo de la base.
+    """
+    def __init__(self, fetch, count=None, page_size=200):
+        self._fetch = fetch
+        self._page  = page_size
+        self._rows  = []
+        self._after = None
+        self._done  = False
+        self._total = count() if count else None
+        self._lock  = threading.Lock()  # fill() corre en otro hilo que remove()
+
+    def __len__(self):
+        if self._done:
+            return len(self._rows)
+        if self._total is not None:
+            return max(self._total, len(self._rows))
+        return len(self._rows) + self._page
+
+    def fill(self, stop):
+        """Trae páginas hasta tener stop filas. Se llama desde el hilo de la base."""
+        while not self._done and len(self._rows) < stop:
+            rows, after = self._fetch(self._after, self._page)
+            with self._lock:
+                self._rows.extend(rows)
+                self._after = after
+                if len(rows) < self._page:
+                    self._done = True
+
+    def rows(self, start, stop):
+        return self._rows[start:stop]
+
+    def missing(self, stop):
+        return not self._done and len(self._rows) < stop
+
+    def complete(self):
+        return self._done
+
+    def fill_all(self):
+        self.fill(float("inf"))
+
+    def sort(self, index, descending, key):
+        # Ordenar por otra columna exige tener todas las filas: la tabla
+        # las pide antes con fill_all() en el hilo de la base
+        if not self._done:
+            return False
+        self._rows.sort(key=lambda r: key(r[index]), reverse=descending)
+        return True
+
+    def find(self, keys, key_index):
+        return [r for r in self._rows if r[key_index] in keys]
+
+    def remove(self, keys, key_index):
+        with self._lock:
+            before = len(self._rows)
+            self._rows = [r for r in self._rows if r[key_index] not in keys]
+            if self._total is not None:
+                self._total -= before - len(self._rows)
+
+
+class VirtualTable(ctk.CTkFrame):
+    """
+    Treeview con scroll virtual: solo existen como ítems las filas visibles,
+    el resto queda en el origen de datos (ListSource o PagedSource).
+    La selección se guarda por clave (columna key_index), así que se
+    mantiene al hacer scroll y al ordenar.
+    """
+    def __init__(self, master, columns, headings=None, displaycolumns=None,
+                 widths=None, anchors=None, key_index=0, sortable=True,
+                 sort_key=default_sort_key, tag_fn=None, height=18, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns   = tuple(columns)
+        self.key_index = key_index
+        self.sort_key  = sort_key
+        self.tag_fn    = tag_fn
+        self.source    = ListSource()
+        self.offset    = 0
+        self.visible   = height
+        self._selected = set()   # claves seleccionadas
+        self._iid_rows = {}      # ítem visible -> fila
+        self._sort_desc = {}
+        self._loading  = False   # el origen se está cargando en otro hilo
+        self._filling  = 0       # hasta qué fila se pidieron páginas al hilo de la base
+        self._placeholder = ("…",) * len(self.columns)
+
+        headings = headings or {}
+        widths   = widths or {}
+        anchors  = anchors or {}
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings",
+                                 displaycolumns=displaycolumns or self.columns,
+                                 height=height)
+        for col in self.columns:
+            if sortable:
+                self.tree.heading(col, text=headings.get(col, ""),
+                                  command=lambda _c=col: self.sort_by(_c))
+            else:
+                self.tree.heading(col, text=headings.get(col, ""))
+            self.tree.column(col, width=widths.get(col, 100),
+                             anchor=anchors.get(col, "center"),
+                             stretch=widths.get(col, 100) > 0)
+        self.vs = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.vs.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.loading_lbl = ctk.CTkLabel(self, text="Cargando…", fg_color="gray85",
+                                        corner_radius=6, width=160, height=32)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<ButtonPress-1>", self._on_click)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Up>", lambda e: self._on_key(-1))
+        self.tree.bind("<Down>", lambda e: self._on_key(1))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.scroll(self.visible))
+
+    # — Datos —
+    def set_rows(self, rows):
+        self.set_source(ListSource(rows))
+
+    def set_source(self, source):
+        self.source = source
+        self.offset = 0
+        self._filling = 0
+        self._selected.clear()
+        self.render()
+
+    def load(self, make_source, on_error=None):
+        """
+        Arma el origen con make_source() en el hilo de la base (consulta el
+        total y la primera página) y lo muestra al terminar; mientras tanto
+        la tabla dice "Cargando…". Una carga nueva reemplaza a la anterior.
+        """
+        visible = self.visible
+
+        def prepare():
+            source = make_source()
+            source.fill(visible)
+            return source
+
+        self.set_loading(True)
+        executor.submit(self, prepare, key=("table", id(self)), interrupt=True,
+                        on_done=self._loaded,
+                        on_error=lambda e: self._load_failed(e, on_error))
+
+    def _loaded(self, source):
+        self.set_loading(False)
+        self.set_source(source)
+
+    def _load_failed(self, error, on_error):
+        self.set_loading(False)
+        if on_error:
+            on_error(error)
+        else:
+            messagebox.showerror("Error", f"No se pudieron cargar los datos:\n{error}")
+
+    def set_loading(self, loading):
+        # Mientras carga, la tabla no pide filas (el origen puede estar a medio llenar)
+        self._loading = loading
+        if loading:
+            self._filling = 0  # la carga reemplaza a los pedidos de páginas
+            self.loading_lbl.place(relx=0.5, rely=0.5, anchor="center")
+            self.loading_lbl.lift()
+        else:
+            self.loading_lbl.place_forget()
+
+    def selected(self):
+        """Filas seleccionadas (también las que no están a la vista)."""
+        if not self._selected:
+            return []
+        return self.source.find(self._selected, self.key_index)
+
+    def remove(self, keys):
+        keys = set(keys)
+        self.source.remove(keys, self.key_index)
+        self._selected -= keys
+        self.render()
+
+    # — Dibujo —
+    def render(self):
+        if self._loading:
+            return
+        total = len(self.source)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        stop  = self.offset + self.visible
+        rows  = self.source.rows(self.offset, stop)
+        wanted = min(self.visible, total - self.offset)
+        if len(rows) < wanted and self.source.missing(stop):
+            # Las páginas que faltan se piden al hilo de la base; mientras
+            # tanto se dibujan filas vacías
+            self._request_fill(stop)
+            rows = rows + [self._placeholder] * (wanted - len(rows))
+
+        # Reutilizo los ítems existentes en lugar de borrar e insertar
+        items = self.tree.get_children()
+        for i, row in enumerate(rows):
+            tags = self.tag_fn(row) if self.tag_fn else ()
+            if i < len(items):
+                self.tree.item(items[i], values=row, tags=tags)
+            else:
+                self.tree.insert("", "end", values=row, tags=tags)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+
+        self._iid_rows = dict(zip(self.tree.get_children(), rows))
+        self.tree.selection_set([
+            iid for iid, row in self._iid_rows.items()
+            if row[self.key_index] in self._selected
+        ])
+        if total:
+            self.vs.set(self.offset / total,
+                        min(1.0, (self.offset + len(rows)) / total))
+        else:
+            self.vs.set(0, 1)
+
+    def _request_fill(self, stop):
+        if stop <= self._filling:
+            return  # ya hay un pedido que llega hasta acá
+        self._filling = stop
+        source = self.source
+        executor.submit(self, source.fill, stop, key=("table", id(self)), interrupt=True,
+                        on_done=lambda _: self._filled(source),
+                        on_error=lambda e: self._fill_failed(source, e))
+
+    def _filled(self, source):
+        if source is self.source:
+            self._filling = 0
+            self.render()
+
+    def _fill_failed(self, source, error):
+        if source is self.source:
+            self._filling = 0
+            messagebox.showerror("Error", f"No se pudieron cargar los datos:\n{error}")
+
+    def scroll(self, delta):
+        if self._loading:
+            return "break"
+        self.offset += delta
+        self.render()
+        return "break"
+
+    def sort_by(self, col):
+        if self._loading:
+            return
+        if not self.source.complete():
+            # Faltan páginas: se traen en el hilo de la base y luego se ordena
+            source = self.source
+            self.set_loading(True)
+            executor.submit(self, source.fill_all, key=("table", id(self)), interrupt=True,
+                            on_done=lambda _: self._sort_loaded(source, col),
+                            on_error=lambda e: self._load_failed(e, None))
+            return
+        descending = self._sort_desc.get(col, False)
+        index = self.columns.index(col)
+        if self.source.sort(index, descending, lambda v: self.sort_key(col, v)):
+            self._sort_desc[col] = not descending
+            self.offset = 0
+            self.render()
+
+    def _sort_loaded(self, source, col):
+        self.set_loading(False)
+        if source is self.source:
+            self.sort_by(col)
+
+    # — Eventos —
+    def _on_select(self, event=None):
+        visible_keys = {row[self.key_index] for row in self._iid_rows.values()}
+        chosen = {
+            self._iid_rows[iid][self.key_index]
+            for iid in self.tree.selection()
+            if iid in self._iid_rows and self._iid_rows[iid] is not self._placeholder
+        }
+        self._selected = (self._selected - visible_keys) | chosen
+
+    def _on_click(self, event):
+        # Click en una fila sin Ctrl/Shift: se descarta la selección fuera de la vista
+        region = self.tree.identify_region(event.x, event.y)
+        if region in ("cell", "tree") and not event.state & 0x0005:
+            self._selected.clear()
+
+    def _on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_key(self, step):
+        items = self.tree.get_children()
+        focus = self.tree.focus()
+        if not items or focus not in items:
+            return None
+        at_edge = items.index(focus) == (0 if step < 0 else len(items) - 1)
+        if not at_edge:
+            return None  # el Treeview mueve el foco normalmente
+        before = self.offset
+        self.scroll(step)
+        if self.offset != before:
+            items = self.tree.get_children()
+            target = items[0] if step < 0 else items[-1]
+            if self._iid_rows[target] is self._placeholder:
+                return "break"  # la fila todavía se está cargando
+            self._selected = {self._iid_rows[target][self.key_index]}
+            self.tree.selection_set(target)
+            self.tree.focus(target)
+        return "break"
+
+    def _on_scrollbar(self, *args):
+        if self._loading:
+            return
+        total = len(self.source)
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.render()
+
+    def _on_resize(self, event):
+        try:
+            row_h = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (TypeError, ValueError):
+            row_h = 20
+        visible = max(1, (event.height - row_h - 4) // row_h)  # menos la cabecera
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
 # -------------------------------------------------------------------
 # ProductForm (sin cambios respecto a tu versión anterior)
 # -------------------------------------------------------------------
@@ -235,7 +618,7 @@ class StockForm:
         self.win.title("Ajustar Stock")
 
         # Tamaño fijo y centrado
-        self.win.geometry("350x260")
+        self.win.geometry("350x300")
         self.win.resizable(False, False)
         self.win.update_idletasks()
         w = self.win.winfo_width()
@@ -264,7 +647,12 @@ class StockForm:
 
         # Campo de entrada visible y con tamaño adecuado
         self.qty = ctk.CTkEntry(container, width=120, height=30, font=("Arial", 12))
-        self.qty.pack(pady=(0,15))
+        self.qty.pack(pady=(0,10))
+
+        # Motivo que queda en el historial de movimientos
+        self.reason = ctk.CTkComboBox(container, values=list(STOCK_REASONS), state="readonly", width=160)
+        self.reason.set("Ajuste")
+        self.reason.pack(pady=(0,15))
 
         # Botones al pie
         btnf = ctk.CTkFrame(container)
@@ -283,6 +671,78 @@ class StockForm:
                 "Permiso denegado",
                 "Solo Administradores pueden egresar stock."
             )
-        Product.adjust_stock(self.product_id, delta)
+        reason = STOCK_REASONS[self.reason.get()]
+        if reason == "return" and delta <= 0:
+            return messagebox.showerror("Error", "Una devolución debe ser un ingreso (+).")
+        Product.adjust_stock(self.product_id, delta, reason)
         self.callback()
         self.win.destroy()
+
+
+class BulkImport:
+    """
+    Botón "Importar..." con su barra de progreso para cargar un CSV/XLSX
+    con bulk_import en segundo plano. callback se llama al terminar.
+    """
+    def __init__(self, master, frame, kind, callback):
+        self.frame    = frame
+        self.kind     = kind
+        self.callback = callback
+        self.button = ctk.CTkButton(master, text="Importar...", command=self.start)
+        self.bar    = ctk.CTkProgressBar(master, width=150)
+        self.cancel = threading.Event()
+        self.state  = None
+
+    def pack(self, **kwargs):
+        self.button.pack(**kwargs)
+        return self
+
+    def start(self):
+        if self.state is not None:
+            return
+        path = filedialog.askopenfilename(filetypes=[
+            ("CSV o Excel", "*.csv *.txt *.xlsx"), ("CSV", "*.csv *.txt"), ("Excel", "*.xlsx")])
+        if not path:
+            return
+        self.cancel.clear()
+        state = self.state = {"fraction": 0.0, "result": None, "error": None}
+
+        def progress(fraction):
+            state["fraction"] = fraction
+
+        def run():
+            try:
+                state["result"] = bulk_import.import_file(path, self.kind, progress, self.cancel)
+            except Exception as e:
+                state["error"] = e
+
+        self.button.configure(state="disabled", text="Importando...")
+        self.bar.set(0)
+        self.bar.pack(side="left", padx=5, after=self.button)
+        threading.Thread(target=run, daemon=True).start()
+        self.frame.after(100, self._poll)
+
+    def _poll(self):
+        state = self.state
+        if not self.frame.winfo_exists():
+            self.cancel.set()
+            return
+        self.bar.set(state["fraction"])
+        if state["result"] is None and state["error"] is None:
+            self.frame.after(100, self._poll)
+            return
+
+        self.state = None
+        self.bar.pack_forget()
+        self.button.configure(state="normal", text="Importar...")
+        if state["error"] is not None:
+            return messagebox.showerror("Error al importar", str(state["error"]))
+        r = state["result"]
+        msg = f"Nuevos: {r['inserted']}\nActualizados: {r['updated']}"
+        if r["rejected"]:
+            msg += f"\nCon errores (no cargados): {r['rejected']}\n\n"
+            msg += "\n".join(f"Línea {line}: {error}" for line, error in r["errors"][:15])
+            if r["rejected"] > 15:
+                msg += "\n..."
+        messagebox.showinfo("Importación terminada", msg)
+        self.callback()
@@ -0,0 +1,129 @@
+# kpis.py
+"""
+Indicadores del panel principal: ventas de hoy y del mes, productos con
+stock bajo, proformas pendientes y productos más vendidos del mes.
+
+Se calculan en un hilo aparte (refresh) a partir de los resúmenes de
+ventas y de consultas con índice, y se guardan con un TTL corto: volver
+al panel muestra al instante el último valor. Al guardar una venta,
+note_document actualiza los totales en la caché y pide un recálculo.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import reports
+from models import db, to_iso
+
+TTL = 30            # segundos que se considera vigente un cálculo
+LOW_STOCK = 1       # stock <= LOW_STOCK cuenta como bajo (como en Inventario)
+PENDING_DAYS = 30   # proformas de los últimos días sin nota posterior del cliente
+TOP_N = 3
+
+_lock = threading.Lock()
+_state = {"values": None, "at": 0.0, "running": False, "again": False, "error": None}
+
+
+def compute(today=None):
+    """Calcula todos los indicadores (consulta la base; no usar en el hilo de la ventana)."""
+    today = today or date.today()
+    tomorrow = today + timedelta(days=1)
+    month_start = today.replace(day=1)
+    low = db.query(
+        "SELECT COUNT(*) AS cnt FROM products WHERE type = 'Producto' AND stock <= ?",
+        (LOW_STOCK,)
+    )[0]["cnt"]
+    # Pendiente: proforma reciente cuyo cliente no tiene una nota desde entonces
+    pending = db.query(
+        "SELECT COUNT(*) AS cnt FROM documents p WHERE p.type = 'PROFORMA' AND p.issued_at >= ? "
+        "AND NOT EXISTS (SELECT 1 FROM documents n WHERE n.client_id = p.client_id "
+        "AND n.type = 'NOTA' AND n.issued_at >= p.issued_at)",
+        (to_iso(today - timedelta(days=PENDING_DAYS)),)
+    )[0]["cnt"]
+    return {
+        "day":     today.isoformat(),
+        "today":   reports.totals(today, tomorrow),
+        "month":   reports.totals(month_start, tomorrow),
+        "low_stock": low,
+        "pending": pending,
+        "top":     reports.top_products(month_start, tomorrow, TOP_N),
+    }
+
+
+def get():
+    """Últimos valores calculados (pueden estar vencidos) o None."""
+    with _lock:
+        return _state["values"]
+
+
+def refresh(force=False):
+    """Recalcula en segundo plano si los valores vencieron (o si force)."""
+    with _lock:
+        if not force and _fresh():
+            return
+        if _state["running"]:
+            # El cálculo en curso puede no incluir el último cambio
+            _state["again"] = _state["again"] or force
+            return
+        _state["running"] = True
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def running():
+    with _lock:
+        return _state["running"]
+
+
+def last_error():
+    with _lock:
+        return _state["error"]
+
+
+def note_document(type_, date_, total):
+    """
+    Llamar tras guardar un documento: suma la venta a los totales que ya
+    están en caché (el panel queda al día sin esperar) y recalcula el resto.
+    """
+    issued = to_iso(date_)[:10]
+    with _lock:
+        values = _state["values"]
+        if values is not None and type_ == "NOTA":
+            values = dict(values)
+            for key in ("today", "month"):
+                same = issued == values["day"] if key == "today" else issued[:7] == values["day"][:7]
+                if same:
+                    values[key] = {"docs": values[key]["docs"] + 1,
+                                   "amount": values[key]["amount"] + total}
+            _state["values"] = values
+        _state["at"] = 0.0   # vencido: top, stock y proformas cambian
+    refresh(force=True)
+
+
+def invalidate():
+    """Descarta los valores (p. ej. tras restaurar otra base) y recalcula."""
+    with _lock:
+        _state["values"], _state["at"] = None, 0.0
+    refresh(force=True)
+
+
+def _fresh():
+    values = _state["values"]
+    return (values is not None and time.monotonic() - _state["at"] < TTL
+            and values["day"] == date.today().isoformat())
+
+
+def _run():
+    while True:
+        values, error = None, None
+        try:
+            values = compute()
+        except Exception as e:
+            error = e
+        with _lock:
+            if values is not None:
+                _state["values"], _state["at"] = values, time.monotonic()
+            _state["error"] = error
+            if not _state["again"]:
+                _state["running"] = False
+                return
+            _state["again"] = False
@@ -1,29 +1,39 @@
-import customtkinter as ctk
-
-# ——— Monkey‑patch para colorear botones según su texto ———
-# Guardamos la implementación original de CTkButton
-_OrigButton = ctk.CTkButton
-
-# Creamos una subclase que ajusta colores si el texto es "Guardar" o "Cancelar"
-class ColorCTkButton(_OrigButton):
-    def __init__(self, master=None, *args, text="", **kwargs):
-        if text == "Guardar":
-            # Verde estilo Bootstrap
-            kwargs.setdefault("fg_color", "#28a745")
-            kwargs.setdefault("hover_color", "#218838")
-        elif text == "Cancelar":
-            # Rojo estilo Bootstrap
-            kwargs.setdefault("fg_color", "#dc3545")
-            kwargs.setdefault("hover_color", "#c82333")
-        super().__init__(master, *args, text=text, **kwargs)
-
-# Reemplazamos CTkButton globalmente
-ctk.CTkButton = ColorCTkButton
-# —————————————————————————————————————————————————————
-
-from gui.login import LoginWindow
+import multiprocessing
+
+# Aquí solo se importa multiprocessing: los procesos de la exportación en
+# lote ("spawn") vuelven a importar este archivo como __mp_main__, y no deben
+# abrir la base de datos ni cargar la interfaz. El resto se importa en main().
+
+
+def _patch_buttons(ctk):
+    # ——— Monkey‑patch para colorear botones según su texto ———
+    # Guardamos la implementación original de CTkButton
+    _OrigButton = ctk.CTkButton
+
+    # Creamos una subclase que ajusta colores si el texto es "Guardar" o "Cancelar"
+    class ColorCTkButton(_OrigButton):
+        def __init__(self, master=None, *args, text="", **kwargs):
+            if text == "Guardar":
+                # Verde estilo Bootstrap
+                kwargs.setdefault("fg_color", "#28a745")
+                kwargs.setdefault("hover_color", "#218838")
+            elif text == "Cancelar":
+                # Rojo estilo Bootstrap
+                kwargs.setdefault("fg_color", "#dc3545")
+                kwargs.setdefault("hover_color", "#c82333")
+            super().__init__(master, *args, text=text, **kwargs)
+
+    # Reemplazamos CTkButton globalmente
+    ctk.CTkButton = ColorCTkButton
+    # —————————————————————————————————————————————————————
 
 def main():
+    import customtkinter as ctk
+    _patch_buttons(ctk)
+
+    from gui.login import LoginWindow
+    import backups
+
     # Tema
     ctk.set_default_color_theme("dark-blue")
     ctk.set_appearance_mode("Light")
@@ -46,11 +56,16 @@ def main():
     ctk.set_widget_scaling(scale)
     ctk.set_window_scaling(scale)
 
+    # Respaldos automáticos en segundo plano (si están activados)
+    backups.scheduler.start()
+
     # Iniciar flujo
     LoginWindow(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necesario para los procesos de la exportación en lote en el .exe
+    multiprocessing.freeze_support()
     main()
 
 
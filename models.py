@@ -1,9 +1,162 @@
 # models.py
 import bcrypt
+import threading
+import time
+from datetime import date, datetime
 from db import Database
 
 db = Database()
 
+# Formato de documents.date (el que se muestra e imprime) y de issued_at
+DATE_FMT = "%d/%m/%Y/%H:%M"
+ISO_FMT  = "%Y-%m-%dT%H:%M"
+
+# Filas por fetchmany en los iter_* (ver Database.iterate)
+ITER_BATCH = 500
+
+# Movimientos de stock: formato de stock_movements.at y cada cuántos
+# movimientos de un producto se guarda una foto de su stock
+MOVEMENT_FMT = "%Y-%m-%dT%H:%M:%S"
+SNAPSHOT_EVERY = 50
+
+# Cada cuántos segundos la caché de lecturas mira si otro proceso escribió
+CACHE_CHECK_EVERY = 1.0
+
+# Numeración de documentos: False = una serie continua por tipo,
+# True = la serie se reinicia cada año
+SEQUENCE_PER_YEAR = False
+
+
+def to_iso(value):
+    """Convierte datetime/date o un texto "DD/MM/YYYY/HH:MM" a ISO-8601."""
+    if isinstance(value, datetime):
+        return value.strftime(ISO_FMT)
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%dT00:00")
+    try:
+        return datetime.strptime(value, DATE_FMT).strftime(ISO_FMT)
+    except ValueError:
+        return value  # ya viene en ISO
+
+class _Cache:
+    """
+    Caché de lecturas compartida por todas las ventanas del proceso.
+    Cada grupo ("products", "clients") se invalida desde los métodos que
+    escriben en su tabla; los cambios hechos por otro proceso se detectan
+    con PRAGMA data_version, que solo cambia con commits de otra conexión
+    (cada hilo tiene la suya: se compara con la última vista en ese hilo).
+    Esa consulta se hace como mucho una vez cada CACHE_CHECK_EVERY segundos
+    por hilo.
+    """
+    def __init__(self):
+        self._data = {}
+        self._generation = 0   # sube con cada invalidate()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self, group, key, loader):
+        self._check_external()
+        with self._lock:
+            value = self._data.get((group, key))
+            generation = self._generation
+        if value is None:
+            value = loader()
+            # Si se invalidó mientras se cargaba, el valor puede ser viejo:
+            # se devuelve igual, pero no se guarda
+            with self._lock:
+                if self._generation == generation:
+                    self._data[(group, key)] = value
+        return list(value)
+
+    def invalidate(self, *groups):
+        with self._lock:
+            self._generation += 1
+            if not groups:
+                self._data.clear()
+            else:
+                for k in [k for k in self._data if k[0] in groups]:
+                    del self._data[k]
+
+    def _check_external(self):
+        conn = db.conn
+        now = time.monotonic()
+        seen = getattr(self._local, "seen", None)
+        if seen and seen[0] == id(conn) and now - self._local.checked < CACHE_CHECK_EVERY:
+            return
+        self._local.checked = now
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if seen != (id(conn), version):
+            self.invalidate()
+            self._local.seen = (id(conn), version)
+
+
+cache = _Cache()
+
+
+def _fts_term(term):
+    """Frase FTS5 literal: el tokenizador trigram la busca como subcadena."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _use_fts(term):
+    # trigram necesita al menos 3 caracteres; con menos se usa LIKE
+    return db.has_fts and len(term) >= 3
+
+
+def _where(where):
+    return " WHERE " + " AND ".join(where) if where else ""
+
+
+def _page(table, order_col, where, params, after, limit):
+    """
+    Página ordenada por (order_col, id). after = (valor, id) de la última
+    fila de la página anterior (paginación por clave, sin OFFSET).
+    """
+    where, params = list(where), list(params)
+    if after:
+        where.append(f"({order_col}, id) > (?, ?)")
+        params.extend(after)
+    return db.query(
+        f"SELECT * FROM {table}{_where(where)} ORDER BY {order_col}, id LIMIT ?",
+        params + [limit]
+    )
+
+
+def _upsert_many(table, key, fields, rows, defaults=None):
+    """
+    Inserta o actualiza (según la columna key) un lote de filas, cada una
+    una tupla con los valores de fields (key incluida). Al actualizar solo
+    se tocan las columnas de fields; al insertar, las de defaults que no
+    estén en fields toman ese valor. Devuelve (insertadas, actualizadas).
+    """
+    extra = {c: v for c, v in (defaults or {}).items() if c not in fields}
+    if key not in fields:
+        fields, rows = tuple(fields) + (key,), [r + (None,) for r in rows]
+    k = fields.index(key)
+    keys = list({r[k] for r in rows if r[k] is not None})
+    existing = {}
+    if keys:
+        marks = ",".join("?" * len(keys))
+        for r in db.query(f"SELECT id, {key} FROM {table} WHERE {key} IN ({marks})", keys):
+            existing[r[key]] = r["id"]
+    new = [r for r in rows if r[k] not in existing]
+    old = [r + (existing[r[k]],) for r in rows if r[k] in existing]
+    if new:
+        cols = tuple(fields) + tuple(extra)
+        db.executemany(
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({','.join('?' * len(cols))})",
+            [r + tuple(extra.values()) for r in new]
+        )
+    if old:
+        # Las filas que no cambian no se escriben (ni disparan los triggers de FTS)
+        db.executemany(
+            f"UPDATE {table} SET {', '.join(f'{f}=?' for f in fields)} "
+            f"WHERE id=? AND NOT ({' AND '.join(f'{f} IS ?' for f in fields)})",
+            [r + r[:-1] for r in old]
+        )
+    return len(new), len(old)
+
+
 class User:
     @staticmethod
     def create(full_name, username, password, role="Administrador"):
@@ -51,17 +204,82 @@ class User:
         db.execute("DELETE FROM users WHERE id = ?", (user_id,))
 
 
+class StockError(Exception):
+    """
+    No hay stock para uno o más renglones. failures: lista de dicts con
+    product_id, code, name, requested y available (None si el producto ya
+    no existe).
+    """
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__("; ".join(
+            f"{f['name'] or f['product_id']}: pedido {f['requested']}, disponible {f['available']}"
+            for f in failures
+        ))
+
+
 class Product:
     @staticmethod
     def all(order_by="name"):
-        return db.query(f"SELECT * FROM products ORDER BY {order_by}")
+        return cache.get(
+            "products", ("all", order_by),
+            lambda: db.query(f"SELECT * FROM products ORDER BY {order_by}")
+        )
+
+    @staticmethod
+    def _filters(term=None, category=None):
+        where, params = [], []
+        if term and _use_fts(term):
+            where.append("id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+            params.append(_fts_term(term))
+        elif term:
+            where.append("(name LIKE ? OR code LIKE ?)")
+            params.extend([f"%{term}%"] * 2)
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        return where, params
 
     @staticmethod
     def search(term, order_by="name"):
+        where, params = Product._filters(term)
+        return db.query(f"SELECT * FROM products{_where(where)} ORDER BY {order_by}", params)
+
+    @staticmethod
+    def iter_all(order_by="name", category=None, size=ITER_BATCH):
+        """Como all(), pero generador (fetchmany) y sin pasar por la caché."""
+        where, params = Product._filters(category=category)
+        return db.iterate(f"SELECT * FROM products{_where(where)} ORDER BY {order_by}", params, size)
+
+    @staticmethod
+    def iter_search(term, order_by="name", size=ITER_BATCH):
+        where, params = Product._filters(term)
+        return db.iterate(f"SELECT * FROM products{_where(where)} ORDER BY {order_by}", params, size)
+
+    @staticmethod
+    def page(after=None, limit=100, term=None, category=None):
+        """Página por nombre; after = (name, id) de la última fila anterior."""
+        where, params = Product._filters(term, category)
+        return _page("products", "name", where, params, after, limit)
+
+    @staticmethod
+    def count(term=None, category=None):
+        where, params = Product._filters(term, category)
+        return db.query(f"SELECT COUNT(*) AS cnt FROM products{_where(where)}", params)[0]["cnt"]
+
+    @staticmethod
+    def search_ranked(term, limit=50):
+        """Coincidencias ordenadas por relevancia (bm25) cuando hay FTS5."""
+        if _use_fts(term):
+            return db.query(
+                "SELECT p.* FROM products_fts f JOIN products p ON p.id = f.rowid "
+                "WHERE products_fts MATCH ? ORDER BY f.rank LIMIT ?",
+                (_fts_term(term), limit)
+            )
         t = f"%{term}%"
         return db.query(
-            f"SELECT * FROM products WHERE name LIKE ? OR code LIKE ? ORDER BY {order_by}",
-            (t, t)
+            "SELECT * FROM products WHERE name LIKE ? OR code LIKE ? ORDER BY name LIMIT ?",
+            (t, t, limit)
         )
 
     @staticmethod
@@ -73,10 +291,22 @@ class Product:
 
     @staticmethod
     def get_categories():
-        rows = db.query(
-            "SELECT DISTINCT category FROM products WHERE category IS NOT NULL AND category <> ''"
-        )
-        return [r["category"] for r in rows]
+        def load():
+            rows = db.query(
+                "SELECT DISTINCT category FROM products WHERE category IS NOT NULL AND category <> ''"
+            )
+            return [r["category"] for r in rows]
+        return cache.get("products", "categories", load)
+
+    @staticmethod
+    def rename_category(old, new):
+        db.execute("UPDATE products SET category=? WHERE category=?", (new, old))
+        cache.invalidate("products")
+
+    @staticmethod
+    def clear_category(category):
+        db.execute("UPDATE products SET category='' WHERE category=?", (category,))
+        cache.invalidate("products")
 
     @staticmethod
     def get(product_id):
@@ -85,43 +315,273 @@ class Product:
 
     @staticmethod
     def create(code, name, category, cost_price, sell_price, type_, stock):
-        db.execute(
-            "INSERT INTO products (code, name, category, cost_price, sell_price, type, stock) "
-            "VALUES (?,?,?,?,?,?,?)",
-            (code or None, name, category, cost_price, sell_price, type_, stock)
-        )
+        with db.transaction():
+            cur = db.execute(
+                "INSERT INTO products (code, name, category, cost_price, sell_price, type, stock) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (code or None, name, category, cost_price, sell_price, type_, stock)
+            )
+            StockMovement.record([(cur.lastrowid, stock)], "initial")
+        cache.invalidate("products")
 
     @staticmethod
     def update(product_id, code, name, category, cost_price, sell_price, type_, stock):
-        db.execute(
-            "UPDATE products SET code=?, name=?, category=?, cost_price=?, sell_price=?, type=?, stock=? "
-            "WHERE id=?",
-            (code or None, name, category, cost_price, sell_price, type_, stock, product_id)
-        )
+        with db.transaction(immediate=True):
+            rows = db.query("SELECT stock FROM products WHERE id = ?", (product_id,))
+            db.execute(
+                "UPDATE products SET code=?, name=?, category=?, cost_price=?, sell_price=?, type=?, stock=? "
+                "WHERE id=?",
+                (code or None, name, category, cost_price, sell_price, type_, stock, product_id)
+            )
+            if rows:
+                StockMovement.record([(product_id, stock - (rows[0]["stock"] or 0))], "edit")
+        cache.invalidate("products")
 
     @staticmethod
     def delete(product_id):
+        """sqlite3.IntegrityError si el producto figura en algún documento."""
         db.execute("DELETE FROM products WHERE id = ?", (product_id,))
+        cache.invalidate("products")
 
     @staticmethod
-    def adjust_stock(product_id, delta):
-        db.execute(
-            "UPDATE products SET stock = stock + ? WHERE id = ?",
-            (delta, product_id)
+    def upsert_many(fields, rows):
+        """Alta/actualización masiva por código (ver bulk_import)."""
+        with db.transaction():
+            if "stock" in fields:
+                # Para registrar los movimientos: stock previo de los que
+                # ya existen y último id antes de los nuevos
+                k = fields.index("code") if "code" in fields else None
+                codes = list({r[k] for r in rows if r[k] is not None}) if k is not None else []
+                before = {}
+                if codes:
+                    marks = ",".join("?" * len(codes))
+                    before = {r["id"]: r["stock"] or 0 for r in db.query(
+                        f"SELECT id, stock FROM products WHERE code IN ({marks})", codes)}
+                last_id = db.query("SELECT COALESCE(MAX(id), 0) AS m FROM products")[0]["m"]
+            result = _upsert_many("products", "code", fields, rows, {
+                "category": "", "cost_price": 0.0, "sell_price": 0.0, "type": "Producto", "stock": 0
+            })
+            if "stock" in fields:
+                moves = []
+                if before:
+                    marks = ",".join("?" * len(before))
+                    moves = [(r["id"], r["stock"] - before[r["id"]]) for r in db.query(
+                        f"SELECT id, stock FROM products WHERE id IN ({marks})", list(before))]
+                moves += [(r["id"], r["stock"]) for r in db.query(
+                    "SELECT id, stock FROM products WHERE id > ?", (last_id,))]
+                StockMovement.record(moves, "import")
+        cache.invalidate("products")
+        return result
+
+    @staticmethod
+    def take_stock(lines, reason="sale", document_id=None):
+        """
+        Descuenta lines = [(product_id, qty)] solo si alcanza el stock de
+        todos (UPDATE condicional: dos cajas no pueden vender la misma
+        unidad). Los servicios no llevan stock. Debe llamarse dentro de
+        una transacción IMMEDIATE; si falta stock lanza StockError y el
+        llamador hace rollback de todo.
+        """
+        needed = {}
+        for pid, qty in lines:
+            needed[pid] = needed.get(pid, 0) + qty
+        marks = ",".join("?" * len(needed))
+        current = {r["id"]: r for r in db.query(
+            f"SELECT id, code, name, type, stock FROM products WHERE id IN ({marks})", list(needed))}
+        failures, moves = [], []
+        for pid, qty in needed.items():
+            p = current.get(pid)
+            if p is not None and p["type"] == "Servicio":
+                continue
+            if p is not None:
+                cur = db.execute(
+                    "UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                    (qty, pid, qty)
+                )
+                if cur.rowcount:
+                    moves.append((pid, -qty))
+                    continue
+            failures.append({
+                "product_id": pid, "code": p["code"] if p else None, "name": p["name"] if p else None,
+                "requested": qty, "available": p["stock"] if p else None,
+            })
+        if failures:
+            raise StockError(failures)
+        StockMovement.record(moves, reason, document_id)
+
+    @staticmethod
+    def adjust_stock(product_id, delta, reason="adjustment", document_id=None, note=None):
+        """Suma delta al stock (negativo = egreso) y lo registra en el libro."""
+        with db.transaction(immediate=True):
+            db.execute(
+                "UPDATE products SET stock = stock + ? WHERE id = ?",
+                (delta, product_id)
+            )
+            StockMovement.record([(product_id, delta)], reason, document_id, note)
+        cache.invalidate("products")
+
+
+class StockMovement:
+    """
+    Libro de movimientos de stock: cada cambio de products.stock se anota
+    en stock_movements en la misma transacción (reason: "sale",
+    "adjustment", "import", "return", "edit" o "initial"). Cada
+    SNAPSHOT_EVERY movimientos de un producto se guarda su stock en
+    stock_snapshots, así el stock a una fecha sale de una búsqueda por
+    índice y de sumar a lo sumo SNAPSHOT_EVERY movimientos.
+    """
+    @staticmethod
+    def record(moves, reason, document_id=None, note=None):
+        """
+        moves: iterable de (product_id, delta), ya aplicados a products.
+        Debe llamarse dentro de la transacción que cambió el stock.
+        """
+        moves = [(pid, delta) for pid, delta in moves if delta]
+        if not moves:
+            return
+        at = datetime.now().strftime(MOVEMENT_FMT)
+        db.executemany(
+            "INSERT INTO stock_movements (product_id, at, delta, reason, document_id, note) "
+            "VALUES (?,?,?,?,?,?)",
+            [(pid, at, delta, reason, document_id, note) for pid, delta in moves]
+        )
+        for pid in {pid for pid, _ in moves}:
+            StockMovement._snapshot_if_due(pid, at)
+
+    @staticmethod
+    def _last_snapshot(product_id, at=None):
+        sql = "SELECT movement_id, at, stock FROM stock_snapshots WHERE product_id = ?"
+        params = [product_id]
+        if at:
+            sql += " AND at <= ?"
+            params.append(at)
+        rows = db.query(sql + " ORDER BY at DESC, movement_id DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _snapshot_if_due(product_id, at):
+        snap = StockMovement._last_snapshot(product_id)
+        row = db.query(
+            "SELECT COUNT(*) AS n, MAX(id) AS last FROM stock_movements "
+            "WHERE product_id = ? AND at >= ? AND id > ?",
+            (product_id, snap["at"] if snap else "", snap["movement_id"] if snap else 0)
+        )[0]
+        if row["n"] >= SNAPSHOT_EVERY:
+            db.execute(
+                "INSERT OR IGNORE INTO stock_snapshots (product_id, movement_id, at, stock) "
+                "SELECT id, ?, ?, stock FROM products WHERE id = ?",
+                (row["last"], at, product_id)
+            )
+
+    @staticmethod
+    def stock_at(product_id, when):
+        """
+        Stock del producto al final de when (date: ese día completo;
+        datetime: hasta ese momento). None si when es anterior al libro.
+        """
+        if isinstance(when, datetime):
+            upto = when.strftime(MOVEMENT_FMT)
+        else:
+            upto = f"{when:%Y-%m-%d}T23:59:59"
+        snap = StockMovement._last_snapshot(product_id, upto)
+        if snap is None:
+            # Sin saldo de apertura: el producto se creó después (empieza en 0)
+            if db.query("SELECT 1 FROM stock_snapshots WHERE product_id = ? AND movement_id = 0",
+                        (product_id,)):
+                return None
+            base, since, after_id = 0, "", 0
+        else:
+            base, since, after_id = snap["stock"], snap["at"], snap["movement_id"]
+        row = db.query(
+            "SELECT COALESCE(SUM(delta), 0) AS d FROM stock_movements "
+            "WHERE product_id = ? AND at >= ? AND at <= ? AND id > ?",
+            (product_id, since, upto, after_id)
+        )[0]
+        return base + row["d"]
+
+    @staticmethod
+    def history(product_id, start=None, end=None, limit=100, before=None):
+        """
+        Movimientos del producto, del más reciente al más antiguo, con
+        start <= at < end. before = (at, id) de la última fila de la
+        página anterior.
+        """
+        where, params = ["product_id = ?"], [product_id]
+        if start:
+            where.append("at >= ?")
+            params.append(to_iso(start))
+        if end:
+            where.append("at < ?")
+            params.append(to_iso(end))
+        if before:
+            where.append("(at, id) < (?, ?)")
+            params.extend(before)
+        return db.query(
+            f"SELECT * FROM stock_movements{_where(where)} ORDER BY at DESC, id DESC LIMIT ?",
+            params + [limit]
         )
 
 
 class Client:
     @staticmethod
     def all(order_by="full_name"):
-        return db.query(f"SELECT * FROM clients ORDER BY {order_by}")
+        return cache.get(
+            "clients", ("all", order_by),
+            lambda: db.query(f"SELECT * FROM clients ORDER BY {order_by}")
+        )
+
+    @staticmethod
+    def _filters(term=None):
+        if term and _use_fts(term):
+            return ["id IN (SELECT rowid FROM clients_fts WHERE clients_fts MATCH ?)"], [_fts_term(term)]
+        if term:
+            return ["(full_name LIKE ? OR cedula LIKE ?)"], [f"%{term}%"] * 2
+        return [], []
 
     @staticmethod
     def search(term, order_by="full_name"):
+        where, params = Client._filters(term)
+        return db.query(f"SELECT * FROM clients{_where(where)} ORDER BY {order_by}", params)
+
+    @staticmethod
+    def iter_all(order_by="full_name", size=ITER_BATCH):
+        """Como all(), pero generador (fetchmany) y sin pasar por la caché."""
+        return db.iterate(f"SELECT * FROM clients ORDER BY {order_by}", (), size)
+
+    @staticmethod
+    def iter_search(term, order_by="full_name", size=ITER_BATCH):
+        where, params = Client._filters(term)
+        return db.iterate(f"SELECT * FROM clients{_where(where)} ORDER BY {order_by}", params, size)
+
+    @staticmethod
+    def page(after=None, limit=100, term=None):
+        """Página por nombre; after = (full_name, id) de la última fila anterior."""
+        where, params = Client._filters(term)
+        return _page("clients", "full_name", where, params, after, limit)
+
+    @staticmethod
+    def count(term=None):
+        where, params = Client._filters(term)
+        return db.query(f"SELECT COUNT(*) AS cnt FROM clients{_where(where)}", params)[0]["cnt"]
+
+    @staticmethod
+    def by_cedula(cedula):
+        rows = db.query("SELECT * FROM clients WHERE cedula = ?", (cedula,))
+        return dict(rows[0]) if rows else None
+
+    @staticmethod
+    def search_ranked(term, limit=50):
+        """Coincidencias ordenadas por relevancia (bm25) cuando hay FTS5."""
+        if _use_fts(term):
+            return db.query(
+                "SELECT cl.* FROM clients_fts f JOIN clients cl ON cl.id = f.rowid "
+                "WHERE clients_fts MATCH ? ORDER BY f.rank LIMIT ?",
+                (_fts_term(term), limit)
+            )
         t = f"%{term}%"
         return db.query(
-            f"SELECT * FROM clients WHERE full_name LIKE ? OR cedula LIKE ? ORDER BY {order_by}",
-            (t, t)
+            "SELECT * FROM clients WHERE full_name LIKE ? OR cedula LIKE ? ORDER BY full_name LIMIT ?",
+            (t, t, limit)
         )
 
     @staticmethod
@@ -135,6 +595,7 @@ class Client:
             "INSERT INTO clients (full_name, cedula, contact, address, email) VALUES (?,?,?,?,?)",
             (full_name, cedula or None, contact or None, address or None, email or None)
         )
+        cache.invalidate("clients")
 
     @staticmethod
     def update(client_id, full_name, cedula, contact, address, email):
@@ -142,49 +603,249 @@ class Client:
             "UPDATE clients SET full_name=?, cedula=?, contact=?, address=?, email=? WHERE id=?",
             (full_name, cedula or None, contact or None, address or None, email or None, client_id)
         )
+        cache.invalidate("clients")
+
+    @staticmethod
+    def upsert_many(fields, rows):
+        """Alta/actualización masiva por cédula/RUC (ver bulk_import)."""
+        result = _upsert_many("clients", "cedula", fields, rows)
+        cache.invalidate("clients")
+        return result
 
     @staticmethod
     def delete(client_id):
+        """sqlite3.IntegrityError si el cliente tiene documentos."""
         db.execute("DELETE FROM clients WHERE id = ?", (client_id,))
+        cache.invalidate("clients")
 
 
 class Document:
     @staticmethod
-    def create(type_, date, client_id, discount, total):
-        cur = db.execute(
-            "INSERT INTO documents (type, date, client_id, discount, total) VALUES (?,?,?,?,?)",
-            (type_, date, client_id, discount, total)
+    def next_number(type_, year=0):
+        """
+        Incrementa y devuelve el contador del tipo. Debe llamarse dentro de
+        una transacción IMMEDIATE para que dos terminales no obtengan el mismo.
+        """
+        db.execute(
+            "INSERT INTO document_sequences (type, year, last_value) VALUES (?,?,1) "
+            "ON CONFLICT(type, year) DO UPDATE SET last_value = last_value + 1",
+            (type_, year)
         )
+        rows = db.query(
+            "SELECT last_value FROM document_sequences WHERE type = ? AND year = ?",
+            (type_, year)
+        )
+        return rows[0]["last_value"]
+
+    @staticmethod
+    def create(type_, date, client_id, discount, total, payment_method=None, additional_info=None):
+        issued_at = to_iso(date)
+        year = int(issued_at[:4]) if SEQUENCE_PER_YEAR else 0
+        with db.transaction(immediate=True):
+            number = Document.next_number(type_, year)
+            cur = db.execute(
+                "INSERT INTO documents (type, number, date, issued_at, client_id, discount, total, "
+                "payment_method, additional_info) VALUES (?,?,?,?,?,?,?,?,?)",
+                (type_, number, date, issued_at, client_id, discount, total,
+                 payment_method, additional_info)
+            )
         return cur.lastrowid
 
+    @staticmethod
+    def create_with_items(type_, date, client_id, discount, total, items, adjust_stock=False,
+                          payment_method=None, additional_info=None):
+        """
+        Guarda cabecera, ítems y (opcionalmente) descuento de stock en una
+        sola transacción. items: iterable de
+        (product_id, code, name, qty, unit_price, subtotal); código y nombre
+        quedan guardados tal como se imprimieron.
+        Con adjust_stock, si algún producto no tiene stock suficiente no se
+        guarda nada y se lanza StockError con los renglones que fallaron.
+        Devuelve (doc_id, número del documento).
+        """
+        items = list(items)
+
+        def save():
+            doc_id = Document.create(type_, date, client_id, discount, total,
+                                     payment_method, additional_info)
+            # El stock primero: un producto borrado sale en StockError y no
+            # como clave foránea rota al insertar el ítem
+            if adjust_stock and items:
+                Product.take_stock([(pid, qty) for pid, _, _, qty, _, _ in items], "sale", doc_id)
+            db.executemany(
+                "INSERT INTO document_items (document_id, product_id, code, name, qty, unit_price, subtotal) "
+                "VALUES (?,?,?,?,?,?,?)",
+                [(doc_id, pid, code, name, qty, unit, sub) for pid, code, name, qty, unit, sub in items]
+            )
+            number = db.query("SELECT number FROM documents WHERE id = ?", (doc_id,))[0]["number"]
+            return doc_id, number
+
+        result = db.run_transaction(save)
+        if adjust_stock:
+            cache.invalidate("products")
+        return result
+
     @staticmethod
     def get(doc_id):
         rows = db.query("SELECT * FROM documents WHERE id = ?", (doc_id,))
         return dict(rows[0]) if rows else None
 
     @staticmethod
-    def all(order_by="date DESC"):
-        return db.query(f"SELECT * FROM documents ORDER BY {order_by}")
+    def all(order_by="issued_at DESC, id DESC", type_=None):
+        return list(Document.iter_all(order_by, type_))
+
+    @staticmethod
+    def iter_all(order_by="issued_at DESC, id DESC", type_=None, size=ITER_BATCH):
+        if type_:
+            return db.iterate(
+                f"SELECT * FROM documents WHERE type = ? ORDER BY {order_by}",
+                (type_,), size
+            )
+        return db.iterate(f"SELECT * FROM documents ORDER BY {order_by}", (), size)
+
+    @staticmethod
+    def iter_ids(type_=None, client_id=None, start=None, end=None, month=None, size=ITER_BATCH):
+        """Ids de los documentos filtrados, del más antiguo al más reciente."""
+        where, params = Document._filters(type_, client_id, start, end, month)
+        sql = f"SELECT d.id FROM documents d{_where(where)} ORDER BY d.issued_at, d.id"
+        return (r["id"] for r in db.iterate(sql, params, size))
+
+    @staticmethod
+    def between(start, end, type_=None, order_by="issued_at DESC, id DESC"):
+        """Documentos con start <= issued_at < end (datetime, date o ISO)."""
+        sql = "SELECT * FROM documents WHERE issued_at >= ? AND issued_at < ?"
+        params = [to_iso(start), to_iso(end)]
+        if type_:
+            sql += " AND type = ?"
+            params.append(type_)
+        return db.query(f"{sql} ORDER BY {order_by}", params)
+
+    @staticmethod
+    def in_month(year, month, type_=None):
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return Document.between(start, end, type_)
+
+    @staticmethod
+    def in_month_any_year(month, type_=None):
+        """Mismo mes de cualquier año (no puede usar el rango del índice)."""
+        sql = "SELECT * FROM documents WHERE substr(issued_at, 6, 2) = ?"
+        params = [f"{month:02d}"]
+        if type_:
+            sql += " AND type = ?"
+            params.append(type_)
+        return db.query(f"{sql} ORDER BY issued_at DESC, id DESC", params)
+
+    @staticmethod
+    def _filters(type_=None, client_id=None, start=None, end=None, month=None):
+        """Condiciones WHERE (alias d = documents) para los listados."""
+        where, params = [], []
+        if type_:
+            where.append("d.type = ?")
+            params.append(type_)
+        if client_id:
+            where.append("d.client_id = ?")
+            params.append(client_id)
+        if start:
+            where.append("d.issued_at >= ?")
+            params.append(to_iso(start))
+        if end:
+            where.append("d.issued_at < ?")
+            params.append(to_iso(end))
+        if month:
+            where.append("substr(d.issued_at, 6, 2) = ?")
+            params.append(f"{month:02d}")
+        return where, params
+
+    @staticmethod
+    def listing(type_=None, client_id=None, start=None, end=None, month=None,
+                after=None, limit=100):
+        """
+        Página de documentos con los datos del cliente (LEFT JOIN: si el
+        cliente ya no existe se muestra "-", igual que en el PDF), filtrada en
+        SQL y ordenada por fecha descendente. after = (issued_at, id) de la
+        última fila de la página anterior (paginación por clave, sin OFFSET).
+        """
+        where, params = Document._filters(type_, client_id, start, end, month)
+        if after:
+            where.append("(d.issued_at, d.id) < (?, ?)")
+            params.extend(after)
+        sql = (
+            "SELECT d.*, COALESCE(c.full_name, '-') AS client_name, c.cedula AS client_cedula "
+            "FROM documents d LEFT JOIN clients c ON c.id = d.client_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY d.issued_at DESC, d.id DESC LIMIT ?"
+        params.append(limit)
+        return db.query(sql, params)
+
+    @staticmethod
+    def iter_sales(type_=None, client_id=None, start=None, end=None, month=None, size=500):
+        """
+        Un renglón por ítem con los datos del documento, del cliente y del
+        producto, en orden cronológico. Generador (fetchmany): no carga el
+        resultado completo en memoria.
+        """
+        where, params = Document._filters(type_, client_id, start, end, month)
+        sql = (
+            "SELECT d.id AS document_id, d.type, d.number, d.issued_at, d.discount, d.total, "
+            "d.payment_method, d.client_id, c.full_name AS client_name, c.cedula AS client_cedula, "
+            "di.product_id, COALESCE(di.code, p.code) AS code, COALESCE(di.name, p.name) AS name, "
+            "p.category, di.qty, di.unit_price, di.subtotal "
+            "FROM documents d "
+            "LEFT JOIN clients c ON c.id = d.client_id "
+            "LEFT JOIN document_items di ON di.document_id = d.id "
+            "LEFT JOIN products p ON p.id = di.product_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY d.issued_at, d.id, di.id"
+        return db.iterate(sql, params, size)
+
+    @staticmethod
+    def count(type_=None, client_id=None, start=None, end=None, month=None):
+        where, params = Document._filters(type_, client_id, start, end, month)
+        sql = "SELECT COUNT(*) AS cnt FROM documents d"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return db.query(sql, params)[0]["cnt"]
+
+    @staticmethod
+    def years():
+        rows = db.query(
+            "SELECT DISTINCT substr(issued_at, 1, 4) AS year FROM documents "
+            "WHERE issued_at IS NOT NULL ORDER BY year DESC"
+        )
+        return [int(r["year"]) for r in rows]
 
     @staticmethod
     def delete(doc_id):
-        db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        """Borra el documento con sus ítems."""
+        with db.transaction():
+            db.execute("DELETE FROM document_items WHERE document_id = ?", (doc_id,))
+            db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
 
 
 class DocumentItem:
     @staticmethod
-    def add(document_id, product_id, qty, unit_price, subtotal):
+    def add(document_id, product_id, qty, unit_price, subtotal, code=None, name=None):
         db.execute(
-            "INSERT INTO document_items (document_id, product_id, qty, unit_price, subtotal) VALUES (?,?,?,?,?)",
-            (document_id, product_id, qty, unit_price, subtotal)
+            "INSERT INTO document_items (document_id, product_id, code, name, qty, unit_price, subtotal) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (document_id, product_id, code, name, qty, unit_price, subtotal)
         )
 
     @staticmethod
     def get_by_document(document_id):
+        # Código y nombre guardados en el ítem; los ítems antiguos sin copia
+        # usan los del producto (si todavía existe)
         rows = db.query(
-            "SELECT di.*, p.name FROM document_items di "
-            "JOIN products p ON di.product_id = p.id "
-            "WHERE document_id = ?",
+            "SELECT di.id, di.document_id, di.product_id, di.qty, di.unit_price, di.subtotal, "
+            "COALESCE(di.code, p.code) AS code, COALESCE(di.name, p.name) AS name "
+            "FROM document_items di "
+            "LEFT JOIN products p ON di.product_id = p.id "
+            "WHERE di.document_id = ? ORDER BY di.id",
             (document_id,)
         )
         return [dict(r) for r in rows]
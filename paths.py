@@ -21,3 +21,10 @@ def get_pdf_backup_dir():
     backup_dir = os.path.join(base, "pdf_backups")
     os.makedirs(backup_dir, exist_ok=True)
     return backup_dir
+
+
+def get_pdf_cache_dir():
+    # PDFs regenerados desde la base de datos; se puede borrar sin perder nada
+    cache_dir = os.path.join(os.path.dirname(DATA_DIR), "pdf_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
@@ -0,0 +1,304 @@
+# pdf_layout.py
+"""
+Plantilla única para los PDFs de Proforma y Nota de Venta.
+
+El encabezado de la empresa (logo, razón social, RUC, direcciones) y el título
+no cambian entre documentos: se dibujan una sola vez por archivo como un
+form XObject de reportlab y luego solo se "estampan". El logo se decodifica
+una sola vez por proceso (ImageReader en caché), así una reimpresión masiva
+no vuelve a leer el PNG por cada documento; dentro de cada archivo es un
+form propio, que ambos encabezados referencian.
+"""
+import io
+import os
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
+
+# Se incrementa al cambiar el diseño, para que no se reutilicen PDFs en caché
+LAYOUT_VERSION = 1
+
+# — Datos de la empresa —
+LOGO_PATH      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "logo2.png")
+BUSINESS_NAME  = "Tech RioStore"
+OWNER_NAME     = "Luis Enrique Reinoso Peñafiel"
+ADDRESS_LINE_1 = "Mayor Ruiz 28-33 y Venezuela"
+ADDRESS_LINE_2 = "Riobamba – Chimborazo – Ecuador"
+RUC            = "RUC: 0603918426001"
+PHONE          = "0997927337 / 0984616768"
+EMAIL          = "luis_enrique_reinoso@hotmail.com"
+FACEBOOK       = "facebook.com/TechRioStore"
+ADDITIONAL_TEXT = "Contribuyente Negocio Popular - Régimen RIMPE"
+
+# — Página A4 con márgenes estándar (2.54 cm ≈ 72 puntos) —
+W, H          = A4
+MARGIN_TOP    = 72
+MARGIN_BOTTOM = 72
+MARGIN_LEFT   = 72
+MARGIN_RIGHT  = 72
+USABLE_WIDTH  = W - MARGIN_LEFT - MARGIN_RIGHT
+LINE_H        = 16        # interlineado
+
+# Diferencias entre tipos de documento
+TEMPLATES = {
+    "PROFORMA": {"title": "PROFORMA",      "tagline": True,  "signatures": False},
+    "NOTA":     {"title": "NOTA DE VENTA", "tagline": False, "signatures": True},
+}
+
+# Columnas de la tabla de ítems
+X_COD  = MARGIN_LEFT + 5
+X_DESC = MARGIN_LEFT + 80
+X_QTY  = MARGIN_LEFT + 300
+X_UNIT = MARGIN_LEFT + 380
+X_SUB  = W - MARGIN_RIGHT - 5
+
+EMPRESA_INFO = [OWNER_NAME, ADDRESS_LINE_1, ADDRESS_LINE_2, PHONE, EMAIL]
+# Altura del título (fija para ambos tipos)
+TITLE_Y = H - MARGIN_TOP - (len(EMPRESA_INFO) + 6) * LINE_H
+
+_logo      = None    # ImageReader o False si no hay logo
+_logo_lock = threading.Lock()
+
+
+def _logo_cache():
+    """Logo decodificado una sola vez por proceso (None si no existe)."""
+    global _logo
+    with _logo_lock:
+        if _logo is None:
+            if os.path.exists(LOGO_PATH):
+                reader = ImageReader(LOGO_PATH)
+                # Decodifica ya: después lo leen varios hilos a la vez
+                reader.getRGBData()
+                _logo = reader
+            else:
+                _logo = False
+        return _logo or None
+
+
+def _logo_form(c):
+    """
+    Define (una vez por archivo) el logo como form de 1x1 y devuelve su
+    nombre, o None si no hay logo. Tiene que definirse fuera de otro form.
+    """
+    reader = _logo_cache()
+    if reader is None:
+        return None
+    name = "riostore_logo"
+    if not c.hasForm(name):
+        c.beginForm(name, upperx=1, uppery=1)
+        c.drawImage(reader, 0, 0, width=1, height=1, mask='auto')
+        c.endForm()
+    return name
+
+
+def _draw_logo(c, logo, x, y, size):
+    c.saveState()
+    c.translate(x, y)
+    c.scale(size, size)
+    c.doForm(logo)
+    c.restoreState()
+
+
+def _header_form(c, type_):
+    """Define (una vez por archivo) el encabezado de este tipo y devuelve su nombre."""
+    name = f"header_{type_}"
+    if c.hasForm(name):
+        return name
+    tpl = TEMPLATES[type_]
+    logo = _logo_form(c)
+
+    c.beginForm(name)
+    y = H - MARGIN_TOP
+    logo_size = LINE_H * 7
+    if logo:
+        _draw_logo(c, logo, MARGIN_LEFT, y - logo_size, logo_size)
+
+    c.setFont("Helvetica-Bold", 18)
+    c.drawCentredString(W/2, y - LINE_H, BUSINESS_NAME)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(W/2, y - 2*LINE_H, RUC)
+    c.setFont("Helvetica", 10)
+    for i, txt in enumerate(EMPRESA_INFO, start=3):
+        c.drawCentredString(W/2, y - i*LINE_H, txt)
+
+    if tpl["tagline"]:
+        c.setFont("Helvetica-Oblique", 10)
+        c.drawCentredString(W/2, y - (len(EMPRESA_INFO) + 3) * LINE_H, ADDITIONAL_TEXT)
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(W/2, TITLE_Y, tpl["title"])
+    c.endForm()
+    return name
+
+
+def draw_document(c, doc):
+    """
+    Dibuja un documento completo en el canvas c (termina con showPage).
+    doc: dict con type, number, date, client, items [(pid, código, nombre,
+    cant, p.unit, subtotal)], discount, total, info y payment.
+    Se puede llamar varias veces sobre el mismo canvas (PDF combinado).
+    """
+    tpl            = TEMPLATES[doc["type"]]
+    cliente        = doc["client"]
+    info_adicional = doc["info"] or ""
+    metodo_pago    = doc["payment"] or ""
+    descuento      = doc["discount"] or 0
+    total          = doc["total"]
+    line_h         = LINE_H
+
+    def nueva_pagina():
+        """Nueva página manteniendo la configuración"""
+        c.showPage()
+        c.setFont("Helvetica", 9)
+        c.setFillColor(colors.black)
+        c.setStrokeColor(colors.black)
+        return H - MARGIN_TOP
+
+    # — ENCABEZADO Y TÍTULO (plantilla) —
+    c.doForm(_header_form(c, doc["type"]))
+    y_cursor = TITLE_Y
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica", 10)
+    c.drawRightString(W - MARGIN_RIGHT, y_cursor, f"N°: {doc['number']:06d}")
+    c.drawRightString(W - MARGIN_RIGHT, y_cursor - line_h, f"Fecha: {doc['date']}")
+
+    # — DATOS DEL CLIENTE —
+    y_cursor -= 3*line_h
+    if y_cursor < MARGIN_BOTTOM + 6*line_h:
+        y_cursor = nueva_pagina()
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(MARGIN_LEFT, y_cursor, "Cliente:")
+    c.setFont("Helvetica", 9)
+
+    cliente_info = [
+        f"Nombre: {cliente['full_name']}",
+        f"Cédula/RUC: {cliente['cedula'] or '-'}",
+        f"Dirección: {cliente['address'] or '-'}",
+        f"Contacto: {cliente['contact'] or '-'}",
+        f"Correo: {cliente.get('email','-')}"
+    ]
+    for i, fld in enumerate(cliente_info, start=1):
+        if y_cursor - i*line_h < MARGIN_BOTTOM:
+            y_cursor = nueva_pagina()
+            i = 1
+        c.drawString(MARGIN_LEFT, y_cursor - i*line_h, fld)
+
+    # — TABLA DE ÍTEMS —
+    y_cursor -= (len(cliente_info) + 2) * line_h
+    if y_cursor < MARGIN_BOTTOM + 4*line_h:
+        y_cursor = nueva_pagina()
+
+    c.setFillColorRGB(0.7, 0.9, 1)
+    c.rect(MARGIN_LEFT, y_cursor - line_h - 4, USABLE_WIDTH, line_h+4, fill=1, stroke=0)
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(X_COD, y_cursor - line_h, "Código")
+    c.drawString(X_DESC, y_cursor - line_h, "Descripción")
+    c.drawRightString(X_QTY, y_cursor - line_h, "Cant.")
+    c.drawRightString(X_UNIT, y_cursor - line_h, "P. Unit.")
+    c.drawRightString(X_SUB, y_cursor - line_h, "Subtotal")
+
+    y_cursor -= line_h + 6
+    c.setStrokeColor(colors.grey)
+    c.line(MARGIN_LEFT, y_cursor, W - MARGIN_RIGHT, y_cursor)
+
+    c.setFont("Helvetica", 9)
+    for _, codigo, name, qty, price, sub in doc["items"]:
+        y_cursor -= line_h
+        if y_cursor < MARGIN_BOTTOM + line_h:
+            y_cursor = nueva_pagina()
+        c.drawString(X_COD, y_cursor, str(codigo)[:12])
+        c.drawString(X_DESC, y_cursor, name[:35])
+        c.drawRightString(X_QTY, y_cursor, str(qty))
+        c.drawRightString(X_UNIT, y_cursor, f"{price:.2f}")
+        c.drawRightString(X_SUB, y_cursor, f"{sub:.2f}")
+
+    # — RESUMEN DE TOTALES —
+    y_cursor -= 2*line_h
+    if y_cursor < MARGIN_BOTTOM + 3*line_h:
+        y_cursor = nueva_pagina()
+
+    c.setStrokeColor(colors.black)
+    c.line(W - MARGIN_RIGHT - 200, y_cursor, W - MARGIN_RIGHT, y_cursor)
+
+    c.setFont("Helvetica-Bold", 10)
+    y_cursor -= line_h
+    c.drawRightString(X_SUB, y_cursor, f"Subtotal: {total + descuento:.2f}")
+    if descuento > 0:
+        y_cursor -= line_h
+        c.drawRightString(X_SUB, y_cursor, f"Descuento: {descuento:.2f}")
+    y_cursor -= line_h
+    c.drawRightString(X_SUB, y_cursor, f"Total: {total:.2f}")
+
+    # — INFORMACIÓN ADICIONAL (si la hay) —
+    if info_adicional:
+        y_cursor -= 2 * line_h
+        if y_cursor < MARGIN_BOTTOM + 4 * line_h:
+            y_cursor = nueva_pagina()
+
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(MARGIN_LEFT, y_cursor, "Información Adicional:")
+        y_cursor -= line_h
+
+        c.setFont("Helvetica", 9)
+        text_obj = c.beginText(MARGIN_LEFT + 10, y_cursor)
+        for ln in simpleSplit(info_adicional, "Helvetica", 9, USABLE_WIDTH - 10):
+            if text_obj.getY() < MARGIN_BOTTOM + line_h:
+                c.drawText(text_obj)
+                y_cursor = nueva_pagina()
+                text_obj = c.beginText(MARGIN_LEFT + 10, y_cursor)
+            text_obj.textLine(ln)
+        c.drawText(text_obj)
+        y_cursor = text_obj.getY() - line_h
+
+    # — MÉTODO DE PAGO —
+    y_cursor -= line_h
+    if y_cursor < MARGIN_BOTTOM + 2*line_h:
+        y_cursor = nueva_pagina()
+
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(MARGIN_LEFT, y_cursor, "Método de pago:")
+    c.setFont("Helvetica", 9)
+    metodo_lines = simpleSplit(metodo_pago, "Helvetica", 9, USABLE_WIDTH - 100)
+    for i, line in enumerate(metodo_lines):
+        if y_cursor - i*line_h < MARGIN_BOTTOM:
+            y_cursor = nueva_pagina()
+            i = 0
+        c.drawString(MARGIN_LEFT + 100, y_cursor - i*line_h, line)
+
+    # — FIRMAS (solo Nota de Venta) —
+    if tpl["signatures"]:
+        y_cursor -= 2*line_h
+        y_sign = MARGIN_BOTTOM + 60
+        if y_cursor - 40 < y_sign:
+            y_cursor = nueva_pagina()
+
+        c.setFont("Helvetica", 9)
+        c.line(MARGIN_LEFT, y_sign, MARGIN_LEFT + 200, y_sign)
+        c.drawString(MARGIN_LEFT + 5, y_sign - 14, "Firma autorizada")
+        c.line(W - MARGIN_RIGHT - 200, y_sign, W - MARGIN_RIGHT, y_sign)
+        c.drawString(W - MARGIN_RIGHT - 195, y_sign - 14, "Firma del cliente")
+
+    c.showPage()
+
+
+def render(doc, path):
+    """
+    Genera el PDF de un documento en path (ruta o archivo abierto en modo
+    binario). invariant=1: mismo documento, mismos bytes (sin fecha de
+    creación ni identificador aleatorio).
+    """
+    c = canvas.Canvas(path, pagesize=A4, invariant=1)
+    draw_document(c, doc)
+    c.save()
+
+
+def render_bytes(doc):
+    """PDF del documento en memoria (se usa desde los procesos de exportación)."""
+    buf = io.BytesIO()
+    render(doc, buf)
+    return buf.getvalue()
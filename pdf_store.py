@@ -0,0 +1,161 @@
+# pdf_store.py
+"""
+PDFs de documentos regenerados desde la base de datos.
+
+Cada documento guarda lo necesario para volver a dibujarlo (ítems, método
+de pago, información adicional), así que el PDF no tiene que existir en
+disco: se genera bajo demanda y se guarda en una caché acotada. El nombre
+del archivo incluye un hash del contenido, de modo que si el documento (o
+el diseño) cambia nunca se abre una versión vieja. Cuando la caché supera
+CACHE_MAX_BYTES se borran primero los PDFs usados hace más tiempo.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import pdf_layout
+from models import Client, Document, DocumentItem
+from paths import get_pdf_cache_dir
+
+CACHE_DIR       = get_pdf_cache_dir()
+CACHE_MAX_BYTES = 200 * 1024 * 1024   # 200 MB
+
+
+def snapshot(doc_id):
+    """Datos del documento en el formato de pdf_layout (None si no existe)."""
+    d = Document.get(doc_id)
+    if not d:
+        return None
+    cliente = Client.get(d["client_id"]) or {
+        "full_name": "-", "cedula": None, "address": None, "contact": None, "email": None
+    }
+    items = tuple(
+        (it["product_id"], it["code"] or "", it["name"] or "",
+         it["qty"], it["unit_price"], it["subtotal"])
+        for it in DocumentItem.get_by_document(doc_id)
+    )
+    return {
+        "type":     d["type"],
+        "number":   d["number"],
+        "date":     d["date"],
+        "client":   dict(cliente),
+        "items":    items,
+        "discount": d["discount"] or 0,
+        "total":    d["total"],
+        "info":     d["additional_info"] or "",
+        "payment":  d["payment_method"] or "",
+    }
+
+
+def content_hash(doc):
+    data = json.dumps([pdf_layout.LAYOUT_VERSION, doc], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(doc_id, doc):
+    return os.path.join(CACHE_DIR, f"{doc['type']}_{doc_id}_{content_hash(doc)}.pdf")
+
+
+def cached(doc_id, doc):
+    """Ruta del PDF en la caché si ya está generado; si no, None."""
+    path = cache_path(doc_id, doc)
+    if not os.path.exists(path):
+        return None
+    os.utime(path)   # marca de uso para el LRU
+    return path
+
+
+def render_cached(doc, path):
+    """
+    Genera el PDF en path (una ruta de cache_path) y poda la caché. Tiene la
+    firma de render(doc, path) para poder encolarlo en PdfWorker.
+    """
+    _write(path, lambda tmp: pdf_layout.render(doc, tmp))
+    _after_store(_doc_id_of(os.path.basename(path)), path)
+
+
+def get_pdf(doc_id):
+    """Ruta a un PDF actualizado del documento (de la caché o recién generado)."""
+    doc = snapshot(doc_id)
+    if doc is None:
+        return None
+    path = cached(doc_id, doc)
+    if path is None:
+        path = cache_path(doc_id, doc)
+        render_cached(doc, path)
+    return path
+
+
+def store(doc_id, doc, src):
+    """
+    Copia a la caché un PDF ya generado (p. ej. el que se acaba de guardar).
+    Escribe y poda en disco: se llama desde el hilo de PdfWorker.
+    """
+    path = cache_path(doc_id, doc)
+    _write(path, lambda tmp: shutil.copyfile(src, tmp))
+    _after_store(doc_id, path)
+
+
+def discard(doc_id):
+    """Borra de la caché los PDFs de un documento eliminado."""
+    for entry in _entries():
+        if _doc_id_of(entry.name) == doc_id:
+            _remove(entry.path)
+
+
+def prune(max_bytes=CACHE_MAX_BYTES):
+    """Deja la caché por debajo de max_bytes borrando los menos usados."""
+    entries = []
+    for entry in _entries():
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _write(path, produce):
+    # Se escribe a un temporal y se renombra: nunca queda un PDF a medias
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=CACHE_DIR)
+    os.close(fd)
+    try:
+        produce(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+
+
+def _after_store(doc_id, path):
+    # Versiones anteriores del mismo documento ya no sirven
+    for entry in _entries():
+        if entry.path != path and _doc_id_of(entry.name) == doc_id:
+            _remove(entry.path)
+    prune()
+
+
+def _entries():
+    return [e for e in os.scandir(CACHE_DIR) if e.name.endswith(".pdf")]
+
+
+def _doc_id_of(filename):
+    # "{TIPO}_{id}_{hash}.pdf"
+    try:
+        return int(filename.rsplit("_", 2)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
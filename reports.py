@@ -0,0 +1,104 @@
+# reports.py
+"""
+Reportes de ventas (notas de venta) a partir de los resúmenes diarios
+sales_daily_* que mantienen los triggers de la base de datos: el costo de
+cada reporte depende de los días del período, no de cuántos documentos o
+ítems haya.
+
+Fechas: date/datetime o texto "YYYY-MM-DD"; start se incluye y end no.
+Los montos por producto son la suma de subtotales (antes del descuento del
+documento); los totales, por cliente y por método de pago usan el total
+del documento.
+"""
+from datetime import date, datetime
+
+from db import rebuild_sales_summaries
+from models import db
+
+
+def _day(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return value[:10]
+
+
+def _range(start, end):
+    where, params = [], []
+    if start:
+        where.append("day >= ?")
+        params.append(_day(start))
+    if end:
+        where.append("day < ?")
+        params.append(_day(end))
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def totals(start=None, end=None):
+    """{"docs", "amount"} del período."""
+    where, params = _range(start, end)
+    row = db.query(
+        f"SELECT COALESCE(SUM(docs), 0) AS docs, COALESCE(SUM(amount), 0) AS amount "
+        f"FROM sales_daily_payment{where}", params
+    )[0]
+    return dict(row)
+
+
+def daily(start=None, end=None):
+    """[(día, documentos, monto)] en orden cronológico."""
+    where, params = _range(start, end)
+    return [tuple(r) for r in db.query(
+        f"SELECT day, SUM(docs), SUM(amount) FROM sales_daily_payment{where} "
+        "GROUP BY day ORDER BY day", params
+    )]
+
+
+def monthly(year=None):
+    """[("YYYY-MM", documentos, monto)] del año (o de todos los años)."""
+    start, end = (date(year, 1, 1), date(year + 1, 1, 1)) if year else (None, None)
+    where, params = _range(start, end)
+    return [tuple(r) for r in db.query(
+        f"SELECT substr(day, 1, 7) AS month, SUM(docs), SUM(amount) FROM sales_daily_payment{where} "
+        "GROUP BY month ORDER BY month", params
+    )]
+
+
+def top_products(start=None, end=None, n=10, by="amount"):
+    """Los n productos más vendidos por monto ("amount") o cantidad ("qty")."""
+    if by not in ("amount", "qty"):
+        raise ValueError(f"Orden no soportado: {by}")
+    where, params = _range(start, end)
+    return [dict(r) for r in db.query(
+        "SELECT s.product_id, p.code, p.name, s.qty, s.amount FROM ("
+        f"  SELECT product_id, SUM(qty) AS qty, SUM(amount) AS amount FROM sales_daily_product{where} "
+        "  GROUP BY product_id HAVING SUM(lines) > 0"
+        f"  ORDER BY {by} DESC LIMIT ?"
+        ") s LEFT JOIN products p ON p.id = s.product_id "
+        f"ORDER BY s.{by} DESC", params + [n]
+    )]
+
+
+def top_clients(start=None, end=None, n=10):
+    """Los n clientes con más compras (por monto)."""
+    where, params = _range(start, end)
+    return [dict(r) for r in db.query(
+        "SELECT s.client_id, c.full_name, c.cedula, s.docs, s.amount FROM ("
+        f"  SELECT client_id, SUM(docs) AS docs, SUM(amount) AS amount FROM sales_daily_client{where} "
+        "  GROUP BY client_id HAVING SUM(docs) > 0 ORDER BY amount DESC LIMIT ?"
+        ") s LEFT JOIN clients c ON c.id = s.client_id "
+        "ORDER BY s.amount DESC", params + [n]
+    )]
+
+
+def by_payment(start=None, end=None):
+    """[(método de pago, documentos, monto)] del período ("" = sin dato)."""
+    where, params = _range(start, end)
+    return [tuple(r) for r in db.query(
+        f"SELECT payment_method, SUM(docs), SUM(amount) FROM sales_daily_payment{where} "
+        "GROUP BY payment_method HAVING SUM(docs) > 0 ORDER BY SUM(amount) DESC", params
+    )]
+
+
+def rebuild():
+    """Recalcula todos los resúmenes desde los documentos (una transacción)."""
+    with db.transaction(immediate=True) as c:
+        rebuild_sales_summaries(c)
@@ -0,0 +1,78 @@
+# sales_export.py
+"""
+Exportación de ventas para contabilidad: documentos con sus ítems, cliente
+y producto, en CSV (un renglón por ítem) o JSON Lines (un documento por
+línea, con sus ítems).
+
+Las filas se leen con Document.iter_sales (fetchmany) y se escriben a
+medida que llegan, así que exportar un año completo no carga todo en
+memoria. Mismos filtros que la ventana de Documentos.
+"""
+import csv
+import json
+import os
+from itertools import groupby
+from operator import itemgetter
+
+from models import Document
+
+FORMATS = ("csv", "jsonl")
+
+DOC_FIELDS = ("document_id", "type", "number", "issued_at", "client_id", "client_name",
+              "client_cedula", "payment_method", "discount", "total")
+ITEM_FIELDS = ("product_id", "code", "name", "category", "qty", "unit_price", "subtotal")
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def export(dest, fmt="csv", progress=None, cancel=None, **filters):
+    """
+    Escribe en dest las ventas que cumplen filters (type_, client_id,
+    start, end, month). progress(documentos hechos, total); cancel:
+    threading.Event (se borra el archivo a medias). Devuelve la cantidad
+    de documentos exportados.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+    total = Document.count(**filters)
+    tmp = f"{dest}.part"
+    try:
+        # utf-8-sig: Excel reconoce las tildes al abrir el CSV
+        with open(tmp, "w", newline="", encoding="utf-8-sig" if fmt == "csv" else "utf-8") as f:
+            write = _write_csv(f) if fmt == "csv" else _write_jsonl(f)
+            done = 0
+            for _, rows in groupby(Document.iter_sales(**filters), key=itemgetter("document_id")):
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+                write(list(rows))
+                done += 1
+                if progress and (done % 100 == 0 or done == total):
+                    progress(done, total)
+        os.replace(tmp, dest)
+        return done
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _write_csv(f):
+    writer = csv.writer(f)
+    writer.writerow(DOC_FIELDS + ITEM_FIELDS)
+
+    def write(rows):
+        # Documentos sin ítems salen en un renglón con las columnas del ítem vacías
+        writer.writerows([tuple(r[k] for k in DOC_FIELDS + ITEM_FIELDS) for r in rows])
+    return write
+
+
+def _write_jsonl(f):
+    def write(rows):
+        doc = {k: rows[0][k] for k in DOC_FIELDS}
+        doc["items"] = [{k: r[k] for k in ITEM_FIELDS} for r in rows if r["product_id"] is not None]
+        f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    return write